@@ -5,12 +5,13 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('fechas.ui', '.'), ('preview.ui', '.'), ('icon.ico', '.')],
+    datas=[('icon.ico', '.')],  # Los .ui van compilados en ui_fechas.py, ui_preview.py y ui_estadisticas.py
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # modo columnar y --parquet: solo exportar.py; uic solo lo usa compilar_ui.py
+    excludes=['agregacion_columnar', 'numpy', 'archivo_parquet', 'pyarrow', 'PyQt6.uic'],
     noarchive=False,
     optimize=0,
 )
@@ -0,0 +1,172 @@
+"""Agregación columnar de las filas de QUERY_REPORTE con NumPy (modo "columnar").
+
+Produce las mismas boletas que _agregar_filas, incluido lo que en el bucle depende
+del orden de las filas: los datos base salen de la primera fila de cada boleta,
+Update de la última, cada resultado del último valor no vacío y el estado A/R de
+la última fila con prueba. Las fracciones de hemoglobina se resuelven por letra:
+una letra queda en su columna si el último evento que la afecta la agrega (un
+valor igual a la letra en cualquier fracción) y no la quita (otro valor escrito
+en la columna de esa letra), que es lo que deja _reordenar_hemoglobinas tras
+aplicarse fila a fila.
+
+Las columnas que se leen pasan una vez por Python para convertirse en máscaras y
+enteros; filtrar, elegir el valor, buscar la primera y última fila de cada boleta
+y resolver las hemoglobinas son operaciones sobre esos arreglos. Los valores y las
+fechas no se convierten: se toman los objetos originales de las filas elegidas.
+
+NumPy es una dependencia opcional: connection.py importa este módulo solo en modo
+columnar.
+"""
+from operator import itemgetter
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from connection import (
+    INDICE_RESULTADO, RESULTADOS_IDS, Boleta, create_boleta_base, fecha_de, utf_to_ansi,
+)
+
+# Columnas de QUERY_REPORTE que usa la agregación
+_NUM_INGRESO, _TS_NUMERICO, _VALOR_NUMERICO, _PRUEBA = 0, 6, 7, 8
+_RECEPCION, _VALOR_ALPHA, _VALIDADO_POR, _UPDATE, _TS_ALPHA = 14, 15, 16, 17, 18
+
+_PRUEBAS_HB = (889, 890, 891, 892)
+_LETRAS_HB = "FASC"
+_SIN_FILA = -1
+
+
+def _ultima_por_grupo(grupos: np.ndarray, filas: np.ndarray, cantidad: int) -> np.ndarray:
+    """Índice de la última de las filas dadas en cada grupo, o _SIN_FILA."""
+    ultima = np.full(cantidad, _SIN_FILA, dtype=np.int64)
+    np.maximum.at(ultima, grupos[filas], filas)
+    return ultima
+
+
+def _tomar(valores: Sequence, indices: np.ndarray) -> List:
+    """Objetos de valores en las posiciones indicadas."""
+    return [valores[i] for i in indices.tolist()]
+
+
+def agregar_filas_columnar(rows, boletas_agrupadas: Dict[str, Boleta]) -> Dict[str, Boleta]:
+    """Agrupa el resultado de QUERY_REPORTE con operaciones por lotes.
+
+    Equivale a _agregar_filas sobre un diccionario sin esas boletas; rows puede ser
+    un cursor, se lee completo antes de agregar.
+    """
+    filas: List[tuple] = rows if isinstance(rows, list) else list(rows)
+    if not filas:
+        return boletas_agrupadas
+    n = len(filas)
+    # Solo las columnas que se usan; más barato que transponer todas con zip(*filas)
+    columnas = {i: list(map(itemgetter(i), filas)) for i in (
+        _NUM_INGRESO, _TS_NUMERICO, _VALOR_NUMERICO, _PRUEBA, _RECEPCION,
+        _VALOR_ALPHA, _VALIDADO_POR, _UPDATE, _TS_ALPHA,
+    )}
+
+    # Número de boleta por fila en orden de primera aparición (como el dict del bucle);
+    # las órdenes basura con num_ingreso '1' quedan en el grupo -1 y no se usan
+    numeros: Dict[str, int] = {}
+    grupos = np.fromiter(
+        (-1 if num == "1" else numeros.setdefault(num, len(numeros)) for num in columnas[_NUM_INGRESO]),
+        dtype=np.int64, count=n,
+    )
+    cantidad = len(numeros)
+    if cantidad == 0:
+        return boletas_agrupadas
+    propias = grupos >= 0
+    # Una fila abre un grupo nuevo si su número supera a todos los anteriores
+    maximo_previo = np.maximum.accumulate(np.concatenate(([-1], grupos[:-1])))
+    primera = np.flatnonzero(grupos > maximo_previo)
+    ultima = _ultima_por_grupo(grupos, np.flatnonzero(propias), cantidad)
+
+    pruebas = np.fromiter((-1 if p is None else p for p in columnas[_PRUEBA]), dtype=np.int64, count=n)
+    con_prueba = propias & (pruebas >= 0)
+    validas = con_prueba & np.isin(pruebas, RESULTADOS_IDS)
+    posiciones = np.full(n, _SIN_FILA, dtype=np.int64)
+    for id_prueba, posicion in INDICE_RESULTADO.items():
+        posiciones[pruebas == id_prueba] = posicion
+
+    # Valor del resultado: alfanumérico en 889-892 validadas, numérico en el resto
+    filas_validas = np.flatnonzero(validas)
+    validado = columnas[_VALIDADO_POR]
+    usa_alpha = np.isin(pruebas[filas_validas], _PRUEBAS_HB) & np.fromiter(
+        (bool(validado[i]) and validado[i] != 0 for i in filas_validas.tolist()),
+        dtype=bool, count=len(filas_validas),
+    )
+    alfa, numerico = columnas[_VALOR_ALPHA], columnas[_VALOR_NUMERICO]
+    valores = [alfa[i] if a else numerico[i] for i, a in zip(filas_validas.tolist(), usa_alpha.tolist())]
+    no_vacio = np.fromiter((v is not None and (v.__class__ is not str or v != "") for v in valores),
+                           dtype=bool, count=len(valores))
+    filas_valor = filas_validas[no_vacio]
+    valores_objeto = np.empty(len(valores), dtype=object)
+    valores_objeto[:] = valores
+    valores_objeto = valores_objeto[no_vacio]
+
+    resultados = np.full((cantidad, len(RESULTADOS_IDS)), None, dtype=object)
+    es_hb = np.isin(pruebas[filas_valor], _PRUEBAS_HB)
+
+    # Resultados comunes: el último valor no vacío de cada (boleta, prueba)
+    comunes = np.flatnonzero(~es_hb)
+    claves = grupos[filas_valor[comunes]] * len(RESULTADOS_IDS) + posiciones[filas_valor[comunes]]
+    _, desde_el_final = np.unique(claves[::-1], return_index=True)
+    elegidas = comunes[::-1][desde_el_final]
+    resultados[grupos[filas_valor[elegidas]], posiciones[filas_valor[elegidas]]] = valores_objeto[elegidas]
+
+    # Hemoglobinas: cada letra queda si el último evento que la afecta la agrega
+    filas_hb = filas_valor[es_hb]
+    valores_hb = valores_objeto[es_hb]
+    for id_prueba, letra in zip(_PRUEBAS_HB, _LETRAS_HB):
+        es_letra = np.fromiter((v.__class__ is str and v == letra for v in valores_hb),
+                               dtype=bool, count=len(valores_hb))
+        agrega = _ultima_por_grupo(grupos, filas_hb[es_letra], cantidad)
+        quita = _ultima_por_grupo(grupos, filas_hb[(pruebas[filas_hb] == id_prueba) & ~es_letra], cantidad)
+        resultados[agrega > quita, INDICE_RESULTADO[id_prueba]] = letra
+
+    # Procesamiento/FResultado: el actualizado_timestamp más antiguo de las pruebas válidas.
+    # Convertir los datetime a datetime64 cuesta más que compararlos, así que el mínimo
+    # por boleta se busca sobre los objetos.
+    ts_numerico, ts_alpha = columnas[_TS_NUMERICO], columnas[_TS_ALPHA]
+    primer_ts: List = [None] * cantidad
+    for grupo, i in zip(grupos[filas_validas].tolist(), filas_validas.tolist()):
+        ts = ts_numerico[i]
+        if ts is None:
+            ts = ts_alpha[i]
+            if ts is None:
+                continue
+        actual = primer_ts[grupo]
+        if actual is None or ts < actual:
+            primer_ts[grupo] = ts
+
+    # Estado: lo decide la última fila con prueba (válida: A; fuera del reporte: R)
+    ultima_prueba = _ultima_por_grupo(grupos, np.flatnonzero(con_prueba), cantidad).tolist()
+    aceptada = validas.tolist()
+
+    recepciones = columnas[_RECEPCION]
+    updates = _tomar(columnas[_UPDATE], ultima)
+    resultados_por_boleta = resultados.tolist()
+    for (num_ingreso, grupo), indice in zip(numeros.items(), primera.tolist()):
+        row = filas[indice]
+        nombre_paciente = utf_to_ansi(f"{str(row[2] or '').strip()} {str(row[3] or '').strip()}")
+        edad_dias = row[10] or 0
+        edad_horas = row[11] or 0
+        if edad_dias == 0 and edad_horas > 0:
+            edad_dias = int(edad_horas / 24)
+        boleta = create_boleta_base(
+            num_ingreso, fecha_de(row[1]), nombre_paciente, row[4],
+            row[5], edad_dias, fecha_de(row[_RECEPCION]), row[12], row[13]
+        )
+        boleta.Update = updates[grupo]
+        boleta.Resultados = resultados_por_boleta[grupo]
+        boleta.Procesamiento = boleta.FResultado = primer_ts[grupo]
+
+        fila_estado = ultima_prueba[grupo]
+        if fila_estado != _SIN_FILA:
+            boleta.con_pruebas = True
+            if aceptada[fila_estado]:
+                boleta.StdoBoleta = "A"
+                boleta.FechaRechazo = None
+            else:
+                boleta.StdoBoleta = "R"
+                boleta.FechaRechazo = fecha_de(recepciones[fila_estado])
+        boletas_agrupadas[num_ingreso] = boleta
+    return boletas_agrupadas
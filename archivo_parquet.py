@@ -0,0 +1,306 @@
+"""Archivo Parquet de las boletas del reporte, para conservar las exportaciones con sus tipos.
+
+Uso:
+    python archivo_parquet.py ARCHIVO.parquet [--desde 2024-01-01] [--hasta 2024-01-31]
+                              [--columnas Boleta Recepcion Resultado] [--csv salida.csv]
+
+Tiene las mismas columnas que el CSV del reporte, pero las fechas son date32 o
+timestamp, los resultados numéricos float64 y los vacíos nulos en lugar de #NULL#.
+Un resultado numérico que no es un número ("<0.1", "Indeterminado", "1,5") queda
+nulo en su columna y su texto se guarda en ResultadosTexto (columna -> texto).
+ConPruebas guarda lo que decide el formato de FechaRechazo en el CSV, así que el CSV
+se puede regenerar idéntico desde el archivo.
+
+Las boletas se escriben por lotes de FILAS_POR_GRUPO a medida que se recorren, un
+grupo de filas comprimido por lote. El reporte viene ordenado por recepción, así que
+el mínimo y el máximo de Recepcion de cada grupo bastan para leer un rango sin
+descomprimir los demás grupos.
+
+pyarrow es una dependencia opcional (pip install pyarrow): exportar.py importa este
+módulo solo con --parquet.
+"""
+import argparse
+import operator
+import os
+import sys
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import metricas
+from cli_comun import SALIDA_ERROR, SALIDA_OK, fecha_argumento
+from connection import (
+    COLUMNAS_CSV, INDICE_RESULTADO, Boleta, archivo_temporal, fecha_de, write_to_csv,
+)
+
+# Boletas por grupo de filas: cada grupo se arma y se comprime de una vez
+FILAS_POR_GRUPO = 10_000
+
+COMPRESION = "zstd"
+
+# Fracciones de hemoglobina: su resultado es una letra, el resto son numéricos
+_PRUEBAS_TEXTO = frozenset({889, 890, 891, 892})
+
+_TIPOS = {
+    "texto": pa.string(), "crudo": pa.string(), "update": pa.string(),
+    "fecha": pa.date32(), "recepcion": pa.date32(), "rechazo": pa.date32(),
+    "fecha_hora": pa.timestamp("us"),
+}
+# Campos que en el CSV van como texto pero tienen un tipo propio
+_TIPOS_CAMPO = {"Edad": pa.int32()}
+
+
+def _tipo(campo: str, tipo: Any) -> pa.DataType:
+    if isinstance(tipo, int):
+        return pa.string() if tipo in _PRUEBAS_TEXTO else pa.float64()
+    return _TIPOS_CAMPO.get(campo, _TIPOS[tipo])
+
+
+ESQUEMA = pa.schema(
+    [pa.field(campo, _tipo(campo, tipo)) for campo, tipo in COLUMNAS_CSV]
+    + [pa.field("ConPruebas", pa.bool_()),
+       pa.field("ResultadosTexto", pa.map_(pa.string(), pa.string()))],
+    metadata={"formato": "labsis-boletas", "version": "2"},
+)
+
+# Columna -> posición en Boleta.Resultados de los resultados numéricos
+_POSICIONES_NUMERICAS = {
+    campo: INDICE_RESULTADO[tipo] for campo, tipo in COLUMNAS_CSV
+    if isinstance(tipo, int) and tipo not in _PRUEBAS_TEXTO
+}
+
+
+class _Textos:
+    """Resultados numéricos que no son números, por boleta, hasta armar su ResultadosTexto.
+
+    Las columnas de resultados se extraen antes que ResultadosTexto (la última del
+    esquema), así que al llegar a ella ya están anotados los textos de cada boleta.
+    """
+
+    def __init__(self):
+        self._pendientes: Dict[int, List[tuple]] = {}
+        self.boletas: List[str] = []
+
+    def extractor_numerico(self, campo: str, posicion: int) -> Callable[[Boleta], Optional[float]]:
+        pendientes = self._pendientes
+        # Los resultados se repiten mucho: cada valor distinto se convierte una sola vez
+        vistos: Dict[Any, Optional[float]] = {}
+
+        def resultado(b: Boleta) -> Optional[float]:
+            v = b.Resultados[posicion]
+            if v is None:
+                return None
+            try:
+                numero = vistos[v]
+            except KeyError:
+                try:
+                    numero = float(v)
+                except (ValueError, TypeError):
+                    numero = None
+                vistos[v] = numero
+            if numero is None:
+                pendientes.setdefault(id(b), []).append((campo, str(v)))
+            return numero
+
+        return resultado
+
+    def extractor_textos(self, b: Boleta) -> Optional[List[tuple]]:
+        pares = self._pendientes.pop(id(b), None)
+        if pares:
+            self.boletas.append(b.Boleta)
+        return pares
+
+
+def _extractor(campo: str, tipo: Any, textos: _Textos) -> Callable[[Boleta], Any]:
+    """Función que toma de una boleta el valor de una columna con el tipo del esquema."""
+    if isinstance(tipo, int):
+        posicion = INDICE_RESULTADO[tipo]
+        if tipo not in _PRUEBAS_TEXTO:
+            return textos.extractor_numerico(campo, posicion)
+        return lambda b: None if (v := b.Resultados[posicion]) is None else str(v)
+    leer = operator.attrgetter(campo)
+    tipo_arrow = _tipo(campo, tipo)
+    if pa.types.is_date32(tipo_arrow):
+        return lambda b: fecha_de(leer(b))
+    if pa.types.is_timestamp(tipo_arrow):
+        # Se guarda la hora tal como la escribe el CSV, sin convertir a UTC
+        return lambda b: None if (v := leer(b)) is None else v.replace(tzinfo=None)
+    if pa.types.is_integer(tipo_arrow):
+        return lambda b: None if (v := leer(b)) is None else int(v)
+    return lambda b: None if (v := leer(b)) is None else str(v)
+
+
+def _lotes(boletas: Iterable[Boleta], tamano: int) -> Iterator[List[Boleta]]:
+    lote: List[Boleta] = []
+    for boleta in boletas:
+        lote.append(boleta)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def write_to_parquet(boletas_agrupadas: Dict[str, Boleta], filename: str,
+                     medicion: Optional[metricas.MedicionReporte] = None,
+                     progreso: Optional[Callable[[int, int], None]] = None,
+                     filas_por_grupo: int = FILAS_POR_GRUPO,
+                     al_guardar_texto: Optional[Callable[[List[str]], None]] = None) -> None:
+    """Escribe las boletas en un archivo Parquet, un grupo de filas por lote.
+
+    Como write_to_csv, el archivo se escribe en un temporal y se renombra al terminar
+    (ver archivo_temporal) y progreso recibe las boletas escritas y el total tras cada
+    lote. Los errores se propagan. Con medicion se anotan los segundos y los bytes.
+    al_guardar_texto recibe al final las boletas con algún resultado numérico que no
+    es un número y se guardó en ResultadosTexto.
+    """
+    textos = _Textos()
+    extractores = [_extractor(campo, tipo, textos) for campo, tipo in COLUMNAS_CSV]
+    extractores.append(operator.attrgetter("con_pruebas"))
+    extractores.append(textos.extractor_textos)
+    total = len(boletas_agrupadas)
+    escritas = 0
+    with metricas.medir(medicion, "parquet"):
+        with archivo_temporal(filename) as temporal, open(temporal, mode="xb") as f:
+            # El escritor no cierra un archivo que no abrió: se sincroniza con el disco
+            # después de escribir el pie y antes de cerrarlo (fsync necesita escritura)
+            with pq.ParquetWriter(f, ESQUEMA, compression=COMPRESION) as escritor:
+                for lote in _lotes(boletas_agrupadas.values(), filas_por_grupo):
+                    columnas = [pa.array([extraer(b) for b in lote], type=campo.type)
+                                for extraer, campo in zip(extractores, ESQUEMA)]
+                    escritor.write_batch(pa.RecordBatch.from_arrays(columnas, schema=ESQUEMA),
+                                         row_group_size=filas_por_grupo)
+                    escritas += len(lote)
+                    if progreso is not None:
+                        progreso(escritas, total)
+            f.flush()
+            os.fsync(f.fileno())
+    if medicion is not None:
+        medicion.contar("bytes_parquet", os.path.getsize(filename))
+    if textos.boletas and al_guardar_texto is not None:
+        al_guardar_texto(textos.boletas)
+
+
+def _como_fecha(valor: Any) -> Optional[date]:
+    if valor is None or isinstance(valor, date):
+        return valor
+    return date.fromisoformat(valor)
+
+
+def grupos_en_rango(archivo: pq.ParquetFile, desde: Optional[date], hasta: Optional[date]) -> List[int]:
+    """Grupos de filas cuyo rango de Recepcion se cruza con [desde, hasta].
+
+    Un grupo sin estadísticas de Recepcion se incluye siempre.
+    """
+    metadatos = archivo.metadata
+    posicion = archivo.schema_arrow.get_field_index("Recepcion")
+    grupos = []
+    for grupo in range(metadatos.num_row_groups):
+        estadisticas = metadatos.row_group(grupo).column(posicion).statistics
+        if estadisticas is not None and estadisticas.has_min_max:
+            if desde is not None and estadisticas.max < desde:
+                continue
+            if hasta is not None and estadisticas.min > hasta:
+                continue
+        grupos.append(grupo)
+    return grupos
+
+
+def leer_archivo(filename: str, desde: Any = None, hasta: Any = None,
+                 columnas: Optional[Sequence[str]] = None) -> pa.Table:
+    """Boletas con Recepcion entre desde y hasta (inclusive), con las columnas pedidas o todas.
+
+    Solo se leen y descomprimen los grupos de filas que pueden tener boletas del rango
+    (ver grupos_en_rango) y, de ellos, solo las columnas pedidas. Sin desde ni hasta
+    se leen todas las boletas, incluidas las que no tienen Recepcion.
+    """
+    desde, hasta = _como_fecha(desde), _como_fecha(hasta)
+    archivo = pq.ParquetFile(filename)
+    nombres = list(columnas) if columnas else archivo.schema_arrow.names
+    desconocidas = [nombre for nombre in nombres if archivo.schema_arrow.get_field_index(nombre) < 0]
+    if desconocidas:
+        raise ValueError(f"Columnas que no están en el archivo: {', '.join(desconocidas)}")
+    if desde is None and hasta is None:
+        return archivo.read(columns=nombres)
+
+    agregar_recepcion = "Recepcion" not in nombres
+    tabla = archivo.read_row_groups(
+        grupos_en_rango(archivo, desde, hasta),
+        columns=nombres + ["Recepcion"] if agregar_recepcion else nombres,
+    )
+    recepcion = tabla.column("Recepcion")
+    condiciones = []
+    if desde is not None:
+        condiciones.append(pc.greater_equal(recepcion, pa.scalar(desde, pa.date32())))
+    if hasta is not None:
+        condiciones.append(pc.less_equal(recepcion, pa.scalar(hasta, pa.date32())))
+    mascara = condiciones[0] if len(condiciones) == 1 else pc.and_(*condiciones)
+    tabla = tabla.filter(mascara)
+    return tabla.drop_columns(["Recepcion"]) if agregar_recepcion else tabla
+
+
+def leer_boletas(filename: str, desde: Any = None, hasta: Any = None) -> Dict[str, Boleta]:
+    """Boletas del rango reconstruidas desde el archivo, listas para write_to_csv.
+
+    La clave es el num_ingreso; si se repite (reportes de varios servidores) las
+    siguientes llevan "@<posición en el archivo>". Los resultados guardados en
+    ResultadosTexto vuelven a su columna como texto.
+    """
+    tabla = leer_archivo(filename, desde, hasta)
+    valores = {nombre: tabla.column(nombre).to_pylist() for nombre in tabla.column_names}
+    # Los archivos de la versión 1 no tienen ResultadosTexto
+    textos = valores.get("ResultadosTexto") or [None] * tabla.num_rows
+    boletas: Dict[str, Boleta] = {}
+    for fila in range(tabla.num_rows):
+        boleta = Boleta()
+        for campo, tipo in COLUMNAS_CSV:
+            valor = valores[campo][fila]
+            if isinstance(tipo, int):
+                boleta.Resultados[INDICE_RESULTADO[tipo]] = valor
+            else:
+                setattr(boleta, campo, valor)
+        boleta.con_pruebas = valores["ConPruebas"][fila]
+        for campo, texto in textos[fila] or ():
+            boleta.Resultados[_POSICIONES_NUMERICAS[campo]] = texto
+        clave = boleta.Boleta if boleta.Boleta not in boletas else f"{boleta.Boleta}@{fila}"
+        boletas[clave] = boleta
+    return boletas
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Lee un rango o algunas columnas de un archivo Parquet de boletas."
+    )
+    parser.add_argument("archivo", help="archivo .parquet escrito con exportar.py --parquet")
+    parser.add_argument("--desde", type=fecha_argumento, help="fecha de recepción inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=fecha_argumento, help="fecha de recepción final (AAAA-MM-DD)")
+    parser.add_argument("--columnas", nargs="+", metavar="COLUMNA", help="columnas a leer (por defecto todas)")
+    parser.add_argument("--csv", metavar="SALIDA", help="regenera el CSV del reporte para el rango")
+    args = parser.parse_args(argv)
+    if args.desde and args.hasta and args.desde > args.hasta:
+        parser.error("--desde no puede ser posterior a --hasta")
+    if args.csv and args.columnas:
+        parser.error("--csv necesita todas las columnas; no se combina con --columnas")
+
+    try:
+        if args.csv:
+            boletas = leer_boletas(args.archivo, args.desde, args.hasta)
+            write_to_csv(boletas, args.csv, propagar_errores=True)
+            return SALIDA_OK
+        archivo = pq.ParquetFile(args.archivo)
+        grupos = grupos_en_rango(archivo, _como_fecha(args.desde), _como_fecha(args.hasta))
+        tabla = leer_archivo(args.archivo, args.desde, args.hasta, args.columnas)
+    except Exception as e:
+        print(f"Error: {type(e).__name__}: {e}", file=sys.stderr)
+        return SALIDA_ERROR
+
+    print(f"{tabla.num_rows} boletas; leídos {len(grupos)} de {archivo.metadata.num_row_groups} grupos de filas")
+    print(tabla.schema.to_string(show_schema_metadata=False))
+    return SALIDA_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
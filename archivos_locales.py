@@ -0,0 +1,24 @@
+"""Ubicación de los archivos locales de la aplicación: caché, estado del delta y métricas."""
+import os
+import re
+from typing import Dict
+
+
+def deshabilitado(valor: str) -> bool:
+    """True si el valor de una variable LABSIS_* pide deshabilitar la función."""
+    return valor.strip().lower() in ("0", "off", "no")
+
+
+def directorio_local() -> str:
+    """Directorio de los archivos locales: LABSIS_CACHE si es una ruta, si no LOCALAPPDATA o ~/.cache."""
+    directorio = os.environ.get("LABSIS_CACHE", "")
+    if directorio and not deshabilitado(directorio):
+        return directorio
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "Lab2CSV")
+
+
+def nombre_origen(config: Dict[str, str]) -> str:
+    """Identificador del servidor apto para nombre de archivo."""
+    origen = f"{config.get('host', '')}_{config.get('port', '')}_{config.get('dbname', '')}"
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", origen)
@@ -0,0 +1,72 @@
+"""Compara la agregación fila a fila (modo python) con la columnar sobre las mismas filas.
+
+Uso: python benchmarks/bench_agregacion.py [--ordenes 10000 50000] [--repeticiones 5] [--barajar]
+
+Las filas de QUERY_REPORTE se generan en memoria con datos_sinteticos.py. Antes de
+medir se verifica que ambos caminos den las mismas boletas en el mismo orden; con
+--barajar las filas se desordenan, para comprobar también lo que en el bucle depende
+del orden de llegada.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import connection  # noqa: E402
+import datos_sinteticos  # noqa: E402
+from agregacion_columnar import agregar_filas_columnar  # noqa: E402
+
+MOTORES: Dict[str, Callable] = {
+    "bucle": connection._agregar_filas,
+    "columnar": agregar_filas_columnar,
+}
+
+
+def mejor_tiempo(funcion: Callable, filas: List[tuple], repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(filas, {})
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def verificar(filas: List[tuple]) -> int:
+    """Falla si los motores no dan las mismas boletas; devuelve cuántas son."""
+    referencia = connection._agregar_filas(filas, {})
+    columnar = agregar_filas_columnar(filas, {})
+    if list(referencia) != list(columnar):
+        raise SystemExit("Los motores devuelven boletas distintas o en otro orden")
+    distintas = [n for n in referencia if referencia[n] != columnar[n]]
+    if distintas:
+        raise SystemExit(f"Boletas distintas: {', '.join(distintas[:10])}")
+    return len(referencia)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ordenes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--barajar", action="store_true", help="desordena las filas antes de agregar")
+    args = parser.parse_args()
+
+    print(f"{'órdenes':>8} {'filas':>8} {'boletas':>8} " + " ".join(f"{m:>10}" for m in MOTORES) + "  aceleración")
+    for ordenes in args.ordenes:
+        tablas = datos_sinteticos.generar(ordenes, args.semilla)
+        filas = list(datos_sinteticos.filas_reporte(tablas, datetime(2024, 1, 1), datetime(2024, 12, 31)))
+        if args.barajar:
+            random.Random(args.semilla).shuffle(filas)
+        boletas = verificar(filas)
+        tiempos = {motor: mejor_tiempo(funcion, filas, args.repeticiones) for motor, funcion in MOTORES.items()}
+        columnas = " ".join(f"{tiempos[m]:>9.3f}s" for m in MOTORES)
+        print(f"{ordenes:>8} {len(filas):>8} {boletas:>8} {columnas}  {tiempos['bucle'] / tiempos['columnar']:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
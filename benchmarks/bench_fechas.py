@@ -0,0 +1,108 @@
+"""Compara el costo por fila del manejo de fechas con strptime/strftime contra datetime nativos.
+
+Uso: python benchmarks/bench_fechas.py [filas]
+"""
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+
+# --- Camino anterior: cada fecha se convierte a texto y se vuelve a parsear ---
+
+def parse_datetime(date_str, format_str):
+    """Convierte fecha/hora a formato string requerido."""
+    if date_str is None:
+        return None
+    try:
+        dt_obj = datetime.strptime(str(date_str), format_str)
+        return dt_obj.strftime('%Y-%m-%d')
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_datetime_with_time(date_str):
+    """Convierte fecha/hora a formato con tiempo para timestamps."""
+    if date_str is None:
+        return None
+    try:
+        dt_obj = datetime.strptime(str(date_str), '%Y-%m-%d %H:%M:%S.%f')
+        return f"#{dt_obj.strftime('%Y-%m-%d %H:%M:%S')}#"
+    except (ValueError, TypeError):
+        return None
+
+
+def es_mas_antigua(fecha_nueva, fecha_existente):
+    """Devuelve True si fecha_nueva es más antigua que fecha_existente."""
+    try:
+        dt_nueva = datetime.strptime(fecha_nueva.strip("#"), "%Y-%m-%d %H:%M:%S")
+        dt_existente = datetime.strptime(fecha_existente.strip("#"), "%Y-%m-%d %H:%M:%S")
+        return dt_nueva < dt_existente
+    except Exception:
+        return False
+
+
+def fila_anterior(fila, boleta):
+    """Procesa las fechas de una fila como lo hacía _agregar_filas con textos."""
+    toma, recepcion, ts = fila
+    boleta["FechaTomaMx"] = parse_datetime(toma, '%Y-%m-%d %H:%M:%S%z')
+    boleta["Recepcion"] = parse_datetime(recepcion, '%Y-%m-%d %H:%M:%S')
+    ts_final = parse_datetime_with_time(ts)
+    if ts_final:
+        if boleta["Procesamiento"] is None or es_mas_antigua(ts_final, boleta["Procesamiento"]):
+            boleta["Procesamiento"] = ts_final
+        if boleta["FResultado"] is None or es_mas_antigua(ts_final, boleta["FResultado"]):
+            boleta["FResultado"] = ts_final
+
+
+# --- Camino nuevo: se comparan datetime y se formatea solo al exportar ---
+
+def fila_nativa(fila, boleta):
+    """Procesa las fechas de una fila comparando los datetime que entrega psycopg2."""
+    toma, recepcion, ts = fila
+    boleta["FechaTomaMx"] = toma.date()
+    boleta["Recepcion"] = recepcion.date()
+    if ts is not None:
+        if boleta["Procesamiento"] is None or ts < boleta["Procesamiento"]:
+            boleta["Procesamiento"] = ts
+        if boleta["FResultado"] is None or ts < boleta["FResultado"]:
+            boleta["FResultado"] = ts
+
+
+def generar_filas(n, semilla=1):
+    """Filas (fecha_toma_muestra, fecha_recepcion, actualizado_timestamp) como las entrega psycopg2."""
+    rnd = random.Random(semilla)
+    zona = timezone(timedelta(hours=-6))
+    base = datetime(2024, 1, 1, 8, 0, 0)
+    filas = []
+    for _ in range(n):
+        recepcion = base + timedelta(days=rnd.randrange(90), minutes=rnd.randrange(600))
+        toma = (recepcion - timedelta(hours=rnd.randrange(1, 48))).replace(tzinfo=zona)
+        ts = recepcion + timedelta(hours=rnd.randrange(1, 72), microseconds=rnd.randrange(1, 999999))
+        filas.append((toma, recepcion, ts))
+    return filas
+
+
+def medir(funcion, filas, repeticiones=5):
+    """Mejor tiempo en microsegundos por fila."""
+    def correr():
+        boleta = {"Procesamiento": None, "FResultado": None}
+        for fila in filas:
+            funcion(fila, boleta)
+    mejor = min(timeit.repeat(correr, number=1, repeat=repeticiones))
+    return mejor / len(filas) * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    filas = generar_filas(n)
+    anterior = medir(fila_anterior, filas)
+    nativo = medir(fila_nativa, filas)
+    print(f"filas: {n}")
+    print(f"strptime/strftime: {anterior:8.3f} us/fila")
+    print(f"datetime nativo:   {nativo:8.3f} us/fila")
+    print(f"aceleración:       {anterior / nativo:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
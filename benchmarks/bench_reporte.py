@@ -0,0 +1,152 @@
+"""Mide cada etapa del reporte: consulta, agregación, llenado de la tabla y escritura del CSV.
+
+Uso contra un PostgreSQL local cargado con datos_sinteticos.py:
+    python benchmarks/bench_reporte.py --dsn "host=localhost dbname=labsis_bench" --desde 2024-01-01 --hasta 2024-03-31
+
+Sin PostgreSQL, con las filas de QUERY_REPORTE generadas en memoria (modos python y columnar):
+    python benchmarks/bench_reporte.py --falso --ordenes 50000 [--modo columnar]
+
+--tabla agrega el llenado del modelo de la vista previa (requiere PyQt6; usa la
+plataforma offscreen). Por cada etapa se informa el tiempo, filas por segundo y el
+pico de memoria residente del proceso al terminarla.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import connection  # noqa: E402
+import datos_sinteticos  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def pico_rss_mb() -> Optional[float]:
+    """Máximo de memoria residente del proceso hasta ahora, en MB."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def medir(etapa: str, filas: Callable[[Any], int], funcion: Callable[[], Any],
+          resultados: List[Dict[str, Any]]) -> Any:
+    """Ejecuta una etapa y agrega su medición a resultados."""
+    inicio = time.perf_counter()
+    valor = funcion()
+    segundos = time.perf_counter() - inicio
+    n = filas(valor)
+    resultados.append({
+        "etapa": etapa,
+        "segundos": round(segundos, 4),
+        "filas": n,
+        "filas_por_segundo": round(n / segundos) if segundos > 0 else None,
+        "pico_rss_mb": pico_rss_mb(),
+    })
+    return valor
+
+
+def _consultar(dsn: str, modo: str, fecha_inicio: str, fecha_fin: str) -> List[tuple]:
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            query = connection.QUERY_REPORTE_PIVOTE if modo == connection.MODO_SQL else connection.QUERY_REPORTE
+            cursor.execute(query, (fecha_inicio, fecha_fin))
+            return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _agregar(filas: List[tuple], modo: str) -> Dict[str, connection.Boleta]:
+    boletas: Dict[str, connection.Boleta] = {}
+    connection._agregador(modo)(filas, boletas)
+    connection._corregir_boletas_anormales(boletas)
+    return boletas
+
+
+def _llenar_tabla(boletas: Dict[str, connection.Boleta]) -> int:
+    """Lo mismo que OpenPreviewResults._populate_table: carga el modelo y ajusta el ancho de las columnas."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6 import QtWidgets
+    import vista_previa
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    vista = QtWidgets.QTableView()
+    modelo = vista_previa.BoletasTableModel(vista_previa.OpenPreviewResults.COLUMNAS_NORMALES,
+                                            vista_previa.OpenPreviewResults.RESULTADOS_ALIAS)
+    vista.setModel(modelo)
+    vista.setSortingEnabled(False)
+    modelo.set_boletas(boletas.values())
+    vista.setSortingEnabled(True)
+    vista.resizeColumnsToContents()
+    app.processEvents()
+    return modelo.rowCount()
+
+
+def _escribir_csv(boletas: Dict[str, connection.Boleta], directorio: str) -> int:
+    ruta = os.path.join(directorio, "bench.csv")
+    with redirect_stdout(io.StringIO()):
+        connection.write_to_csv(boletas, ruta, propagar_errores=True)
+    return os.path.getsize(ruta)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--dsn", help="cadena de conexión de psycopg2 a la base de pruebas")
+    origen.add_argument("--falso", action="store_true", help="genera las filas en memoria en lugar de consultar")
+    parser.add_argument("--ordenes", type=int, default=20000, help="órdenes a generar con --falso")
+    parser.add_argument("--desde", default="2024-01-01")
+    parser.add_argument("--hasta", default="2024-12-31")
+    parser.add_argument("--modo", choices=(connection.MODO_SQL, connection.MODO_PYTHON, connection.MODO_COLUMNAR),
+                        default=None,
+                        help="por defecto sql con --dsn y python con --falso")
+    parser.add_argument("--tabla", action="store_true", help="mide también el llenado de la tabla (PyQt6)")
+    parser.add_argument("--json", action="store_true", help="imprime una línea JSON por etapa")
+    args = parser.parse_args()
+
+    modo = args.modo or (connection.MODO_PYTHON if args.falso else connection.MODO_SQL)
+    if args.falso and modo == connection.MODO_SQL:
+        parser.error("--falso solo genera las filas de QUERY_REPORTE (modos python y columnar)")
+
+    resultados: List[Dict[str, Any]] = []
+    if args.falso:
+        tablas = datos_sinteticos.generar(args.ordenes)
+        inicio, fin = datetime.fromisoformat(args.desde), datetime.fromisoformat(args.hasta)
+        filas = medir("consulta (en memoria)", len,
+                      lambda: list(datos_sinteticos.filas_reporte(tablas, inicio, fin)), resultados)
+    else:
+        filas = medir("consulta", len, lambda: _consultar(args.dsn, modo, args.desde, args.hasta), resultados)
+
+    boletas = medir("agregacion", lambda _: len(filas), lambda: _agregar(filas, modo), resultados)
+    if args.tabla:
+        medir("tabla", lambda n: n, lambda: _llenar_tabla(boletas), resultados)
+    with tempfile.TemporaryDirectory() as directorio:
+        medir("csv", lambda _: len(boletas), lambda: _escribir_csv(boletas, directorio), resultados)
+        resultados[-1]["bytes"] = os.path.getsize(os.path.join(directorio, "bench.csv"))
+
+    if args.json:
+        for resultado in resultados:
+            print(json.dumps(dict(resultado, modo=modo, boletas=len(boletas))))
+        return
+    print(f"modo {modo}: {len(filas)} filas, {len(boletas)} boletas")
+    for r in resultados:
+        rss = f"{r['pico_rss_mb']:.0f} MB" if r["pico_rss_mb"] is not None else "n/d"
+        print(f"  {r['etapa']:<22} {r['segundos']:>9.3f} s  {r['filas_por_segundo'] or 0:>10} filas/s  pico RSS {rss}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Esquema y datos sintéticos con la forma de labsis para medir el reporte sin el servidor de producción.
+
+Uso:
+    python benchmarks/datos_sinteticos.py --dsn "host=localhost dbname=labsis_bench user=postgres" --ordenes 100000
+
+Los datos imitan lo que se ve en producción: varias prueba_orden por orden, resultados
+numéricos y alfanuméricos, fracciones de hemoglobina 889-892 validadas o no, muestras
+rechazadas (sin pruebas o solo con pruebas fuera del reporte), boletas con varias
+órdenes en días distintos y órdenes basura con num_ingreso '1'.
+"""
+import argparse
+import io
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ESQUEMA = """
+    CREATE TABLE paciente (id integer PRIMARY KEY, nombre varchar, apellido varchar,
+                           sexo varchar, ci_paciente varchar);
+    CREATE TABLE servicio_medico (id integer PRIMARY KEY, codigo_bloom varchar, codigo_dtic varchar);
+    CREATE TABLE prueba (id integer PRIMARY KEY, nombre varchar);
+    CREATE TABLE orden_trabajo (id integer PRIMARY KEY, num_ingreso varchar,
+                                fecha_toma_muestra timestamptz, paciente_id integer,
+                                numero varchar, servicio_medico_id integer);
+    CREATE TABLE orden_trabajo_datos_extra (id integer PRIMARY KEY, orden_id integer,
+                                            edad_dias integer, edad_horas integer,
+                                            fecha_recepcion timestamp, update varchar);
+    CREATE TABLE prueba_orden (id integer PRIMARY KEY, orden_id integer, prueba_id integer);
+    CREATE TABLE resultado_numer (id integer PRIMARY KEY, pruebao_id integer, valor numeric,
+                                  actualizado_timestamp timestamp);
+    CREATE TABLE resultado_alpha (id integer PRIMARY KEY, pruebao_id integer, valor varchar,
+                                  validado_por integer, actualizado_timestamp timestamp);
+"""
+
+INDICES = """
+    CREATE INDEX ON orden_trabajo (num_ingreso);
+    CREATE INDEX ON orden_trabajo_datos_extra (orden_id);
+    CREATE INDEX ON orden_trabajo_datos_extra (fecha_recepcion);
+    CREATE INDEX ON prueba_orden (orden_id);
+    CREATE INDEX ON resultado_numer (pruebao_id);
+    CREATE INDEX ON resultado_numer (actualizado_timestamp);
+    CREATE INDEX ON resultado_alpha (pruebao_id);
+    CREATE INDEX ON resultado_alpha (actualizado_timestamp);
+"""
+
+COLUMNAS = {
+    "paciente": ("id", "nombre", "apellido", "sexo", "ci_paciente"),
+    "servicio_medico": ("id", "codigo_bloom", "codigo_dtic"),
+    "prueba": ("id", "nombre"),
+    "orden_trabajo": ("id", "num_ingreso", "fecha_toma_muestra", "paciente_id", "numero",
+                      "servicio_medico_id"),
+    "orden_trabajo_datos_extra": ("id", "orden_id", "edad_dias", "edad_horas", "fecha_recepcion",
+                                  "update"),
+    "prueba_orden": ("id", "orden_id", "prueba_id"),
+    "resultado_numer": ("id", "pruebao_id", "valor", "actualizado_timestamp"),
+    "resultado_alpha": ("id", "pruebao_id", "valor", "validado_por", "actualizado_timestamp"),
+}
+
+PRUEBAS_NUMERICAS = (852, 859, 854, 883, 886, 885, 888)
+PRUEBAS_HB = (889, 890, 891, 892)
+PRUEBA_AJENA = 999  # Prueba que no forma parte del reporte
+NOMBRES = ("José", "María", "Ñoño", "Ángel", "Luis", "Ana", "Sofía", "Julián")
+APELLIDOS = ("Peña", "Gómez", " Ruiz ", "Hernández", "López", None)
+ZONA = timezone(timedelta(hours=-6))
+
+Tablas = Dict[str, List[tuple]]
+
+
+def generar(ordenes: int, semilla: int = 1, desde: datetime = datetime(2024, 1, 1),
+            dias: int = 90) -> Tablas:
+    """Filas de cada tabla para el número de órdenes pedido, repartidas en dias de recepción."""
+    rnd = random.Random(semilla)
+    tablas: Tablas = {tabla: [] for tabla in COLUMNAS}
+    tablas["prueba"] = [(p, f"Prueba {p}") for p in PRUEBAS_NUMERICAS + PRUEBAS_HB + (PRUEBA_AJENA,)]
+    tablas["servicio_medico"] = [
+        (i, f"B{i:03d}" if i % 7 else None, f"D{i}") for i in range(1, 41)
+    ]
+    ids = {"po": 0, "rn": 0, "ra": 0}
+    anteriores: List[Tuple[str, datetime, int, int]] = []
+
+    for orden_id in range(1, ordenes + 1):
+        recepcion = desde + timedelta(
+            seconds=int((orden_id - 1) * dias * 86400 / max(ordenes, 1)) + rnd.randrange(3600)
+        )
+        if orden_id % 97 == 0:
+            num_ingreso, paciente_id, servicio = "1", orden_id, rnd.randint(1, 40)
+            toma = recepcion - timedelta(hours=rnd.randint(2, 48))
+        elif anteriores and rnd.random() < 0.03:
+            # Segunda orden de una boleta anterior (repetición de muestra), otro día
+            num_ingreso, toma, paciente_id, servicio = rnd.choice(anteriores[-500:])
+        else:
+            num_ingreso, paciente_id, servicio = str(100000 + orden_id), orden_id, rnd.randint(1, 40)
+            toma = recepcion - timedelta(hours=rnd.randint(2, 48))
+            anteriores.append((num_ingreso, toma, paciente_id, servicio))
+
+        tablas["paciente"].append((
+            orden_id, rnd.choice(NOMBRES), rnd.choice(APELLIDOS), rnd.choice("MF"), str(5000000 + orden_id)
+        ))
+        tablas["orden_trabajo"].append((
+            orden_id, num_ingreso, toma.replace(tzinfo=ZONA, microsecond=rnd.choice((0, 250000))),
+            paciente_id, str(orden_id), servicio,
+        ))
+        tablas["orden_trabajo_datos_extra"].append((
+            orden_id, orden_id, rnd.choice((0, 0, 2, 5, None)), rnd.choice((0, 36, 72, None)),
+            recepcion, rnd.choice((None, None, None, "x", "X")),
+        ))
+
+        tipo = rnd.random()
+        if tipo < 0.05:
+            pruebas: List[int] = []  # Rechazada sin pruebas
+        elif tipo < 0.12:
+            pruebas = [PRUEBA_AJENA]  # Rechazada: solo pruebas fuera del reporte
+        else:
+            pruebas = rnd.sample(PRUEBAS_NUMERICAS, rnd.randint(1, 5))
+            if rnd.random() < 0.6:
+                pruebas += rnd.sample(PRUEBAS_HB, rnd.randint(1, 4))
+            if rnd.random() < 0.1:
+                pruebas.append(PRUEBA_AJENA)
+
+        for prueba_id in pruebas:
+            ids["po"] += 1
+            tablas["prueba_orden"].append((ids["po"], orden_id, prueba_id))
+            if rnd.random() < 0.08:
+                continue  # Pendiente de resultado
+            actualizado = recepcion + timedelta(hours=rnd.randint(1, 72),
+                                                microseconds=rnd.randint(1, 999999))
+            if prueba_id in PRUEBAS_HB:
+                ids["ra"] += 1
+                tablas["resultado_alpha"].append((
+                    ids["ra"], ids["po"], rnd.choice("FASC"), rnd.choice((1, 1, 1, 0, None)), actualizado
+                ))
+                if rnd.random() < 0.2:
+                    ids["rn"] += 1
+                    tablas["resultado_numer"].append((
+                        ids["rn"], ids["po"], Decimal(f"{rnd.uniform(0, 100):.2f}"), actualizado
+                    ))
+            else:
+                ids["rn"] += 1
+                valor = Decimal(f"{rnd.uniform(0, 300):.{rnd.choice((1, 2, 3))}f}") if rnd.random() < 0.95 else None
+                tablas["resultado_numer"].append((
+                    ids["rn"], ids["po"], valor, actualizado if rnd.random() < 0.97 else None
+                ))
+    return tablas
+
+
+def _copiar(cursor, tabla: str, filas: List[tuple]) -> None:
+    """Carga las filas con COPY (los textos generados no tienen tabuladores ni saltos)."""
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write("\t".join("\\N" if v is None else str(v) for v in fila))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_from(buffer, tabla, columns=COLUMNAS[tabla], null="\\N")
+
+
+def cargar(conn, tablas: Tablas, recrear: bool = True, indices: bool = True) -> None:
+    """Crea el esquema en la base conectada y carga los datos generados."""
+    with conn.cursor() as cursor:
+        if recrear:
+            cursor.execute("DROP TABLE IF EXISTS " + ", ".join(COLUMNAS))
+        cursor.execute(ESQUEMA)
+        for tabla, filas in tablas.items():
+            _copiar(cursor, tabla, filas)
+        if indices:
+            cursor.execute(INDICES)
+        cursor.execute("ANALYZE")
+    conn.commit()
+
+
+def filas_reporte(tablas: Tablas, fecha_inicio: datetime, fecha_fin: datetime) -> Iterator[tuple]:
+    """Filas de QUERY_REPORTE calculadas en memoria, para medir sin PostgreSQL (modo python).
+
+    Son las mismas filas que devuelve PostgreSQL, aunque dentro de una orden pueden
+    llegar en otro orden.
+    """
+    pacientes = {p[0]: p for p in tablas["paciente"]}
+    servicios = {s[0]: s for s in tablas["servicio_medico"]}
+    extras = {e[1]: e for e in tablas["orden_trabajo_datos_extra"]}
+    pruebas_por_orden: Dict[int, List[tuple]] = {}
+    for po in tablas["prueba_orden"]:
+        pruebas_por_orden.setdefault(po[1], []).append(po)
+    numericos: Dict[int, List[tuple]] = {}
+    for rn in tablas["resultado_numer"]:
+        numericos.setdefault(rn[1], []).append(rn)
+    alfas: Dict[int, List[tuple]] = {}
+    for ra in tablas["resultado_alpha"]:
+        alfas.setdefault(ra[1], []).append(ra)
+
+    ordenes = [
+        (extras[ot[0]], ot) for ot in tablas["orden_trabajo"]
+        if fecha_inicio <= extras[ot[0]][4] <= fecha_fin
+    ]
+    ordenes.sort(key=lambda par: par[0][4])
+    vacio: List[Optional[tuple]] = [None]
+    for extra, ot in ordenes:
+        paciente = pacientes[ot[3]]
+        servicio = servicios[ot[5]]
+        # psycopg2 entrega timestamptz en la zona de la sesión; se asume UTC
+        base = (ot[1], ot[2].astimezone(timezone.utc), paciente[1], paciente[2], paciente[3], paciente[4])
+        for po in pruebas_por_orden.get(ot[0], vacio):
+            for rn in numericos.get(po[0], vacio) if po else vacio:
+                for ra in alfas.get(po[0], vacio) if po else vacio:
+                    yield base + (
+                        rn[3] if rn else None, rn[2] if rn else None, po[2] if po else None,
+                        ot[4], extra[2], extra[3], servicio[1], servicio[2], extra[4],
+                        ra[2] if ra else None, ra[3] if ra else None, extra[5],
+                        ra[4] if ra else None,
+                    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", required=True, help="cadena de conexión de psycopg2 a la base de pruebas")
+    parser.add_argument("--ordenes", type=int, default=20000)
+    parser.add_argument("--dias", type=int, default=90, help="días de recepción a cubrir desde 2024-01-01")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--sin-indices", action="store_true")
+    args = parser.parse_args()
+
+    import psycopg2
+
+    tablas = generar(args.ordenes, args.semilla, dias=args.dias)
+    conn = psycopg2.connect(args.dsn)
+    try:
+        cargar(conn, tablas, indices=not args.sin_indices)
+    finally:
+        conn.close()
+    print(", ".join(f"{tabla}: {len(filas)}" for tabla, filas in tablas.items()))
+
+
+if __name__ == "__main__":
+    main()
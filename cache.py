@@ -0,0 +1,154 @@
+"""Caché local en SQLite de las boletas extraídas, por día de recepción.
+
+Cada entrada guarda las boletas parciales de un día (ver generate_report_cacheado en
+connection.py) junto con la firma de sus datos en el servidor al momento de leerlo.
+No depende de connection.py: las boletas se guardan como tuplas.
+"""
+import os
+import pickle
+import sqlite3
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from archivos_locales import deshabilitado, directorio_local, nombre_origen
+
+# Se incrementa si cambia el esquema de las tablas
+VERSION_CACHE = 1
+TAMANO_MAXIMO = 256 * 1024 * 1024  # bytes de datos guardados antes de desalojar
+
+
+def ruta_por_defecto(config: Dict[str, str]) -> Optional[str]:
+    """Archivo de caché para un servidor; None si está deshabilitada con LABSIS_CACHE=off."""
+    if deshabilitado(os.environ.get("LABSIS_CACHE", "")):
+        return None
+    return os.path.join(directorio_local(), f"cache_{nombre_origen(config)}.sqlite")
+
+
+class CacheBoletas:
+    """Boletas por (día, completo) guardadas en un archivo SQLite.
+
+    completo es False solo para el último día de un rango, del que BETWEEN toma
+    únicamente la medianoche. formato describe el contenido de las tuplas; si no
+    coincide con el del archivo, la caché se vacía. Al superar tamano_maximo se
+    desalojan los días usados hace más tiempo.
+    """
+
+    def __init__(self, ruta: str, formato: str = "", tamano_maximo: int = TAMANO_MAXIMO):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self.tamano_maximo = tamano_maximo
+        self._db = sqlite3.connect(ruta, timeout=30)
+        self._crear_tablas(f"{VERSION_CACHE}:{formato}")
+
+    def _crear_tablas(self, formato: str) -> None:
+        with self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+                CREATE TABLE IF NOT EXISTS dias (
+                    dia TEXT NOT NULL,
+                    completo INTEGER NOT NULL,
+                    firma TEXT,
+                    datos BLOB NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    usado REAL NOT NULL,
+                    PRIMARY KEY (dia, completo)
+                );
+                CREATE TABLE IF NOT EXISTS boletas_dia (
+                    num_ingreso TEXT NOT NULL,
+                    dia TEXT NOT NULL,
+                    completo INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_boletas_dia_num ON boletas_dia (num_ingreso);
+                CREATE INDEX IF NOT EXISTS idx_boletas_dia_dia ON boletas_dia (dia, completo);
+            """)
+            fila = self._db.execute("SELECT valor FROM meta WHERE clave = 'formato'").fetchone()
+            if fila is None or fila[0] != formato:
+                self._db.execute("DELETE FROM dias")
+                self._db.execute("DELETE FROM boletas_dia")
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('formato', ?)", (formato,))
+
+    def leer(self, dia: date, completo: bool) -> Optional[Tuple[Optional[str], List[tuple]]]:
+        """Firma y tuplas guardadas para un día, o None si no está en la caché."""
+        clave = (dia.isoformat(), int(completo))
+        fila = self._db.execute(
+            "SELECT firma, datos FROM dias WHERE dia = ? AND completo = ?", clave
+        ).fetchone()
+        if fila is None:
+            return None
+        with self._db:
+            self._db.execute(
+                "UPDATE dias SET usado = ? WHERE dia = ? AND completo = ?", (time.time(),) + clave
+            )
+        return fila[0], pickle.loads(fila[1])
+
+    def guardar(self, dia: date, completo: bool, firma: Optional[str],
+                registros: List[tuple], num_ingresos: Iterable[str]) -> None:
+        """Guarda (o reemplaza) las tuplas de un día y desaloja si se supera el tamaño."""
+        clave = (dia.isoformat(), int(completo))
+        datos = pickle.dumps(registros, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._db:
+            self._db.execute("DELETE FROM boletas_dia WHERE dia = ? AND completo = ?", clave)
+            self._db.execute(
+                "INSERT OR REPLACE INTO dias VALUES (?, ?, ?, ?, ?, ?)",
+                clave + (firma, datos, len(datos), time.time()),
+            )
+            self._db.executemany(
+                "INSERT INTO boletas_dia VALUES (?, ?, ?)",
+                ((num_ingreso,) + clave for num_ingreso in num_ingresos),
+            )
+        self._desalojar()
+
+    def invalidar(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> int:
+        """Descarta los días entre desde y hasta (inclusive; sin límites, todos). Devuelve cuántos."""
+        condicion = "dia >= ? AND dia <= ?"
+        limites = ((desde or date.min).isoformat(), (hasta or date.max).isoformat())
+        with self._db:
+            self._db.execute(f"DELETE FROM boletas_dia WHERE {condicion}", limites)
+            return self._db.execute(f"DELETE FROM dias WHERE {condicion}", limites).rowcount
+
+    def invalidar_boletas(self, num_ingresos: Iterable[str]) -> int:
+        """Descarta los días que contienen alguna de las boletas. Devuelve cuántos."""
+        descartados = 0
+        with self._db:
+            for num_ingreso in set(num_ingresos):
+                dias = self._db.execute(
+                    "SELECT DISTINCT dia, completo FROM boletas_dia WHERE num_ingreso = ?",
+                    (num_ingreso,),
+                ).fetchall()
+                for clave in dias:
+                    self._db.execute("DELETE FROM boletas_dia WHERE dia = ? AND completo = ?", clave)
+                    descartados += self._db.execute(
+                        "DELETE FROM dias WHERE dia = ? AND completo = ?", clave
+                    ).rowcount
+        return descartados
+
+    def tamano(self) -> int:
+        """Bytes de datos guardados."""
+        return self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM dias").fetchone()[0]
+
+    def _desalojar(self) -> None:
+        """Quita los días menos usados recientemente hasta quedar bajo tamano_maximo."""
+        exceso = self.tamano() - self.tamano_maximo
+        if exceso <= 0:
+            return
+        with self._db:
+            for dia, completo, bytes_dia in self._db.execute(
+                "SELECT dia, completo, bytes FROM dias ORDER BY usado"
+            ).fetchall():
+                self._db.execute("DELETE FROM boletas_dia WHERE dia = ? AND completo = ?", (dia, completo))
+                self._db.execute("DELETE FROM dias WHERE dia = ? AND completo = ?", (dia, completo))
+                exceso -= bytes_dia
+                if exceso <= 0:
+                    break
+
+    def cerrar(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "CacheBoletas":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
@@ -0,0 +1,25 @@
+"""Piezas comunes de las herramientas de línea de comandos (exportar.py, estadisticas.py,
+diagnostico.py y archivo_parquet.py).
+
+Códigos de salida:
+
+    0  terminado sin advertencias
+    1  error de conexión, de consulta o de escritura
+    2  argumentos inválidos (los que devuelve argparse)
+    3  terminado con advertencias
+"""
+import argparse
+from datetime import date
+
+SALIDA_OK = 0
+SALIDA_ERROR = 1
+SALIDA_USO = 2
+SALIDA_ADVERTENCIAS = 3
+
+
+def fecha_argumento(texto: str) -> str:
+    """Valida una fecha AAAA-MM-DD para argparse (type= de --desde/--hasta en todas las herramientas)."""
+    try:
+        return date.fromisoformat(texto).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida: {texto!r} (se espera AAAA-MM-DD)")
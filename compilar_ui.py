@@ -0,0 +1,58 @@
+"""Compila los formularios de Qt Designer a módulos de Python (ui_fechas.py, ui_preview.py, ...).
+
+Uso: python compilar_ui.py [--verificar]
+
+La aplicación importa los módulos compilados en lugar de leer los .ui al abrir. Hay
+que ejecutar este script después de editar un .ui; con --verificar solo se comprueba
+que los módulos estén al día (código de salida 1 si no), útil antes de empaquetar.
+"""
+import argparse
+import io
+import sys
+
+from PyQt6 import uic
+
+FORMULARIOS = {
+    "fechas.ui": "ui_fechas.py",
+    "preview.ui": "ui_preview.py",
+    "estadisticas.ui": "ui_estadisticas.py",
+}
+
+
+def compilar(formulario: str) -> str:
+    salida = io.StringIO()
+    uic.compileUi(formulario, salida)
+    return salida.getvalue()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--verificar", action="store_true",
+                        help="no escribe; falla si algún módulo no corresponde a su .ui")
+    args = parser.parse_args()
+
+    desactualizados = []
+    for formulario, modulo in FORMULARIOS.items():
+        codigo = compilar(formulario)
+        try:
+            with open(modulo, encoding="utf-8") as f:
+                actual = f.read()
+        except FileNotFoundError:
+            actual = None
+        if actual == codigo:
+            continue
+        if args.verificar:
+            desactualizados.append(modulo)
+            continue
+        with open(modulo, "w", encoding="utf-8") as f:
+            f.write(codigo)
+        print(f"{formulario} -> {modulo}")
+
+    if desactualizados:
+        print(f"Módulos desactualizados: {', '.join(desactualizados)} (ejecute python compilar_ui.py)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
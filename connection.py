@@ -1,82 +1,309 @@
+import codecs
+import configparser
+import itertools
+import operator
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
 import psycopg2
-from datetime import datetime
+import psycopg2.extras
+import psycopg2.pool
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
-def connect_to_db() -> Optional[psycopg2.extensions.connection]:
+import delta
+import metricas
+from cache import CacheBoletas, ruta_por_defecto
+
+# Valores por defecto de la conexión; se pueden sobrescribir con labsis.ini o
+# con variables de entorno LABSIS_HOST, LABSIS_PORT, LABSIS_DB, LABSIS_USER y LABSIS_PASSWORD.
+CONFIG_DEFAULT = {
+    "host": "172.17.90.26",  # Ambiente de producción
+    "port": "5432",
+    "dbname": "labsis",
+    "user": "labsis",
+    "password": "labsis",
+}
+
+def cargar_configuracion(ruta: Optional[str] = None) -> Dict[str, str]:
+    """Lee los parámetros de conexión desde labsis.ini y el entorno."""
+    config = dict(CONFIG_DEFAULT)
+    ruta = ruta or os.environ.get("LABSIS_CONFIG", "labsis.ini")
+    parser = configparser.ConfigParser()
+    if parser.read(ruta, encoding="utf-8") and parser.has_section("labsis"):
+        for clave in config:
+            if parser.has_option("labsis", clave):
+                config[clave] = parser.get("labsis", clave)
+    entorno = {"host": "LABSIS_HOST", "port": "LABSIS_PORT", "dbname": "LABSIS_DB",
+               "user": "LABSIS_USER", "password": "LABSIS_PASSWORD"}
+    for clave, variable in entorno.items():
+        if os.environ.get(variable):
+            config[clave] = os.environ[variable]
+    return config
+
+# Servidores adicionales del modo multiorigen: secciones [labsis:<nombre>] de labsis.ini
+PREFIJO_ORIGEN = "labsis:"
+
+# Segundos que se espera a cada servidor (conexión más consulta) si su sección no indica timeout
+TIMEOUT_ORIGEN = 300
+
+def cargar_origenes(ruta: Optional[str] = None) -> Dict[str, Dict[str, str]]:
+    """Servidores del modo multiorigen, en el orden de labsis.ini.
+
+    Cada sección [labsis:<nombre>] parte de CONFIG_DEFAULT y puede indicar timeout
+    (segundos). Las variables LABSIS_* no se aplican: cada sección es un servidor
+    distinto.
+    """
+    ruta = ruta or os.environ.get("LABSIS_CONFIG", "labsis.ini")
+    parser = configparser.ConfigParser()
+    parser.read(ruta, encoding="utf-8")
+    origenes = {}
+    for seccion in parser.sections():
+        if not seccion.startswith(PREFIJO_ORIGEN):
+            continue
+        config = dict(CONFIG_DEFAULT, timeout=str(TIMEOUT_ORIGEN))
+        for clave in config:
+            if parser.has_option(seccion, clave):
+                config[clave] = parser.get(seccion, clave)
+        origenes[seccion[len(PREFIJO_ORIGEN):].strip()] = config
+    return origenes
+
+def connect_to_db(config: Optional[Dict[str, str]] = None) -> Optional[psycopg2.extensions.connection]:
     """Establece conexión con la base de datos PostgreSQL."""
     try:
-        return psycopg2.connect(
-            dbname="labsis",
-            user="labsis",
-            password="labsis",
-            host="172.17.90.26", # Ambiente de producción
-            #host="localhost", # Ambiente de desarrollo
-            port="5432"
-        )
+        return psycopg2.connect(**(config or cargar_configuracion()))
     except Exception as e:
         print(f"Error connecting to the database: {e}")
         return None
 
-def parse_datetime(date_str: str, format_str: str) -> Optional[str]:
-    """Convierte fecha/hora a formato string requerido."""
-    if date_str is None:
-        return None
-    try:
-        dt_obj = datetime.strptime(str(date_str), format_str)
-        return dt_obj.strftime('%Y-%m-%d')
-    except (ValueError, TypeError):
-        return None
+class PoolConexiones:
+    """Pool de conexiones reutilizables compartido por el reporte y las ediciones de Update."""
 
-def parse_datetime_with_time(date_str: str) -> Optional[str]:
-    """Convierte fecha/hora a formato con tiempo para timestamps."""
-    if date_str is None:
-        return None
-    try:
-        dt_obj = datetime.strptime(str(date_str), '%Y-%m-%d %H:%M:%S.%f')
-        return f"#{dt_obj.strftime('%Y-%m-%d %H:%M:%S')}#"
-    except (ValueError, TypeError):
-        return None
+    def __init__(self, config: Optional[Dict[str, str]] = None, minconn: int = 1,
+                 maxconn: int = 4, verificar_tras: float = 30.0):
+        self.config = config or cargar_configuracion()
+        self.minconn = minconn
+        self.maxconn = maxconn
+        # Segundos de inactividad tras los cuales se verifica la conexión antes de prestarla
+        self.verificar_tras = verificar_tras
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self._ultimo_uso: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _obtener_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None or self._pool.closed:
+                try:
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self.config
+                    )
+                except psycopg2.Error as e:
+                    raise ConnectionError(f"No se pudo conectar a la base de datos: {e}") from e
+            return self._pool
+
+    def _esta_sana(self, conn: psycopg2.extensions.connection) -> bool:
+        """Verifica con SELECT 1 las conexiones cerradas o inactivas por mucho tiempo."""
+        if conn.closed:
+            return False
+        if time.monotonic() - self._ultimo_uso.get(id(conn), 0.0) < self.verificar_tras:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _prestar(self) -> psycopg2.extensions.connection:
+        pool = self._obtener_pool()
+        # Un reintento: si la conexión del pool está rota se descarta y se abre otra
+        for _ in range(2):
+            try:
+                conn = pool.getconn()
+            except psycopg2.pool.PoolError:
+                raise  # Pool agotado: no es un fallo de conexión
+
+            except psycopg2.Error as e:
+                raise ConnectionError(f"No se pudo conectar a la base de datos: {e}") from e
+            if self._esta_sana(conn):
+                return conn
+            self._ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+        raise ConnectionError("No se pudo obtener una conexión sana a la base de datos")
+
+    def _devolver(self, conn: psycopg2.extensions.connection) -> None:
+        descartar = bool(conn.closed)
+        if not descartar:
+            try:
+                conn.rollback()  # Cierra la transacción abierta por las consultas de lectura
+            except psycopg2.Error:
+                descartar = True
+        if descartar:
+            self._ultimo_uso.pop(id(conn), None)
+        else:
+            self._ultimo_uso[id(conn)] = time.monotonic()
+        with self._lock:
+            pool = self._pool
+        if pool is not None and not pool.closed:
+            pool.putconn(conn, close=descartar)
+        else:
+            conn.close()
+
+    @contextmanager
+    def conexion(self) -> Iterator[psycopg2.extensions.connection]:
+        """Presta una conexión del pool y la devuelve al salir del bloque."""
+        conn = self._prestar()
+        try:
+            yield conn
+        finally:
+            self._devolver(conn)
+
+    def cerrar(self) -> None:
+        """Cierra todas las conexiones del pool."""
+        with self._lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+            self._pool = None
+            self._ultimo_uso.clear()
+
+_pool_global: Optional[PoolConexiones] = None
+_pool_lock = threading.Lock()
+
+def obtener_pool() -> PoolConexiones:
+    """Devuelve el pool de conexiones de la aplicación, creándolo en el primer uso."""
+    global _pool_global
+    with _pool_lock:
+        if _pool_global is None:
+            _pool_global = PoolConexiones()
+        return _pool_global
+
+def cerrar_pool() -> None:
+    """Cierra el pool de conexiones de la aplicación si se llegó a crear."""
+    global _pool_global
+    with _pool_lock:
+        if _pool_global is not None:
+            _pool_global.cerrar()
+            _pool_global = None
+
+def fecha_de(valor: Any) -> Optional[date]:
+    """Fecha sin hora de un date/datetime devuelto por psycopg2, o None."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return None
+
+_TABLA_ANSI = str.maketrans({
+    'ñ': 'n', 'Ñ': 'N',
+    'á': 'a', 'Á': 'A', 'é': 'e', 'É': 'E',
+    'í': 'i', 'Í': 'I', 'ó': 'o', 'Ó': 'O',
+    'ú': 'u', 'Ú': 'U'
+})
 
 def utf_to_ansi(text: str) -> str:
     """Convierte caracteres UTF a ANSI (ñ por n, vocales con tilde por sin tilde)."""
-    replacements = {
-        'ñ': 'n', 'Ñ': 'N',
-        'á': 'a', 'Á': 'A', 'é': 'e', 'É': 'E',
-        'í': 'i', 'Í': 'I', 'ó': 'o', 'Ó': 'O',
-        'ú': 'u', 'Ú': 'U'
-    }
-    for utf_char, ansi_char in replacements.items():
-        text = text.replace(utf_char, ansi_char)
-    return text
+    return text.translate(_TABLA_ANSI)
+
+RESULTADOS_IDS = (852, 859, 854, 883, 886, 885, 888, 889, 890, 891, 892)
+
+# Posición de cada prueba dentro de Boleta.Resultados
+INDICE_RESULTADO = {id_prueba: posicion for posicion, id_prueba in enumerate(RESULTADOS_IDS)}
+
+CAMPOS_BOLETA = (
+    "codigoE", "Boleta", "FechaTomaMx", "Paciente", "Edad", "Sexo", "Expediente",
+    "Recepcion", "Procesamiento", "FResultado", "FechaRechazo", "EstadoPaciente",
+    "StdoBoleta", "Update", "ReferidoPor", "Id"
+)
+
+# Campos cuyo valor ausente se escribe y se muestra como #NULL#; el resto conserva str(valor).
+# Las fechas se guardan como date/datetime y se formatean solo en texto_campo.
+CAMPOS_CON_NULL = frozenset({
+    "codigoE", "FechaTomaMx", "Procesamiento", "FResultado", "FechaRechazo",
+    "EstadoPaciente", "Update", "ReferidoPor", "Id"
+})
+
+class Boleta:
+    """Registro compacto de una boleta del reporte.
+
+    Los campos se llaman como las columnas del CSV y valen None cuando no hay dato.
+    Resultados guarda un valor por prueba en la posición de INDICE_RESULTADO. La
+    convención #NULL# solo se aplica al mostrar o exportar (ver texto_campo).
+    """
+    __slots__ = CAMPOS_BOLETA + ("Resultados", "con_pruebas", "hb_quitadas")
 
-def create_boleta_base(num_ingreso: str, fecha_toma: str, nombre_paciente: str, 
+    def __init__(self):
+        for campo in CAMPOS_BOLETA:
+            setattr(self, campo, None)
+        self.StdoBoleta = "R"
+        self.Resultados: List[Any] = [None] * len(RESULTADOS_IDS)
+        # Si la orden tenía alguna prueba; sin pruebas FechaRechazo se escribe sin '#'
+        self.con_pruebas = False
+        # Letras de Hb que la última fila que las afecta quitó de su fracción. No se
+        # exporta: solo hace falta para fusionar particiones (ver _fusionar_boletas)
+        self.hb_quitadas = ""
+
+    def resultado(self, id_prueba: int) -> Any:
+        """Valor del resultado de una prueba, o None si no lo tiene."""
+        return self.Resultados[INDICE_RESULTADO[id_prueba]]
+
+    def a_tupla(self) -> tuple:
+        """Valores de todos los campos en el orden de __slots__ (para la caché local)."""
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    @classmethod
+    def desde_tupla(cls, valores: tuple) -> "Boleta":
+        """Reconstruye una boleta guardada con a_tupla."""
+        boleta = cls.__new__(cls)
+        for campo, valor in zip(cls.__slots__, valores):
+            setattr(boleta, campo, valor)
+        boleta.Resultados = list(boleta.Resultados)
+        return boleta
+
+    def __eq__(self, otra: object) -> bool:
+        if not isinstance(otra, Boleta):
+            return NotImplemented
+        return all(getattr(self, campo) == getattr(otra, campo) for campo in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Boleta({self.Boleta!r}, StdoBoleta={self.StdoBoleta!r})"
+
+def texto_campo(boleta: Boleta, campo: str) -> str:
+    """Texto de un campo tal como se muestra en la vista previa y se escribe en el CSV."""
+    valor = getattr(boleta, campo)
+    if valor is None:
+        return "#NULL#" if campo in CAMPOS_CON_NULL else str(valor)
+    if campo in ("Procesamiento", "FResultado"):
+        return f"#{valor:%Y-%m-%d %H:%M:%S}#"
+    if campo == "FechaTomaMx" or (campo == "FechaRechazo" and boleta.con_pruebas):
+        return f"#{valor:%Y-%m-%d}#"
+    if campo in ("Recepcion", "FechaRechazo"):
+        return f"{valor:%Y-%m-%d}"
+    return str(valor)
+
+def create_boleta_base(num_ingreso: str, fecha_toma: Optional[date], nombre_paciente: str, 
                       sexo_paciente: str, ci_paciente: str, edad_dias: int, 
-                      fecha_recepcion: str, codigo_bloom: str, codigo_dtic: str) -> Dict[str, Any]:
+                      fecha_recepcion: Optional[date], codigo_bloom: Optional[str],
+                      codigo_dtic: Optional[str]) -> Boleta:
     """Crea la estructura base de una boleta."""
-    return {
-        "codigoE": codigo_bloom,
-        "Boleta": num_ingreso,
-        "FechaTomaMx": f'#{fecha_toma}#',
-        "Paciente": nombre_paciente,
-        "Edad": edad_dias,
-        "Sexo": sexo_paciente,
-        "Expediente": ci_paciente,
-        "Recepcion": fecha_recepcion,
-        "Procesamiento": "#NULL#",
-        "FResultado": "#NULL#",
-        "FechaRechazo": fecha_recepcion,
-        "EstadoPaciente": "#NULL#",
-        "StdoBoleta": "R",
-        "Update": "#NULL#",
-        "ReferidoPor": "#NULL#",
-        "Id": codigo_dtic,
-        "Resultados": {
-            852: '#NULL#', 859: '#NULL#', 854: '#NULL#', 883: '#NULL#',
-            886: '#NULL#', 885: '#NULL#', 888: '#NULL#', 889: '#NULL#',
-            890: '#NULL#', 891: '#NULL#', 892: '#NULL#'
-        }
-    }
+    boleta = Boleta()
+    boleta.codigoE = codigo_bloom
+    boleta.Boleta = num_ingreso
+    boleta.FechaTomaMx = fecha_toma
+    boleta.Paciente = nombre_paciente
+    boleta.Edad = edad_dias
+    boleta.Sexo = sexo_paciente
+    boleta.Expediente = ci_paciente
+    boleta.Recepcion = fecha_recepcion
+    boleta.FechaRechazo = fecha_recepcion
+    boleta.Id = codigo_dtic
+    return boleta
 
 def determine_result_value(id_prueba: int, resultado_numerico: Any, 
                           resultado_alpha: Any, validado_por: Any) -> str:
@@ -85,186 +312,998 @@ def determine_result_value(id_prueba: int, resultado_numerico: Any,
         return resultado_alpha if resultado_alpha is not None else '#NULL#'
     return resultado_numerico if resultado_numerico is not None else '#NULL#'
 
-def get_mas_antiguo_timestamp(ts1, ts2):
-    """Devuelve el timestamp más antiguo (menor) entre dos valores parseados, o #NULL# si ambos son None."""
-    if ts1 and ts2:
+MODO_SQL = "sql"
+MODO_PYTHON = "python"
+MODO_COLUMNAR = "columnar"
+
+# Filas que trae cada viaje al servidor cuando se usa un cursor con nombre.
+ITERSIZE_REPORTE = 2000
+
+# Cada cuántas filas leídas se notifica el progreso de generate_report.
+PASO_PROGRESO = 500
+
+class ReporteCancelado(Exception):
+    """La generación del reporte fue cancelada por el usuario."""
+
+class ConsultasEnCurso:
+    """Conexiones con una consulta en marcha, para cancelarlas todas desde otro hilo.
+
+    Después de cancelar() no se registra ninguna conexión más: registrar lanza
+    ReporteCancelado, así que tampoco empiezan las consultas que faltaban.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conexiones = set()
+        self.cancelado = False
+
+    @contextmanager
+    def registrar(self, conn: psycopg2.extensions.connection) -> Iterator[psycopg2.extensions.connection]:
+        with self._lock:
+            if self.cancelado:
+                raise ReporteCancelado()
+            self._conexiones.add(conn)
         try:
-            dt1 = datetime.strptime(ts1.strip("#"), "%Y-%m-%d %H:%M:%S")
-            dt2 = datetime.strptime(ts2.strip("#"), "%Y-%m-%d %H:%M:%S")
-            return f"#{min(dt1, dt2).strftime('%Y-%m-%d %H:%M:%S')}#"
-        except Exception:
-            return ts1 or ts2 or "#NULL#"
-    return ts1 or ts2 or "#NULL#"
+            yield conn
+        finally:
+            with self._lock:
+                self._conexiones.discard(conn)
 
-def es_mas_antigua(fecha_nueva, fecha_existente):
-    """Devuelve True si fecha_nueva es más antigua que fecha_existente."""
-    try:
-        dt_nueva = datetime.strptime(fecha_nueva.strip("#"), "%Y-%m-%d %H:%M:%S")
-        dt_existente = datetime.strptime(fecha_existente.strip("#"), "%Y-%m-%d %H:%M:%S")
-        return dt_nueva < dt_existente
-    except Exception:
-        return False
+    def cancelar(self) -> None:
+        """Cancela en el servidor las consultas registradas y las que quieran empezar."""
+        with self._lock:
+            self.cancelado = True
+            for conn in self._conexiones:
+                if not conn.closed:
+                    try:
+                        conn.cancel()
+                    except Exception as e:
+                        print(f"No se pudo cancelar la consulta: {e}")
 
-def generate_report(connection: psycopg2.extensions.connection, 
-                   fecha_inicio: str, fecha_fin: str) -> Dict[str, Dict[str, Any]]:
-    """Genera reporte de boletas agrupadas por número de ingreso."""
-    if connection is None:
-        print("No database connection available.")
-        return {}
+QUERY_REPORTE = """
+    SELECT OT.num_ingreso, OT.fecha_toma_muestra, P.nombre, P.apellido, P.sexo, P.ci_paciente, 
+           RN.actualizado_timestamp, RN.valor, PR.id, OT.numero, OTDE.edad_dias, OTDE.edad_horas, 
+           SM.codigo_bloom, SM.codigo_dtic, OTDE.fecha_recepcion, RA.valor, RA.validado_por, 
+           OTDE.update, RA.actualizado_timestamp
+    FROM orden_trabajo OT
+    LEFT JOIN paciente P ON OT.paciente_ID = P.id
+    LEFT JOIN prueba_orden PO ON OT.id = PO.orden_id
+    LEFT JOIN resultado_numer RN ON PO.id = RN.pruebao_id
+    LEFT JOIN prueba PR ON PR.id = PO.prueba_id
+    LEFT JOIN orden_trabajo_datos_extra OTDE ON OT.id = OTDE.orden_id
+    LEFT JOIN servicio_medico SM ON OT.servicio_medico_id = SM.id
+    LEFT JOIN resultado_alpha RA ON PO.id = RA.pruebao_id
+    WHERE OTDE.fecha_recepcion BETWEEN %s AND %s
+    ORDER BY OTDE.fecha_recepcion ASC, OT.id, PO.id, RN.id, RA.id
+"""
 
-    boletas_agrupadas = {}
-    
-    query = """
-        SELECT OT.num_ingreso, OT.fecha_toma_muestra, P.nombre, P.apellido, P.sexo, P.ci_paciente, 
-               RN.actualizado_timestamp, RN.valor, PR.id, OT.numero, OTDE.edad_dias, OTDE.edad_horas, 
-               SM.codigo_bloom, SM.codigo_dtic, OTDE.fecha_recepcion, RA.valor, RA.validado_por, 
-               OTDE.update, RA.actualizado_timestamp
+# Una fila por prueba de cada orden del rango, con su valor y la fecha del resultado.
+# La comparten el pivote y las estadísticas del reporte (ver estadisticas.py). Las
+# filas y sus ids son los de QUERY_REPORTE, que el pivote usa para ordenarlas igual.
+# {filtro} restringe las órdenes consideradas (ver QUERY_REPORTE_PIVOTE y QUERY_BOLETA_PIVOTE).
+CTE_FILAS_REPORTE = """
+    filas AS (
+        SELECT OT.num_ingreso, OT.id AS orden_id, OTDE.fecha_recepcion, PR.id AS prueba_id,
+               PO.id AS prueba_orden_id, RN.id AS numer_id, RA.id AS alpha_id,
+               CASE WHEN PR.id BETWEEN 889 AND 892 AND RA.validado_por <> 0
+                    THEN NULLIF(RA.valor::text, '')
+                    ELSE NULLIF(RN.valor::text, '')
+               END AS valor,
+               COALESCE(RN.actualizado_timestamp, RA.actualizado_timestamp) AS actualizado
         FROM orden_trabajo OT
-        LEFT JOIN paciente P ON OT.paciente_ID = P.id
         LEFT JOIN prueba_orden PO ON OT.id = PO.orden_id
         LEFT JOIN resultado_numer RN ON PO.id = RN.pruebao_id
         LEFT JOIN prueba PR ON PR.id = PO.prueba_id
         LEFT JOIN orden_trabajo_datos_extra OTDE ON OT.id = OTDE.orden_id
-        LEFT JOIN servicio_medico SM ON OT.servicio_medico_id = SM.id
         LEFT JOIN resultado_alpha RA ON PO.id = RA.pruebao_id
-        WHERE OTDE.fecha_recepcion BETWEEN %s AND %s
-        ORDER BY OTDE.fecha_recepcion ASC
+        WHERE {filtro}
+          AND OT.num_ingreso IS DISTINCT FROM '1'
+    )"""
+
+# Orden de las filas de QUERY_REPORTE al revés: con él, [1] de un array_agg es el
+# valor de la última fila, la que deja el bucle de referencia (_agregar_filas).
+ORDEN_ULTIMA_FILA = "fecha_recepcion DESC, orden_id DESC, prueba_orden_id DESC, numer_id DESC, alpha_id DESC"
+
+_IDS_REPORTE = ", ".join(str(id_prueba) for id_prueba in RESULTADOS_IDS)
+
+def _ultimo_resultado(id_prueba: int) -> str:
+    return (f"(array_agg(valor ORDER BY {ORDEN_ULTIMA_FILA}) "
+            f"FILTER (WHERE prueba_id = {id_prueba} AND valor IS NOT NULL))[1] AS r{id_prueba}")
+
+def _fraccion_hb(id_prueba: int, letra: str) -> str:
+    # La letra si el último valor que la afecta la agrega (esa letra en cualquier
+    # fracción), '' si la quita (otro valor en su fracción) y NULL si ninguno la afecta
+    return (f"(array_agg(CASE WHEN valor = '{letra}' THEN valor ELSE '' END ORDER BY {ORDEN_ULTIMA_FILA}) "
+            f"FILTER (WHERE prueba_id BETWEEN 889 AND 892 AND valor IS NOT NULL "
+            f"AND (valor = '{letra}' OR prueba_id = {id_prueba})))[1] AS r{id_prueba}")
+
+# Una fila por num_ingreso con lo mismo que deja _agregar_filas al recorrer las filas
+# de QUERY_REPORTE en orden: los datos base de la primera orden, Update de la última,
+# el último valor no vacío de cada prueba, las fracciones de Hb como las deja
+# _reordenar_hemoglobinas y el estado de la última fila con prueba (aceptada) con su
+# recepción, sin corregir las boletas anormales (eso se hace en Python, como en el bucle).
+# El ORDER BY final desempata por la primera orden, como el orden de aparición del bucle.
+_QUERY_PIVOTE = "WITH" + CTE_FILAS_REPORTE + f""",
+    boletas AS (
+        SELECT num_ingreso,
+               (array_agg(orden_id ORDER BY {ORDEN_ULTIMA_FILA}))[count(*)] AS primera_orden,
+               (array_agg(orden_id ORDER BY {ORDEN_ULTIMA_FILA}))[1] AS ultima_orden,
+               {_ultimo_resultado(852)},
+               {_ultimo_resultado(859)},
+               {_ultimo_resultado(854)},
+               {_ultimo_resultado(883)},
+               {_ultimo_resultado(886)},
+               {_ultimo_resultado(885)},
+               {_ultimo_resultado(888)},
+               {_fraccion_hb(889, "F")},
+               {_fraccion_hb(890, "A")},
+               {_fraccion_hb(891, "S")},
+               {_fraccion_hb(892, "C")},
+               MIN(actualizado) FILTER (WHERE prueba_id IN ({_IDS_REPORTE})) AS primer_resultado,
+               (array_agg(prueba_id IN ({_IDS_REPORTE}) ORDER BY {ORDEN_ULTIMA_FILA})
+                   FILTER (WHERE prueba_id IS NOT NULL))[1] AS aceptada,
+               (array_agg(fecha_recepcion ORDER BY {ORDEN_ULTIMA_FILA})
+                   FILTER (WHERE prueba_id IS NOT NULL))[1] AS recepcion_estado
+        FROM filas
+        GROUP BY num_ingreso
+    )
+    SELECT B.num_ingreso, OT.fecha_toma_muestra, P.nombre, P.apellido, P.sexo, P.ci_paciente,
+           OTDE.edad_dias, OTDE.edad_horas, SM.codigo_bloom, SM.codigo_dtic, OTDE.fecha_recepcion,
+           ULT.update, B.r852, B.r859, B.r854, B.r883, B.r886, B.r885, B.r888,
+           B.r889, B.r890, B.r891, B.r892, B.primer_resultado, B.aceptada, B.recepcion_estado
+    FROM boletas B
+    JOIN orden_trabajo OT ON OT.id = B.primera_orden
+    LEFT JOIN paciente P ON OT.paciente_ID = P.id
+    LEFT JOIN orden_trabajo_datos_extra OTDE ON OT.id = OTDE.orden_id
+    LEFT JOIN servicio_medico SM ON OT.servicio_medico_id = SM.id
+    LEFT JOIN orden_trabajo_datos_extra ULT ON ULT.orden_id = B.ultima_orden
+    ORDER BY OTDE.fecha_recepcion ASC, B.primera_orden
+"""
+
+QUERY_REPORTE_PIVOTE = _QUERY_PIVOTE.format(filtro="OTDE.fecha_recepcion BETWEEN %s AND %s")
+
+QUERY_BOLETA_PIVOTE = _QUERY_PIVOTE.format(
+    filtro="OTDE.fecha_recepcion BETWEEN %s AND %s AND OT.num_ingreso = %s"
+)
+
+# Una partición [desde, hasta) del rango BETWEEN original; los dos últimos parámetros
+# son los extremos del reporte completo para que la unión de particiones sea idéntica.
+QUERY_PARTICION_PIVOTE = _QUERY_PIVOTE.format(
+    filtro="OTDE.fecha_recepcion >= %s AND OTDE.fecha_recepcion < %s"
+           " AND OTDE.fecha_recepcion BETWEEN %s AND %s"
+)
+
+DIAS_POR_PARTICION = 7
+
+QUERY_BOLETAS_PIVOTE = _QUERY_PIVOTE.format(
+    filtro="OTDE.fecha_recepcion BETWEEN %s AND %s AND OT.num_ingreso = ANY(%s)"
+)
+
+# Boletas con algún resultado modificado después de la marca de agua, con la fecha del
+# último cambio. Usa los índices de actualizado_timestamp en lugar de recorrer el rango.
+QUERY_CAMBIOS_RESULTADOS = """
+    SELECT OT.num_ingreso, MAX(C.actualizado)
+    FROM (
+        SELECT PO.orden_id, RN.actualizado_timestamp AS actualizado
+        FROM resultado_numer RN
+        JOIN prueba_orden PO ON PO.id = RN.pruebao_id
+        WHERE RN.actualizado_timestamp > %s
+        UNION ALL
+        SELECT PO.orden_id, RA.actualizado_timestamp
+        FROM resultado_alpha RA
+        JOIN prueba_orden PO ON PO.id = RA.pruebao_id
+        WHERE RA.actualizado_timestamp > %s
+    ) C
+    JOIN orden_trabajo OT ON OT.id = C.orden_id
+    WHERE OT.num_ingreso IS DISTINCT FROM '1'
+    GROUP BY OT.num_ingreso
+"""
+
+# Con los índices de actualizado_timestamp (los mismos de QUERY_CAMBIOS_RESULTADOS, ver
+# diagnostico.py) cada MAX lee una sola entrada del índice en lugar de la tabla.
+QUERY_MARCA_AGUA = """
+    SELECT GREATEST((SELECT MAX(actualizado_timestamp) FROM resultado_numer),
+                    (SELECT MAX(actualizado_timestamp) FROM resultado_alpha))
+"""
+
+# Los cambios se buscan desde un poco antes de la marca de agua para no perder
+# resultados de transacciones que confirmaron tarde con un timestamp anterior.
+SOLAPE_MARCA_AGUA = timedelta(minutes=10)
+
+# Firma por día de recepción de todo lo que alimenta el pivote; si no cambia, la
+# entrada de ese día en la caché local sigue siendo válida.
+QUERY_FIRMAS_DIAS = """
+    SELECT OTDE.fecha_recepcion::date AS dia,
+           md5(string_agg(
+               concat_ws('|', OT.id, OT.num_ingreso, OT.fecha_toma_muestra, OT.paciente_id,
+                         OT.servicio_medico_id, OTDE.edad_dias, OTDE.edad_horas, OTDE.fecha_recepcion,
+                         OTDE.update, PO.id, PO.prueba_id, RN.valor, RN.actualizado_timestamp,
+                         RA.valor, RA.validado_por, RA.actualizado_timestamp),
+               ',' ORDER BY OT.id, PO.id, RN.id, RA.id
+           )) AS firma
+    FROM orden_trabajo OT
+    LEFT JOIN prueba_orden PO ON OT.id = PO.orden_id
+    LEFT JOIN resultado_numer RN ON PO.id = RN.pruebao_id
+    LEFT JOIN orden_trabajo_datos_extra OTDE ON OT.id = OTDE.orden_id
+    LEFT JOIN resultado_alpha RA ON PO.id = RA.pruebao_id
+    WHERE OTDE.fecha_recepcion >= %s AND OTDE.fecha_recepcion < %s
+    GROUP BY 1
+"""
+
+# Días de recepción que todavía pueden recibir resultados; los anteriores se toman
+# de la caché sin consultar el servidor.
+DIAS_ABIERTOS = 14
+
+def generate_report(connection: psycopg2.extensions.connection, 
+                   fecha_inicio: str, fecha_fin: str, modo: str = MODO_SQL,
+                   itersize: Optional[int] = None,
+                   progreso: Optional[Callable[[int, Dict[str, Boleta]], None]] = None,
+                   al_detectar_anomalias: Optional[Callable[[List[str]], None]] = None,
+                   propagar_errores: bool = False,
+                   medicion: Optional[metricas.MedicionReporte] = None
+                   ) -> Dict[str, Boleta]:
+    """Genera reporte de boletas agrupadas por número de ingreso.
+
+    En modo "sql" el pivote por boleta se resuelve en PostgreSQL y se recibe una
+    fila por num_ingreso. El modo "python" conserva la agregación fila a fila
+    original como referencia para comparar ambos resultados (ver comparar_reportes).
+    El modo "columnar" lee las mismas filas que "python" y obtiene las mismas boletas
+    con operaciones por lotes de NumPy (ver agregacion_columnar.py); necesita todas
+    las filas antes de agregar, así que el progreso no trae boletas hasta el final.
+
+    La conexión no se cierra: pertenece a quien la presta (ver PoolConexiones).
+
+    Con itersize se usa un cursor del lado del servidor y las filas se agregan a
+    medida que llegan, en bloques de itersize, en lugar de cargarlas todas con fetchall().
+
+    progreso se llama cada PASO_PROGRESO filas con las filas leídas y las boletas
+    construidas hasta el momento; puede lanzar ReporteCancelado para abortar. Una
+    cancelación del lado del servidor (connection.cancel()) también termina en
+    ReporteCancelado. Si se indica al_detectar_anomalias, recibe las boletas
+    anormales corregidas en lugar de imprimirse el aviso.
+
+    Con propagar_errores un error de la consulta se lanza en lugar de solo imprimirse,
+    para que quien llama sin interfaz (exportar.py) pueda distinguirlo de un rango vacío.
+
+    Con medicion se anotan los segundos de consulta, lectura y agregación y las filas
+    y boletas obtenidas (ver metricas.py). Con cursor del lado del servidor la
+    consulta se ejecuta al pedir el primer bloque, así que ese tiempo cae en lectura.
     """
+    agregar = _agregador(modo)
+
+    if connection is None:
+        print("No database connection available.")
+        return {}
+
+    boletas_agrupadas = {}
+    
+    try:
+        if itersize:
+            cursor = connection.cursor(name="reporte_boletas")
+            cursor.itersize = itersize
+        else:
+            cursor = connection.cursor()
+        with cursor:
+            query = QUERY_REPORTE_PIVOTE if modo == MODO_SQL else QUERY_REPORTE
+            with metricas.medir(medicion, "consulta"):
+                cursor.execute(query, (fecha_inicio, fecha_fin))
+            if medicion is None:
+                filas = cursor if itersize else cursor.fetchall()
+            elif itersize:
+                filas = _leer_por_bloques(cursor, itersize, medicion)
+            else:
+                with medicion.etapa("lectura"):
+                    filas = cursor.fetchall()
+                medicion.contar("filas", len(filas))
+            if progreso is not None:
+                filas = _filas_con_progreso(filas, boletas_agrupadas, progreso)
+            inicio_agregacion = time.perf_counter()
+            lectura_previa = medicion.etapas.get("lectura", 0.0) if medicion is not None else 0.0
+            agregar(filas, boletas_agrupadas)
+            if medicion is not None:
+                # Con cursor del servidor la lectura ocurre dentro del bucle: se descuenta
+                lectura_bucle = medicion.etapas.get("lectura", 0.0) - lectura_previa
+                medicion.sumar("agregacion", time.perf_counter() - inicio_agregacion - lectura_bucle)
+
+    except (ReporteCancelado, psycopg2.extensions.QueryCanceledError) as e:
+        raise ReporteCancelado("Generación del reporte cancelada") from e
+    except Exception as e:
+        if propagar_errores:
+            raise
+        print(f"Error generando el reporte: {e}")
     
+    # Al final del procesamiento, buscar boletas anormales
+    _notificar_anomalias(boletas_agrupadas, al_detectar_anomalias)
+    if medicion is not None:
+        medicion.contar("boletas", len(boletas_agrupadas))
+    return boletas_agrupadas
+
+def obtener_marca_agua(connection: psycopg2.extensions.connection) -> Optional[datetime]:
+    """actualizado_timestamp más reciente del servidor (None si no hay resultados)."""
+    with connection.cursor() as cursor:
+        cursor.execute(QUERY_MARCA_AGUA)
+        return cursor.fetchone()[0]
+
+def generate_report_delta(connection: psycopg2.extensions.connection,
+                          fecha_inicio: str, fecha_fin: str,
+                          marca_agua: Optional[datetime],
+                          num_ingresos_editados: Iterable[str] = (),
+                          al_detectar_anomalias: Optional[Callable[[List[str]], None]] = None,
+                          propagar_errores: bool = False,
+                          al_detectar_cambios: Optional[Callable[[List[str]], None]] = None
+                          ) -> Tuple[Dict[str, Boleta], Optional[datetime]]:
+    """Boletas del rango cuyos resultados cambiaron desde marca_agua o cuyo Update se editó.
+
+    Devuelve las boletas completas (igual que en el reporte normal) y la nueva marca de
+    agua. Sin marca_agua (primera exportación) se devuelve todo el rango y la marca es
+    el último actualizado_timestamp del servidor, leído antes del reporte.
+
+    al_detectar_cambios recibe todas las boletas con resultados cambiados desde
+    marca_agua, también las recibidas fuera del rango (p. ej. para descartarlas de
+    la caché local con invalidar_cache_boletas).
+    """
+    boletas_agrupadas: Dict[str, Boleta] = {}
+    nueva_marca = marca_agua
     try:
         with connection.cursor() as cursor:
-            cursor.execute(query, (fecha_inicio, fecha_fin))
-            rows = cursor.fetchall()
+            if marca_agua is None:
+                nueva_marca = obtener_marca_agua(connection)
+                cursor.execute(QUERY_REPORTE_PIVOTE, (fecha_inicio, fecha_fin))
+            else:
+                desde = marca_agua - SOLAPE_MARCA_AGUA
+                cursor.execute(QUERY_CAMBIOS_RESULTADOS, (desde, desde))
+                cambios = cursor.fetchall()
+                cambiadas = {num_ingreso for num_ingreso, _ in cambios}
+                if cambios:
+                    nueva_marca = max(marca_agua, max(actualizado for _, actualizado in cambios))
+                    if al_detectar_cambios is not None:
+                        al_detectar_cambios(sorted(cambiadas))
+                num_ingresos = sorted(cambiadas | set(num_ingresos_editados))
+                if not num_ingresos:
+                    return boletas_agrupadas, nueva_marca
+                cursor.execute(QUERY_BOLETAS_PIVOTE, (fecha_inicio, fecha_fin, num_ingresos))
+            _agregar_filas_pivote(cursor.fetchall(), boletas_agrupadas)
+    except Exception as e:
+        if propagar_errores:
+            raise
+        print(f"Error generando el reporte: {e}")
+        return {}, marca_agua
 
-            for row in rows:
-                num_ingreso = row[0]
-                
-                # Saltar entradas con num_ingreso igual a 1
-                if num_ingreso == '1':
-                    continue
-
-                # Procesar datos básicos
-                fecha_toma = parse_datetime(row[1], '%Y-%m-%d %H:%M:%S%z') or "NULL"
-                nombre_paciente = utf_to_ansi(f"{str(row[2] or '').strip()} {str(row[3] or '').strip()}")
-                sexo_paciente = row[4]
-                ci_paciente = row[5]
-                #actualizado_timestamp = parse_datetime_with_time(row[6])
-                id_prueba = row[8]
-                
-                # Calcular edad
-                edad_dias = row[10] or 0
-                edad_horas = row[11] or 0
-                if edad_dias == 0 and edad_horas > 0:
-                    edad_dias = int(edad_horas / 24)
-
-                # Procesar códigos y fecha de recepción
-                codigo_bloom = row[12] if row[12] is not None else '#NULL#'
-                codigo_dtic = row[13] if row[13] is not None else '#NULL#'
-                fecha_recepcion = parse_datetime(row[14], '%Y-%m-%d %H:%M:%S')
-
-                # Crear boleta si no existe
-                if num_ingreso not in boletas_agrupadas:
-                    boletas_agrupadas[num_ingreso] = create_boleta_base(
-                        num_ingreso, fecha_toma, nombre_paciente, sexo_paciente,
-                        ci_paciente, edad_dias, fecha_recepcion, codigo_bloom, codigo_dtic
-                    )
-                # Asignar el valor de Update desde OTDE.update
-                boletas_agrupadas[num_ingreso]["Update"] = row[17] if row[17] is not None else "#NULL#"
-
-                # Procesar resultado para la prueba si id_prueba es válido (o rechazarla)
-                if id_prueba is not None:
-                    clave_resultado = int(id_prueba)
-                    valid_ids = {852, 859, 854, 883, 886, 885, 888, 889, 890, 891, 892}
-                    if clave_resultado in valid_ids:
-                        # Procesar resultado según el origen
-                        if clave_resultado in (852, 854, 859, 883, 886, 885, 888):
-                            valor_resultado = row[7] if row[7] not in (None, "") else "#NULL#"
-                        elif clave_resultado in (889, 890, 891, 892):
-                            if row[16] and row[16] != 0:
-                                valor_resultado = row[15] if row[15] not in (None, "") else "#NULL#"
-                            else:
-                                valor_resultado = row[7] if row[7] not in (None, "") else "#NULL#"
-                        else:
-                            valor_resultado = "#NULL#"
-                        
-                        # Actualizar solo si se obtuvo un valor válido
-                        if valor_resultado not in (None, "", "#NULL#"):
-                            boletas_agrupadas[num_ingreso]["Resultados"][clave_resultado] = valor_resultado
-                        
-                        # Procesar y asignar las fechas de Procesamiento y FResultado
-                        rn_timestamp = parse_datetime_with_time(row[6])   # RN.actualizado_timestamp
-                        ra_timestamp = parse_datetime_with_time(row[18])      # RA.actualizado_timestamp
-                        ts_final = rn_timestamp
-                        if (not ts_final or ts_final == "#NULL#") and ra_timestamp and ra_timestamp != "#NULL#":
-                            ts_final = ra_timestamp
-                        if ts_final and ts_final != "#NULL#":
-                            for campo_fecha in ("Procesamiento", "FResultado"):
-                                fecha_actual = boletas_agrupadas[num_ingreso][campo_fecha]
-                                if fecha_actual == "#NULL#":
-                                    boletas_agrupadas[num_ingreso][campo_fecha] = ts_final
-                                elif es_mas_antigua(ts_final, fecha_actual):
-                                    boletas_agrupadas[num_ingreso][campo_fecha] = ts_final
-                        
-                        # Como es un resultado aceptado:
-                        boletas_agrupadas[num_ingreso]["StdoBoleta"] = "A"
-                        boletas_agrupadas[num_ingreso]["FechaRechazo"] = "#NULL#"
-                    else:
-                        # Si la prueba tiene un id que no está en el conjunto válido, se marca como rechazado
-                        boletas_agrupadas[num_ingreso]["StdoBoleta"] = "R"
-                        # Asumir que la fecha de recepción (ya procesada) se toma para FechaRechazo:
-                        boletas_agrupadas[num_ingreso]["FechaRechazo"] = f"#{fecha_recepcion}#" if fecha_recepcion not in (None, "", "#NULL#") else "#NULL#"
-
-                # Reordenar resultados para los ids 889-892
-                # Se crea un diccionario temporal "reordered" con valores por defecto
-                reordered = {889: "#NULL#", 890: "#NULL#", 891: "#NULL#", 892: "#NULL#"}
-                # Se recorre cada resultado en ese rango (del vector en bruto)
-                for key in [889, 890, 891, 892]:
-                    val = boletas_agrupadas[num_ingreso]["Resultados"].get(key, "#NULL#")
-                    if val != "#NULL#":
-                        if val == "F":
-                            reordered[889] = "F"
-                        elif val == "A":
-                            reordered[890] = "A"
-                        elif val == "S":
-                            reordered[891] = "S"
-                        elif val == "C":
-                            reordered[892] = "C"
-                # Se asigna el vector ordenado de vuelta
-                for key in [889, 890, 891, 892]:
-                    boletas_agrupadas[num_ingreso]["Resultados"][key] = reordered[key]
+    _notificar_anomalias(boletas_agrupadas, al_detectar_anomalias)
+    return boletas_agrupadas, nueva_marca
+
+def generate_report_particionado(fecha_inicio: str, fecha_fin: str,
+                                 dias_por_particion: int = DIAS_POR_PARTICION,
+                                 max_conexiones: Optional[int] = None,
+                                 pool: Optional[PoolConexiones] = None,
+                                 al_detectar_anomalias: Optional[Callable[[List[str]], None]] = None,
+                                 propagar_errores: bool = False,
+                                 medicion: Optional[metricas.MedicionReporte] = None
+                                 ) -> Dict[str, Boleta]:
+    """Genera el mismo reporte que generate_report en modo "sql" consultando en paralelo.
+
+    El rango se divide en particiones de dias_por_particion días de fecha_recepcion que
+    se consultan a la vez, cada una con una conexión del pool (como máximo max_conexiones,
+    por defecto el máximo del pool). Las boletas se fusionan en orden de partición con
+    _fusionar_boletas, así que el resultado y su orden coinciden con la consulta única.
+    Con medicion, la consulta incluye la lectura y agregación de cada partición.
+    """
+    if dias_por_particion < 1:
+        raise ValueError("dias_por_particion debe ser al menos 1")
+    pool = pool or obtener_pool()
+    particiones = _particiones(fecha_inicio, fecha_fin, dias_por_particion)
+
+    boletas_agrupadas: Dict[str, Boleta] = {}
+    try:
+        with metricas.medir(medicion, "consulta"):
+            parciales = _extraer_particiones(pool, particiones, fecha_inicio, fecha_fin, max_conexiones)
+        with metricas.medir(medicion, "fusion"):
+            for parcial in parciales:
+                _fusionar_boletas(boletas_agrupadas, parcial)
+    except Exception as e:
+        if propagar_errores:
+            raise
+        print(f"Error generando el reporte: {e}")
+        boletas_agrupadas = {}
+
+    _notificar_anomalias(boletas_agrupadas, al_detectar_anomalias)
+    if medicion is not None:
+        medicion.contar("boletas", len(boletas_agrupadas))
+    return boletas_agrupadas
+
+def generate_report_cacheado(fecha_inicio: str, fecha_fin: str, cache: CacheBoletas,
+                             pool: Optional[PoolConexiones] = None,
+                             dias_abiertos: int = DIAS_ABIERTOS,
+                             hoy: Optional[date] = None,
+                             max_conexiones: Optional[int] = None,
+                             progreso: Optional[Callable[[int, Dict[str, Boleta]], None]] = None,
+                             al_detectar_anomalias: Optional[Callable[[List[str]], None]] = None,
+                             propagar_errores: bool = False,
+                             medicion: Optional[metricas.MedicionReporte] = None,
+                             en_curso: Optional[ConsultasEnCurso] = None,
+                             al_consultar: Optional[Callable[[PoolConexiones], None]] = None
+                             ) -> Dict[str, Boleta]:
+    """Genera el reporte en modo "sql" reutilizando los días guardados en la caché local.
+
+    El rango se parte por día de recepción como en generate_report_particionado. Los
+    días con más de dias_abiertos días de antigüedad se toman de la caché sin consultar
+    el servidor; los recientes se validan con QUERY_FIRMAS_DIAS. Solo se consultan los
+    días que faltan o cuya firma cambió, y se guardan para la próxima vez.
+
+    Los días se fusionan en orden a medida que llegan: progreso se llama tras cada uno
+    con el número de boletas leídas y puede lanzar ReporteCancelado. Las conexiones
+    que consultan se registran en en_curso; en_curso.cancelar() las cancela en el
+    servidor y la generación termina con ReporteCancelado. Con medicion se anotan
+    además los días tomados de la caché (dias_cache) y los consultados (dias_consultados).
+    al_consultar recibe el pool una vez, justo antes de la primera consulta al servidor;
+    si todo el rango sale de la caché no se llama.
+    """
+    inicio = datetime.fromisoformat(fecha_inicio)
+    fin = datetime.fromisoformat(fecha_fin)
+    if inicio.time() != datetime.min.time() or fin.time() != datetime.min.time():
+        raise ValueError("La caché solo admite rangos de fechas sin hora")
+    pool = pool or obtener_pool()
+    particiones = _particiones(fecha_inicio, fecha_fin, 1)
+    limite_abiertos = (hoy or date.today()) - timedelta(days=dias_abiertos)
+
+    boletas_agrupadas: Dict[str, Boleta] = {}
+    try:
+        abiertas = [(desde, hasta) for desde, hasta in particiones if desde.date() >= limite_abiertos]
+        firmas: Dict[date, str] = {}
+        if abiertas:
+            if al_consultar is not None:
+                al_consultar(pool)
+                al_consultar = None
+            with metricas.medir(medicion, "firmas"):
+                firmas = _firmas_dias(pool, abiertas[0][0], abiertas[-1][1], en_curso)
+
+        parciales: List[Optional[Dict[str, Boleta]]] = []
+        faltantes = []
+        with metricas.medir(medicion, "cache"):
+            for desde, hasta in particiones:
+                dia, completo = desde.date(), hasta <= fin
+                guardado = cache.leer(dia, completo)
+                if guardado is not None and (dia < limite_abiertos or guardado[0] == firmas.get(dia, "")):
+                    parciales.append({b.Boleta: b for b in map(Boleta.desde_tupla, guardado[1])})
+                else:
+                    parciales.append(None)
+                    faltantes.append(len(parciales) - 1)
+
+        if medicion is not None:
+            medicion.contar("dias_cache", len(particiones) - len(faltantes))
+            medicion.contar("dias_consultados", len(faltantes))
+        if faltantes and al_consultar is not None:
+            al_consultar(pool)
 
+        extraidas = _iterar_particiones(
+            pool, [particiones[i] for i in faltantes], fecha_inicio, fecha_fin, max_conexiones, en_curso
+        )
+        leidas = 0
+        try:
+            for i, parcial in enumerate(parciales):
+                if parcial is None:
+                    with metricas.medir(medicion, "consulta"):
+                        parcial = next(extraidas)
+                    desde, hasta = particiones[i]
+                    dia = desde.date()
+                    firma = firmas.get(dia, "") if dia >= limite_abiertos else None
+                    with metricas.medir(medicion, "cache"):
+                        cache.guardar(dia, hasta <= fin, firma,
+                                      [b.a_tupla() for b in parcial.values()], parcial.keys())
+                with metricas.medir(medicion, "fusion"):
+                    _fusionar_boletas(boletas_agrupadas, parcial)
+                leidas += len(parcial)
+                if progreso is not None:
+                    progreso(leidas, boletas_agrupadas)
+        finally:
+            extraidas.close()
+    except ReporteCancelado:
+        raise
     except Exception as e:
+        if propagar_errores:
+            raise
         print(f"Error generando el reporte: {e}")
+        boletas_agrupadas = {}
+
+    _notificar_anomalias(boletas_agrupadas, al_detectar_anomalias)
+    if medicion is not None:
+        medicion.contar("boletas", len(boletas_agrupadas))
+    return boletas_agrupadas
+
+class ReporteMultiorigen:
+    """Boletas fusionadas de varios servidores, con el origen de cada una y el resultado de cada servidor."""
+
+    def __init__(self):
+        self.boletas: Dict[str, Boleta] = {}
+        # Clave en boletas -> servidores en los que aparece la boleta
+        self.origenes: Dict[str, List[str]] = {}
+        self.errores: Dict[str, str] = {}
+        self.segundos: Dict[str, float] = {}
+        self.conteos: Dict[str, int] = {}
+        self._claves: Dict[Tuple[str, Optional[str]], str] = {}
+
+    def fusionar(self, nombre: str, parcial: Dict[str, Boleta]) -> None:
+        """Agrega las boletas de un servidor.
+
+        Una boleta con el mismo num_ingreso y codigo_dtic que otra ya agregada es la
+        misma muestra y se fusiona con _fusionar_boletas; queda aceptada si lo está en
+        algún servidor. Si solo coincide el num_ingreso, es otra boleta y queda bajo la
+        clave "<num_ingreso>@<servidor>".
+        """
+        for num_ingreso, boleta in parcial.items():
+            identidad = (num_ingreso, boleta.Id)
+            clave = self._claves.get(identidad)
+            if clave is None:
+                clave = num_ingreso if num_ingreso not in self.boletas else f"{num_ingreso}@{nombre}"
+                self._claves[identidad] = clave
+                self.boletas[clave] = boleta
+                self.origenes[clave] = [nombre]
+            else:
+                fusionada = self.boletas[clave]
+                aceptada = fusionada.StdoBoleta == "A"
+                _fusionar_boletas(self.boletas, {clave: boleta})
+                if aceptada:
+                    fusionada.StdoBoleta = "A"
+                    fusionada.FechaRechazo = None
+                self.origenes[clave].append(nombre)
+
+def generate_report_multiorigen(fecha_inicio: str, fecha_fin: str,
+                                origenes: Dict[str, Dict[str, str]],
+                                modo: str = MODO_SQL,
+                                al_detectar_anomalias: Optional[Callable[[List[str]], None]] = None,
+                                medicion: Optional[metricas.MedicionReporte] = None
+                                ) -> ReporteMultiorigen:
+    """Genera el reporte en varios servidores a la vez y fusiona sus boletas.
+
+    Cada servidor se consulta en su propio hilo con generate_report y con su propio
+    límite de tiempo (clave timeout de cargar_origenes), así que la duración total es
+    la del servidor más lento. Un servidor que falla o agota su tiempo no detiene a
+    los demás: queda en errores y el reporte se arma con el resto. Las boletas
+    quedan ordenadas por fecha de recepción, como en el reporte de un solo servidor.
+    """
+    _agregador(modo)  # Modo inválido o sin NumPy: falla antes de conectarse
+    reporte = ReporteMultiorigen()
+    if not origenes:
+        return reporte
+
+    anormales: List[str] = []
+    with metricas.medir(medicion, "consulta"):
+        with ThreadPoolExecutor(max_workers=len(origenes), thread_name_prefix="origen") as ejecutor:
+            futuros = {
+                nombre: ejecutor.submit(_extraer_origen, config, fecha_inicio, fecha_fin, modo)
+                for nombre, config in origenes.items()
+            }
+            parciales = {}
+            for nombre, futuro in futuros.items():
+                try:
+                    parciales[nombre], reporte.segundos[nombre], anomalias = futuro.result()
+                    anormales.extend(anomalias)
+                except Exception as e:
+                    reporte.errores[nombre] = f"{type(e).__name__}: {e}"
+
+    with metricas.medir(medicion, "fusion"):
+        for nombre, parcial in parciales.items():
+            reporte.conteos[nombre] = len(parcial)
+            reporte.fusionar(nombre, parcial)
+        reporte.boletas = dict(sorted(reporte.boletas.items(), key=lambda par: par[1].Recepcion or date.min))
+        anormales.extend(_corregir_boletas_anormales(reporte.boletas))
+
+    if anormales:
+        anormales = list(dict.fromkeys(anormales))
+        if al_detectar_anomalias is not None:
+            al_detectar_anomalias(anormales)
+        else:
+            print(mensaje_boletas_anormales(anormales))
+    if medicion is not None:
+        medicion.contar("boletas", len(reporte.boletas))
+    return reporte
+
+def abrir_cache(config: Optional[Dict[str, str]] = None) -> Optional[CacheBoletas]:
+    """Abre la caché local del servidor configurado; None si está deshabilitada o no se puede abrir."""
+    ruta = ruta_por_defecto(config or cargar_configuracion())
+    if ruta is None:
+        return None
+    try:
+        return CacheBoletas(ruta, formato=",".join(Boleta.__slots__))
+    except (OSError, sqlite3.Error) as e:
+        print(f"No se pudo abrir la caché local {ruta}: {e}")
+        return None
+
+def invalidar_cache_boletas(num_ingresos: Iterable[str], config: Optional[Dict[str, str]] = None) -> None:
+    """Descarta de la caché local los días con esas boletas, p. ej. tras editar su Update.
+
+    También se llama con las boletas cuyos resultados cambiaron según la actualización
+    automática o exportar.py --delta: así los días cerrados, que se leen de la caché
+    sin validar su firma, no se quedan con resultados viejos.
+    """
+    cache = abrir_cache(config)
+    if cache is None:
+        return
+    with cache:
+        cache.invalidar_boletas(num_ingresos)
+
+def registrar_updates_delta(num_ingresos: Iterable[str], config: Optional[Dict[str, str]] = None) -> None:
+    """Anota en el diario de la exportación incremental las boletas con Update editado.
+
+    El diario es local: exportar.py --delta en otro equipo no ve estas ediciones.
+    """
+    ruta = delta.ruta_por_defecto(config or cargar_configuracion())
+    try:
+        with delta.EstadoDelta(ruta) as estado:
+            estado.registrar_updates(num_ingresos)
+    except (OSError, sqlite3.Error) as e:
+        print(f"No se pudo anotar el cambio de Update en {ruta}: {e}")
+
+def _registrada(conn: psycopg2.extensions.connection, en_curso: Optional[ConsultasEnCurso]):
+    return nullcontext(conn) if en_curso is None else en_curso.registrar(conn)
+
+def _firmas_dias(pool: PoolConexiones, desde: datetime, hasta: datetime,
+                 en_curso: Optional[ConsultasEnCurso] = None) -> Dict[date, str]:
+    """Firma de cada día de recepción en [desde, hasta); los días sin órdenes no aparecen."""
+    with pool.conexion() as conn, _registrada(conn, en_curso):
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY_FIRMAS_DIAS, (desde, hasta))
+            return dict(cursor.fetchall())
+
+def _particiones(fecha_inicio: str, fecha_fin: str, dias: int) -> List[tuple]:
+    """Límites [desde, hasta) de cada partición que cubre fecha_inicio..fecha_fin."""
+    inicio = datetime.fromisoformat(fecha_inicio)
+    fin = datetime.fromisoformat(fecha_fin)
+    paso = timedelta(days=dias)
+    particiones = []
+    desde = inicio
+    while desde <= fin:
+        particiones.append((desde, desde + paso))
+        desde += paso
+    return particiones
+
+def _extraer_particiones(pool: PoolConexiones, particiones: List[tuple], fecha_inicio: str,
+                         fecha_fin: str, max_conexiones: Optional[int] = None) -> List[Dict[str, Boleta]]:
+    """Consulta las particiones en paralelo y devuelve sus boletas en el mismo orden."""
+    if not particiones:
+        return []
+    hilos = max(1, min(max_conexiones or pool.maxconn, pool.maxconn, len(particiones)))
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="particion") as ejecutor:
+        futuros = [
+            ejecutor.submit(_extraer_particion, pool, desde, hasta, fecha_inicio, fecha_fin)
+            for desde, hasta in particiones
+        ]
+        _, pendientes = wait(futuros, return_when=FIRST_EXCEPTION)
+        for futuro in pendientes:
+            futuro.cancel()
+        errores = [f.exception() for f in futuros if not f.cancelled() and f.exception()]
+        if errores:
+            raise errores[0]
+        return [futuro.result() for futuro in futuros]
+
+def _iterar_particiones(pool: PoolConexiones, particiones: List[tuple], fecha_inicio: str,
+                        fecha_fin: str, max_conexiones: Optional[int] = None,
+                        en_curso: Optional[ConsultasEnCurso] = None) -> Iterator[Dict[str, Boleta]]:
+    """Como _extraer_particiones, pero entrega cada partición en orden apenas termina.
+
+    Al cerrar el generador se descartan las particiones que no empezaron y se espera
+    a las que están en curso. Si en_curso se canceló, el error de la consulta
+    cancelada se entrega como ReporteCancelado.
+    """
+    if not particiones:
+        return
+    hilos = max(1, min(max_conexiones or pool.maxconn, pool.maxconn, len(particiones)))
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="particion") as ejecutor:
+        futuros = [
+            ejecutor.submit(_extraer_particion, pool, desde, hasta, fecha_inicio, fecha_fin, en_curso)
+            for desde, hasta in particiones
+        ]
+        try:
+            for futuro in futuros:
+                try:
+                    parcial = futuro.result()
+                except Exception as e:
+                    if en_curso is not None and en_curso.cancelado:
+                        raise ReporteCancelado() from e
+                    raise
+                yield parcial
+        finally:
+            for futuro in futuros:
+                futuro.cancel()
+
+def _extraer_particion(pool: PoolConexiones, desde: datetime, hasta: datetime,
+                       fecha_inicio: str, fecha_fin: str,
+                       en_curso: Optional[ConsultasEnCurso] = None) -> Dict[str, Boleta]:
+    """Boletas de una partición, sin corregir anomalías (eso se hace tras fusionar)."""
+    with pool.conexion() as conn, _registrada(conn, en_curso):
+        with conn.cursor() as cursor:
+            cursor.execute(QUERY_PARTICION_PIVOTE, (desde, hasta, fecha_inicio, fecha_fin))
+            return _agregar_filas_pivote(cursor.fetchall(), {})
+
+def _extraer_origen(config: Dict[str, str], fecha_inicio: str, fecha_fin: str,
+                    modo: str) -> Tuple[Dict[str, Boleta], float, List[str]]:
+    """Boletas de un servidor, los segundos que tardó y sus boletas anormales corregidas.
+
+    El timeout del servidor limita la conexión (connect_timeout) y lo que quede de él
+    limita la consulta con statement_timeout, que la cancela en el servidor.
+    """
+    inicio = time.monotonic()
+    parametros = {clave: valor for clave, valor in config.items() if clave != "timeout"}
+    timeout = float(config.get("timeout", TIMEOUT_ORIGEN))
+    try:
+        conn = psycopg2.connect(connect_timeout=max(1, int(timeout)), **parametros)
+    except psycopg2.Error as e:
+        raise ConnectionError(f"No se pudo conectar a {config['host']}: {e}") from e
+    anomalias: List[str] = []
+    try:
+        restante_ms = max(1, int((timeout - (time.monotonic() - inicio)) * 1000))
+        with conn.cursor() as cursor:
+            cursor.execute("SET statement_timeout = %s", (restante_ms,))
+        try:
+            boletas = generate_report(
+                conn, fecha_inicio, fecha_fin, modo=modo,
+                al_detectar_anomalias=anomalias.extend, propagar_errores=True
+            )
+        except ReporteCancelado as e:
+            raise TimeoutError(f"{config['host']} no respondió en {timeout:g} s") from e
     finally:
-        if connection is not None:
-            connection.close()
-            print("Conexión a la base de datos cerrada.")
-    
-    # Al final del procesamiento, buscar boletas anormales
+        conn.close()
+    return boletas, time.monotonic() - inicio, anomalias
+
+def _fusionar_boletas(destino: Dict[str, Boleta], origen: Dict[str, Boleta]) -> None:
+    """Agrega a destino las boletas de una partición posterior.
+
+    Una boleta con órdenes en varias particiones queda como si el bucle de referencia
+    hubiera recorrido las filas de ambas seguidas: conserva los datos base y la posición
+    de la primera, toma Update de la última, el último resultado de cada prueba, las
+    fracciones de Hb que la posterior agrega o quita (hb_quitadas), la fecha de resultado
+    más antigua y el estado de la posterior si tiene pruebas.
+    """
+    for num_ingreso, nueva in origen.items():
+        actual = destino.get(num_ingreso)
+        if actual is None:
+            destino[num_ingreso] = nueva
+            continue
+        actual.Update = nueva.Update
+        for posicion, valor in enumerate(nueva.Resultados):
+            if valor is not None:
+                actual.Resultados[posicion] = valor
+        for posicion, letra in zip(_POSICIONES_HB, _LETRAS_HB):
+            if letra in nueva.hb_quitadas:
+                actual.Resultados[posicion] = None
+        actual.hb_quitadas = "".join(
+            letra for posicion, letra in zip(_POSICIONES_HB, _LETRAS_HB)
+            if letra in nueva.hb_quitadas
+            or (letra in actual.hb_quitadas and nueva.Resultados[posicion] is None)
+        )
+        if nueva.Procesamiento is not None and (
+            actual.Procesamiento is None or nueva.Procesamiento < actual.Procesamiento
+        ):
+            actual.Procesamiento = nueva.Procesamiento
+        if nueva.FResultado is not None and (
+            actual.FResultado is None or nueva.FResultado < actual.FResultado
+        ):
+            actual.FResultado = nueva.FResultado
+        if nueva.con_pruebas:
+            actual.StdoBoleta = nueva.StdoBoleta
+            actual.FechaRechazo = nueva.FechaRechazo
+            actual.con_pruebas = True
+
+def _notificar_anomalias(boletas_agrupadas: Dict[str, Boleta],
+                         al_detectar_anomalias: Optional[Callable[[List[str]], None]]) -> None:
+    """Corrige las boletas anormales y avisa por el callback o, sin él, imprimiendo el aviso.
+
+    connection.py no depende de PyQt6: la interfaz pasa un callback y muestra el mensaje.
+    """
+    anormales = _corregir_boletas_anormales(boletas_agrupadas)
+    if anormales:
+        if al_detectar_anomalias is not None:
+            al_detectar_anomalias(anormales)
+        else:
+            print(mensaje_boletas_anormales(anormales))
+
+def generate_report_boleta(connection: psycopg2.extensions.connection, num_ingreso: str,
+                           fecha_inicio: str, fecha_fin: str) -> Optional[Boleta]:
+    """Vuelve a consultar una sola boleta del rango; None si ya no existe."""
+    with connection.cursor() as cursor:
+        cursor.execute(QUERY_BOLETA_PIVOTE, (fecha_inicio, fecha_fin, num_ingreso))
+        boletas = _agregar_filas_pivote(cursor.fetchall(), {})
+    _corregir_boletas_anormales(boletas)
+    return boletas.get(num_ingreso)
+
+def _corregir_boletas_anormales(boletas_agrupadas: Dict[str, Boleta]) -> List[str]:
+    """Marca como aceptadas las boletas rechazadas con fechas de resultado y las devuelve."""
     anormales = []
     for boleta in boletas_agrupadas.values():
         if (
-            boleta.get("StdoBoleta") == "R"
-            and boleta.get("Procesamiento", "#NULL#") != "#NULL#"
-            and boleta.get("FResultado", "#NULL#") != "#NULL#"
+            boleta.StdoBoleta == "R"
+            and boleta.Procesamiento is not None
+            and boleta.FResultado is not None
         ):
-            anormales.append(boleta.get("Boleta") or boleta.get("num_ingreso"))
+            anormales.append(boleta.Boleta)
             # Corregir el estado y la fecha de rechazo antes que se escriba el CSV y en la tblresults
-            boleta["StdoBoleta"] = "A"
-            boleta["FechaRechazo"] = "#NULL#"
+            boleta.StdoBoleta = "A"
+            boleta.FechaRechazo = None
+    return anormales
 
-    if anormales:
-        from PyQt6.QtWidgets import QMessageBox
-        lista = ", ".join(str(x) for x in anormales)
-        QMessageBox.critical(
-            None,
-            "Datos anormales detectados",
-            f"Se detectaron boletas rechazadas (StdoBoleta=R) con fechas de procesamiento/resultados no nulas. se corrigio el estado y la fecha de rechazo pero se recomienda validacion manual de boletas por posible boleta duplicada\n"
-            f"Boletas afectadas: {lista}"
+def mensaje_boletas_anormales(anormales: List[str]) -> str:
+    """Texto de advertencia para las boletas rechazadas con fechas de resultado."""
+    lista = ", ".join(str(x) for x in anormales)
+    return (
+        f"Se detectaron boletas rechazadas (StdoBoleta=R) con fechas de procesamiento/resultados no nulas. se corrigio el estado y la fecha de rechazo pero se recomienda validacion manual de boletas por posible boleta duplicada\n"
+        f"Boletas afectadas: {lista}"
+    )
+
+def _agregador(modo: str) -> Callable[..., Dict[str, Boleta]]:
+    """Función que agrupa las filas de cada modo; NumPy se importa solo en modo columnar."""
+    if modo == MODO_SQL:
+        return _agregar_filas_pivote
+    if modo == MODO_PYTHON:
+        return _agregar_filas
+    if modo == MODO_COLUMNAR:
+        try:
+            from agregacion_columnar import agregar_filas_columnar
+        except ImportError as e:
+            raise ImportError(f"El modo columnar requiere NumPy: {e}") from e
+        return agregar_filas_columnar
+    raise ValueError(f"Modo de reporte desconocido: {modo}")
+
+def _leer_por_bloques(cursor, tamano: int, medicion: metricas.MedicionReporte) -> Iterator[tuple]:
+    """Recorre un cursor del servidor con fetchmany anotando el tiempo de lectura y las filas."""
+    while True:
+        inicio = time.perf_counter()
+        bloque = cursor.fetchmany(tamano)
+        medicion.sumar("lectura", time.perf_counter() - inicio)
+        if not bloque:
+            return
+        medicion.contar("filas", len(bloque))
+        yield from bloque
+
+def _filas_con_progreso(filas: Iterable[tuple], boletas_agrupadas: Dict[str, Boleta],
+                        progreso: Callable[[int, Dict[str, Boleta]], None]) -> Iterator[tuple]:
+    """Recorre las filas notificando el progreso cada PASO_PROGRESO filas y al terminar."""
+    leidas = 0
+    for fila in filas:
+        yield fila
+        leidas += 1
+        if leidas % PASO_PROGRESO == 0:
+            progreso(leidas, boletas_agrupadas)
+    progreso(leidas, boletas_agrupadas)
+
+def _agregar_filas(rows, boletas_agrupadas: Dict[str, Boleta]) -> Dict[str, Boleta]:
+    """Agrupa fila a fila el resultado de QUERY_REPORTE (agregación de referencia)."""
+    for row in rows:
+        num_ingreso = row[0]
+        
+        # Saltar entradas con num_ingreso igual a 1
+        if num_ingreso == '1':
+            continue
+
+        id_prueba = row[8]
+        fecha_recepcion = fecha_de(row[14])
+
+        # Crear boleta si no existe
+        boleta = boletas_agrupadas.get(num_ingreso)
+        if boleta is None:
+            # Procesar datos básicos
+            nombre_paciente = utf_to_ansi(f"{str(row[2] or '').strip()} {str(row[3] or '').strip()}")
+
+            # Calcular edad
+            edad_dias = row[10] or 0
+            edad_horas = row[11] or 0
+            if edad_dias == 0 and edad_horas > 0:
+                edad_dias = int(edad_horas / 24)
+
+            boleta = boletas_agrupadas[num_ingreso] = create_boleta_base(
+                num_ingreso, fecha_de(row[1]), nombre_paciente, row[4],
+                row[5], edad_dias, fecha_recepcion, row[12], row[13]
+            )
+        # Asignar el valor de Update desde OTDE.update
+        boleta.Update = row[17]
+
+        # Procesar resultado para la prueba si id_prueba es válido (o rechazarla)
+        if id_prueba is not None:
+            boleta.con_pruebas = True
+            clave_resultado = int(id_prueba)
+            valid_ids = {852, 859, 854, 883, 886, 885, 888, 889, 890, 891, 892}
+            if clave_resultado in valid_ids:
+                # Procesar resultado según el origen
+                if clave_resultado in (889, 890, 891, 892) and row[16] and row[16] != 0:
+                    valor_resultado = row[15]
+                else:
+                    valor_resultado = row[7]
+                
+                # Actualizar solo si se obtuvo un valor válido
+                if valor_resultado not in (None, ""):
+                    boleta.Resultados[INDICE_RESULTADO[clave_resultado]] = valor_resultado
+                
+                # Procesar y asignar las fechas de Procesamiento y FResultado (la más antigua)
+                ts_final = row[6] if row[6] is not None else row[18]  # RN o RA.actualizado_timestamp
+                if ts_final is not None:
+                    if boleta.Procesamiento is None or ts_final < boleta.Procesamiento:
+                        boleta.Procesamiento = ts_final
+                    if boleta.FResultado is None or ts_final < boleta.FResultado:
+                        boleta.FResultado = ts_final
+                
+                # Como es un resultado aceptado:
+                boleta.StdoBoleta = "A"
+                boleta.FechaRechazo = None
+            else:
+                # Si la prueba tiene un id que no está en el conjunto válido, se marca como rechazado
+                boleta.StdoBoleta = "R"
+                # Asumir que la fecha de recepción se toma para FechaRechazo:
+                boleta.FechaRechazo = fecha_recepcion
+
+        # Reordenar resultados para los ids 889-892: cada letra va a la posición de su fracción
+        _reordenar_hemoglobinas(boleta.Resultados)
+    return boletas_agrupadas
+
+# Posiciones de HbF, HbA, HbS y HbC en Boleta.Resultados, en el orden de sus letras
+_POSICIONES_HB = tuple(INDICE_RESULTADO[id_prueba] for id_prueba in (889, 890, 891, 892))
+_LETRAS_HB = "FASC"
+
+def _reordenar_hemoglobinas(resultados: List[Any]) -> None:
+    """Mueve cada fracción F/A/S/C a su columna y descarta los demás valores de 889-892."""
+    presentes = {resultados[posicion] for posicion in _POSICIONES_HB}
+    for posicion, letra in zip(_POSICIONES_HB, _LETRAS_HB):
+        resultados[posicion] = letra if letra in presentes else None
+
+def _agregar_filas_pivote(rows, boletas_agrupadas: Dict[str, Boleta]) -> Dict[str, Boleta]:
+    """Construye las boletas a partir de QUERY_REPORTE_PIVOTE (una fila por num_ingreso)."""
+    for row in rows:
+        num_ingreso = row[0]
+        nombre_paciente = utf_to_ansi(f"{str(row[2] or '').strip()} {str(row[3] or '').strip()}")
+
+        edad_dias = row[6] or 0
+        edad_horas = row[7] or 0
+        if edad_dias == 0 and edad_horas > 0:
+            edad_dias = int(edad_horas / 24)
+
+        fecha_recepcion = fecha_de(row[10])
+
+        boleta = create_boleta_base(
+            num_ingreso, fecha_de(row[1]), nombre_paciente, row[4],
+            row[5], edad_dias, fecha_recepcion, row[8], row[9]
         )
-    
+        boleta.Update = row[11]
+        boleta.Resultados = list(row[12:19])
+        for letra, valor in zip(_LETRAS_HB, row[19:23]):
+            # '' marca una letra quitada por la última fila que la afecta
+            boleta.Resultados.append(valor or None)
+            if valor == "":
+                boleta.hb_quitadas += letra
+
+        primer_resultado, aceptada = row[23], row[24]
+        boleta.Procesamiento = primer_resultado
+        boleta.FResultado = primer_resultado
+
+        # Estado de la última fila con prueba; las anormales se corrigen después
+        if aceptada is not None:
+            boleta.con_pruebas = True
+            if aceptada:
+                boleta.StdoBoleta = "A"
+                boleta.FechaRechazo = None
+            else:
+                boleta.FechaRechazo = fecha_de(row[25])
+
+        boletas_agrupadas[num_ingreso] = boleta
     return boletas_agrupadas
 
+def comparar_reportes(referencia: Dict[str, Boleta],
+                      candidato: Dict[str, Boleta]) -> List[str]:
+    """Lista las diferencias entre dos reportes generados para el mismo rango."""
+    diferencias = []
+    for num_ingreso in referencia.keys() - candidato.keys():
+        diferencias.append(f"{num_ingreso}: solo en referencia")
+    for num_ingreso in candidato.keys() - referencia.keys():
+        diferencias.append(f"{num_ingreso}: solo en candidato")
+    for num_ingreso in referencia.keys() & candidato.keys():
+        boleta_ref = referencia[num_ingreso]
+        boleta_cand = candidato[num_ingreso]
+        for campo in CAMPOS_BOLETA:
+            valor_ref, valor_cand = getattr(boleta_ref, campo), getattr(boleta_cand, campo)
+            if valor_ref != valor_cand:
+                diferencias.append(f"{num_ingreso}: {campo} {valor_ref!r} != {valor_cand!r}")
+        for clave, res_ref, res_cand in zip(RESULTADOS_IDS, boleta_ref.Resultados, boleta_cand.Resultados):
+            if format_result_value(res_ref) != format_result_value(res_cand):
+                diferencias.append(f"{num_ingreso}: {clave} {res_ref!r} != {res_cand!r}")
+    return sorted(diferencias)
+
 def format_result_value(val):
     try:
         if val in ("#NULL#", None):
@@ -273,106 +1312,235 @@ def format_result_value(val):
     except (ValueError, TypeError):
         return str(val)
 
-def write_to_csv(boletas_agrupadas: Dict[str, Dict[str, Any]], filename: str = "reporte_labsis.csv") -> None:
-    """Escribe los datos agrupados a un archivo CSV."""
-    encabezados_internos = [
-        "codigoE", "Boleta", "FechaTomaMx", "Paciente", "Edad", "Sexo", "Expediente",
-        "Recepcion", "Procesamiento", "FResultado", "Resultado", "FechaRechazo", "EstadoPaciente",
-        "StdoBoleta", "Update", "ReferidoPor", "Id", "ResultadoIRT", "ResultadoPKU", "Resultado17OH",
-        "ResultadoJarabeA1", "ResultadoJarabeA2", "ResultadoTyr", "ResultHbF", "ResultHbA", "ResultHbS",
-        "ResultHbC"
-    ]
-
-    resultado_map = {
-        "Resultado": 852,
-        "ResultadoIRT": 859,
-        "ResultadoPKU": 854,
-        "Resultado17OH": 883,
-        "ResultadoJarabeA1": 886,
-        "ResultadoJarabeA2": 885,
-        "ResultadoTyr": 888,
-        "ResultHbF": 889,
-        "ResultHbA": 890,
-        "ResultHbS": 891,
-        "ResultHbC": 892,
-        "Resultado": 852
-    }
+# Codificación que entiende Access; lo que no cabe en cp1252 se translitera.
+CODIFICACION_CSV = "cp1252"
+BUFFER_CSV = 1 << 20
+# Líneas que se unen antes de escribir: codificar un bloque grande cuesta mucho menos
+# que codificar cada línea por separado
+LINEAS_POR_BLOQUE = 2000
+
+# Cada cuántas boletas escritas se notifica el progreso de write_to_csv
+PASO_PROGRESO_CSV = 5000
+
+def _transliterar(error: UnicodeEncodeError):
+    """Manejador de errores de codificación: quita acentos y usa '?' si no hay equivalente."""
+    texto = error.object[error.start:error.end]
+    plano = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    plano = plano.encode(CODIFICACION_CSV, "replace").decode(CODIFICACION_CSV)
+    return plano or "?", error.end
+
+codecs.register_error("labsis_transliterar", _transliterar)
+
+# Columnas del CSV en orden y cómo se escribe cada una. Los enteros son ids de prueba.
+COLUMNAS_CSV = (
+    ("codigoE", "texto"), ("Boleta", "texto"), ("FechaTomaMx", "fecha"),
+    ("Paciente", "texto"), ("Edad", "texto"), ("Sexo", "texto"), ("Expediente", "texto"),
+    ("Recepcion", "recepcion"), ("Procesamiento", "fecha_hora"), ("FResultado", "fecha_hora"),
+    ("Resultado", 852), ("FechaRechazo", "rechazo"), ("EstadoPaciente", "crudo"),
+    ("StdoBoleta", "texto"), ("Update", "update"), ("ReferidoPor", "crudo"), ("Id", "texto"),
+    ("ResultadoIRT", 859), ("ResultadoPKU", 854), ("Resultado17OH", 883),
+    ("ResultadoJarabeA1", 886), ("ResultadoJarabeA2", 885), ("ResultadoTyr", 888),
+    ("ResultHbF", 889), ("ResultHbA", 890), ("ResultHbS", 891), ("ResultHbC", 892),
+)
+
+def _formato_resultado(valor: Any) -> str:
+    """Resultado con un decimal entre comillas, texto entre comillas o #NULL#."""
+    if valor is None:
+        return "#NULL#"
+    try:
+        return f'"{float(valor):.1f}"'
+    except (ValueError, TypeError):
+        texto = str(valor)
+        return texto if texto[:1] == "#" and texto[-1:] == "#" else f'"{texto}"'
+
+class _TextosPorValor(dict):
+    """Texto de cada valor distinto, calculado la primera vez que aparece."""
 
-    def format_csv_value(value):
-        # No comillas si empieza y termina con #
-        if isinstance(value, str) and value.startswith("#") and value.endswith("#"):
-            return value
-        # No comillas si es numérico
+    def __init__(self, formatear: Callable[[Any], str]):
+        super().__init__()
+        self.formatear = formatear
+
+    def __missing__(self, valor: Any) -> str:
+        texto = self[valor] = self.formatear(valor)
+        return texto
+
+def _texto_update(valor: Any) -> str:
+    if valor is None:
+        return "#NULL#"
+    texto = str(valor).upper()
+    return texto if texto[:1] == "#" and texto[-1:] == "#" else f'"{texto}"'
+
+# Campos que se leen de una vez para la plantilla de cada línea. Tras ellos van el
+# Update ya formateado y los textos de los resultados (ver _lineas_csv).
+CAMPOS_PLANTILLA = tuple(campo for campo, tipo in COLUMNAS_CSV
+                         if not isinstance(tipo, int) and tipo != "update")
+
+def _orden_columnas_csv() -> Callable[[tuple], tuple]:
+    """Reordena (campos de CAMPOS_PLANTILLA, Update, resultados) en el orden de COLUMNAS_CSV."""
+    posiciones = []
+    for campo, tipo in COLUMNAS_CSV:
+        if isinstance(tipo, int):
+            posiciones.append(len(CAMPOS_PLANTILLA) + 1 + INDICE_RESULTADO[tipo])
+        elif tipo == "update":
+            posiciones.append(len(CAMPOS_PLANTILLA))
+        else:
+            posiciones.append(CAMPOS_PLANTILLA.index(campo))
+    return operator.itemgetter(*posiciones)
+
+def _plantilla_csv(clave: Tuple[Tuple[bool, ...], bool]) -> str:
+    """Plantilla % de una línea del CSV para los campos nulos y el con_pruebas de clave.
+
+    Los campos nulos se escriben literales ("%.0s" consume el None sin escribirlo), así
+    que cada línea solo formatea valores presentes. Las fechas se cortan de str(valor)
+    con %.10s y %.19s, que es mucho más barato que strftime.
+    """
+    nulos, con_pruebas = clave
+    partes = []
+    for campo, tipo in COLUMNAS_CSV:
+        if isinstance(tipo, int) or tipo == "update":
+            partes.append("%s")  # Ya formateados
+            continue
+        nulo = "#NULL#" if campo in CAMPOS_CON_NULL else "None"
+        if nulos[CAMPOS_PLANTILLA.index(campo)]:
+            # Recepcion siempre va entre '#', incluso el legado #None#
+            texto = f'"{nulo}"' if tipo == "texto" else f"#{nulo}#" if tipo == "recepcion" else nulo
+            partes.append("%.0s" + texto)
+        elif tipo == "texto":
+            partes.append('"%s"')
+        elif tipo == "crudo":
+            partes.append("%s")
+        elif tipo in ("fecha", "recepcion") or (tipo == "rechazo" and con_pruebas):
+            partes.append("#%.10s#")
+        elif tipo == "rechazo":
+            partes.append("%.10s")
+        elif tipo == "fecha_hora":
+            partes.append("#%.19s#")
+        else:
+            raise ValueError(f"Tipo de columna desconocido: {tipo}")
+    return ",".join(partes) + "\n"
+
+def _lineas_csv(boletas: Iterable[Boleta]) -> Iterator[str]:
+    """Genera el encabezado y una línea por boleta.
+
+    Cada línea es un solo formateo % con la plantilla de sus campos nulos (hay pocas
+    combinaciones). Update y los resultados se repiten mucho: se formatea cada valor
+    distinto una sola vez.
+    """
+    yield ",".join(f'"{campo}"' for campo, _ in COLUMNAS_CSV) + "\n"
+    leer = operator.attrgetter(*CAMPOS_PLANTILLA)
+    ordenar = _orden_columnas_csv()
+    ningunos = (None,) * len(CAMPOS_PLANTILLA)
+    plantillas = _TextosPorValor(_plantilla_csv)
+    updates = _TextosPorValor(_texto_update)
+    resultados = _TextosPorValor(_formato_resultado)
+    for boleta in boletas:
+        valores = leer(boleta)
+        plantilla = plantillas[tuple(map(operator.is_, valores, ningunos)), boleta.con_pruebas]
+        yield plantilla % ordenar(
+            valores + (updates[boleta.Update],) + tuple(map(resultados.__getitem__, boleta.Resultados))
+        )
+
+def _boletas_con_progreso(boletas: Iterable[Boleta], total: int,
+                          progreso: Callable[[int, int], None]) -> Iterator[Boleta]:
+    """Recorre las boletas avisando cada PASO_PROGRESO_CSV cuántas van escritas de total."""
+    escritas = 0
+    for escritas, boleta in enumerate(boletas, start=1):
+        yield boleta
+        if escritas % PASO_PROGRESO_CSV == 0:
+            progreso(escritas, total)
+    progreso(escritas, total)
+
+@contextmanager
+def archivo_temporal(filename: str) -> Iterator[str]:
+    """Ruta temporal junto a filename que se renombra a filename si el bloque termina bien.
+
+    Quien lee filename ve el archivo anterior o el nuevo completo, nunca uno a medio
+    escribir. Si el bloque falla el temporal se borra, la excepción se propaga y
+    filename queda como estaba.
+    """
+    temporal = f"{filename}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        yield temporal
+        os.replace(temporal, filename)
+    except BaseException:
         try:
-            float_val = float(value)
-            return f"{float_val:.1f}"
-        except (ValueError, TypeError):
-            pass
-        # Comillas solo si es alfanumérico y no cumple lo anterior
-        return f'"{value}"'
+            os.remove(temporal)
+        except OSError:
+            pass  # No llegó a crearse o ya se renombró
+        raise
 
+def escribir_atomico(filename: str, lineas: Iterable[str]) -> None:
+    """Escribe las líneas con la codificación del reporte a través de archivo_temporal."""
+    with archivo_temporal(filename) as temporal:
+        with open(temporal, mode="x", newline="", encoding=CODIFICACION_CSV,
+                  errors="labsis_transliterar", buffering=BUFFER_CSV) as f:
+            lineas = iter(lineas)
+            while bloque := "".join(itertools.islice(lineas, LINEAS_POR_BLOQUE)):
+                f.write(bloque)
+            f.flush()
+            os.fsync(f.fileno())
+
+def write_to_csv(boletas_agrupadas: Dict[str, Boleta], filename: str = "reporte_labsis.csv",
+                 propagar_errores: bool = False,
+                 medicion: Optional[metricas.MedicionReporte] = None,
+                 progreso: Optional[Callable[[int, int], None]] = None) -> None:
+    """Escribe los datos agrupados a un archivo CSV.
+
+    El CSV se escribe con escribir_atomico, así que quien lee filename (p. ej. el
+    proceso de importación) ve el archivo anterior o el nuevo completo, nunca uno a
+    medio escribir.
+
+    progreso recibe las boletas escritas y el total cada PASO_PROGRESO_CSV boletas y
+    al terminar. Con medicion se anotan los segundos de escritura y los bytes del archivo.
+    """
+    boletas: Iterable[Boleta] = boletas_agrupadas.values()
+    if progreso is not None:
+        boletas = _boletas_con_progreso(boletas, len(boletas_agrupadas), progreso)
     try:
-        with open(filename, mode="w", newline="", encoding="ANSI") as f:
-            f.write(','.join([format_csv_value(h) for h in encabezados_internos]) + '\n')
-            for boleta_data in boletas_agrupadas.values():
-                row = []
-                for campo in encabezados_internos:
-                    if campo in resultado_map:
-                        value = boleta_data.get("Resultados", {}).get(resultado_map[campo], "#NULL#")
-                        value = format_result_value(value)
-                        # Solo poner comillas si es numérico y no es #NULL#
-                        if value not in ("#NULL#", None) and not (isinstance(value, str) and value.startswith("#") and value.endswith("#")):
-                            try:
-                                float_val = float(value)
-                                value = f'"{float_val:.1f}"'
-                            except (ValueError, TypeError):
-                                value = f'"{value}"'
-                        # Si es #NULL# o está entre #, no poner comillas
-                    else:
-                        value = boleta_data.get(campo, "#NULL#")
-                        if campo == "Update":
-                            value = value.upper() if value not in ("#NULL#", None) else "#NULL#"
-                            if value not in ("#NULL#", None) and not (isinstance(value, str) and value.startswith("#") and value.endswith("#")):
-                                value = f'"{value}"'
-                        # Si el campo es Boleta, Expediente o Edad, siempre entre comillas
-                        if campo in ("codigoE","Paciente","Boleta", "Expediente", "Edad", "Sexo", "Id","StdoBoleta"):
-                            value = f'"{value}"'
-                    # Si el campo es Recepcion, siempre entre ##
-                    if campo == "Recepcion":
-                        if not (isinstance(value, str) and value.startswith("#") and value.endswith("#")):
-                            value = f"#{value}#"
-                        row.append(value)
-                    else:
-                        row.append(value)
-                    
-                f.write(','.join(row) + '\n')
+        with metricas.medir(medicion, "csv"):
+            escribir_atomico(filename, _lineas_csv(boletas))
+        if medicion is not None:
+            medicion.contar("bytes", os.path.getsize(filename))
 
         print(f"Datos escritos en {filename} exitosamente.")
 
     except Exception as e:
+        if propagar_errores:
+            raise
         print(f"Error escribiendo el archivo CSV: {e}")
 
-def update_boleta_update(num_ingreso: str, valor_update: str) -> None:
-    """Actualiza el campo Update en la base de datos usando num_ingreso."""
-    conn = connect_to_db()
-    if conn is None:
-        raise Exception("No se pudo conectar a la base de datos")
-    try:
-        with conn.cursor() as cursor:
-            # Buscar el orden_id usando num_ingreso
-            cursor.execute(
-                "SELECT id FROM orden_trabajo WHERE num_ingreso = %s",
-                (num_ingreso,)
-            )
-            result = cursor.fetchone()
-            if not result:
-                raise Exception(f"No se encontró orden_id para num_ingreso {num_ingreso}")
-            orden_id = result[0]
-            # Actualizar el campo update en orden_trabajo_datos_extra usando orden_id
-            cursor.execute(
-                "UPDATE orden_trabajo_datos_extra SET update = %s WHERE orden_id = %s",
-                (valor_update if valor_update else None, orden_id)
-            )
+def update_boletas_update(cambios: Dict[str, str]) -> Dict[str, str]:
+    """Aplica en una sola transacción los valores de Update pendientes por num_ingreso.
+
+    Devuelve los num_ingreso que no se pudieron actualizar junto con el motivo; si la
+    sentencia falla no se aplica ningún cambio y se propaga la excepción.
+    """
+    if not cambios:
+        return {}
+    valores = [(num_ingreso, valor if valor else None) for num_ingreso, valor in cambios.items()]
+    with obtener_pool().conexion() as conn:
+        try:
+            with conn.cursor() as cursor:
+                actualizadas = psycopg2.extras.execute_values(
+                    cursor,
+                    """
+                    UPDATE orden_trabajo_datos_extra OTDE
+                    SET update = V.valor
+                    FROM orden_trabajo OT, (VALUES %s) AS V(num_ingreso, valor)
+                    WHERE OT.num_ingreso = V.num_ingreso AND OTDE.orden_id = OT.id
+                    RETURNING OT.num_ingreso
+                    """,
+                    valores,
+                    template="(%s, %s::text)",
+                    page_size=len(valores),
+                    fetch=True
+                )
             conn.commit()
-    finally:
-        conn.close()
\ No newline at end of file
+        except Exception:
+            conn.rollback()
+            raise
+    encontradas = {fila[0] for fila in actualizadas}
+    return {
+        num_ingreso: f"No se encontró orden_id para num_ingreso {num_ingreso}"
+        for num_ingreso in cambios if num_ingreso not in encontradas
+    }
@@ -0,0 +1,86 @@
+"""Estado de la exportación incremental: marca de agua y diario de ediciones de Update.
+
+La marca de agua es el actualizado_timestamp más reciente ya exportado. OTDE.update no
+tiene fecha de modificación, así que las ediciones hechas desde la aplicación se anotan
+en un diario local hasta que una exportación incremental que las incluya en su rango
+las escribe.
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from archivos_locales import directorio_local, nombre_origen
+
+
+def ruta_por_defecto(config: Dict[str, str]) -> str:
+    """Archivo de estado de la exportación incremental para un servidor."""
+    return os.path.join(directorio_local(), f"delta_{nombre_origen(config)}.sqlite")
+
+
+class EstadoDelta:
+    """Marca de agua y diario de Update guardados en un archivo SQLite."""
+
+    def __init__(self, ruta: str):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.ruta = ruta
+        self._db = sqlite3.connect(ruta, timeout=30)
+        with self._db:
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor TEXT);
+                CREATE TABLE IF NOT EXISTS diario_update (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    num_ingreso TEXT NOT NULL,
+                    registrado REAL NOT NULL
+                );
+            """)
+
+    def marca_agua(self) -> Optional[datetime]:
+        """actualizado_timestamp más reciente ya exportado; None antes de la primera exportación."""
+        fila = self._db.execute("SELECT valor FROM estado WHERE clave = 'marca_agua'").fetchone()
+        return datetime.fromisoformat(fila[0]) if fila else None
+
+    def registrar_updates(self, num_ingresos: Iterable[str]) -> None:
+        """Anota boletas cuyo Update se editó para incluirlas en la próxima exportación."""
+        ahora = time.time()
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO diario_update (num_ingreso, registrado) VALUES (?, ?)",
+                ((num_ingreso, ahora) for num_ingreso in num_ingresos),
+            )
+
+    def updates_pendientes(self) -> Tuple[List[str], int]:
+        """Boletas anotadas en el diario y el último id leído (para confirmar después)."""
+        filas = self._db.execute("SELECT id, num_ingreso FROM diario_update ORDER BY id").fetchall()
+        if not filas:
+            return [], 0
+        return sorted({num_ingreso for _, num_ingreso in filas}), filas[-1][0]
+
+    def confirmar(self, marca_agua: Optional[datetime], hasta_id: int,
+                  exportadas: Iterable[str]) -> None:
+        """Avanza la marca de agua y quita del diario las boletas exportadas, en una sola transacción.
+
+        Solo se quitan las anotaciones hasta hasta_id de las boletas en exportadas: las
+        editadas fuera del rango exportado siguen en el diario para la próxima vez.
+        """
+        with self._db:
+            if marca_agua is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO estado VALUES ('marca_agua', ?)", (marca_agua.isoformat(),)
+                )
+            self._db.executemany(
+                "DELETE FROM diario_update WHERE id <= ? AND num_ingreso = ?",
+                ((hasta_id, num_ingreso) for num_ingreso in exportadas),
+            )
+
+    def cerrar(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "EstadoDelta":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
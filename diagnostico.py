@@ -0,0 +1,317 @@
+"""Diagnóstico del plan de la consulta del reporte y de los índices que necesita.
+
+Uso:
+    python diagnostico.py --desde 2024-01-01 --hasta 2024-01-31 [--modo sql|python] [--sin-analyze] [--json]
+
+Ejecuta EXPLAIN (ANALYZE, BUFFERS) sobre la misma consulta que generate_report usa
+para el rango y modo indicados, resume los nodos con más tiempo propio y verifica
+que las columnas de filtro y de unión tengan un índice que empiece por ellas. Con
+--sin-analyze la consulta no se ejecuta y los nodos se ordenan por costo estimado.
+
+Códigos de salida (los mismos que exportar.py):
+
+    0  sin advertencias
+    1  error de conexión o de consulta
+    2  argumentos inválidos
+    3  faltan índices o el plan filtra tablas grandes sin índice
+"""
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import connection
+from cli_comun import SALIDA_ADVERTENCIAS, SALIDA_ERROR, SALIDA_OK, fecha_argumento
+
+# Columnas de filtro y de unión de las consultas y qué consulta las usa. Cada una
+# debería ser la primera columna de algún índice.
+INDICES_REQUERIDOS: Tuple[Tuple[str, str, str], ...] = (
+    ("orden_trabajo_datos_extra", "fecha_recepcion", "reporte"),
+    ("orden_trabajo_datos_extra", "orden_id", "reporte"),
+    ("orden_trabajo", "id", "reporte"),
+    ("prueba_orden", "orden_id", "reporte"),
+    ("resultado_numer", "pruebao_id", "reporte"),
+    ("resultado_alpha", "pruebao_id", "reporte"),
+    ("paciente", "id", "reporte"),
+    ("prueba", "id", "reporte"),
+    ("servicio_medico", "id", "reporte"),
+    ("orden_trabajo", "num_ingreso", "boleta"),
+    ("prueba_orden", "id", "delta"),
+    ("resultado_numer", "actualizado_timestamp", "delta"),
+    ("resultado_alpha", "actualizado_timestamp", "delta"),
+)
+
+# Primera columna de cada índice válido de las tablas visibles en el search_path
+QUERY_INDICES = """
+    SELECT C.relname, A.attname, I.indexrelid::regclass::text
+    FROM pg_index I
+    JOIN pg_class C ON C.oid = I.indrelid
+    JOIN pg_attribute A ON A.attrelid = I.indrelid AND A.attnum = I.indkey[0]
+    WHERE C.relname = ANY(%s) AND I.indisvalid AND pg_table_is_visible(C.oid)
+"""
+
+QUERY_TABLAS = """
+    SELECT relname, reltuples::bigint, pg_total_relation_size(oid)
+    FROM pg_class
+    WHERE relname = ANY(%s) AND relkind IN ('r', 'p') AND pg_table_is_visible(oid)
+"""
+
+NODOS_MOSTRADOS = 8
+# Un Seq Scan sobre una tabla con menos filas que esto no se informa
+FILAS_SEQ_SCAN = 10000
+# Diferencia entre filas estimadas y reales a partir de la cual se sugiere ANALYZE
+FACTOR_ESTIMACION = 10
+
+
+def _recorrer(plan: Dict[str, Any], profundidad: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+    yield plan, profundidad
+    for hijo in plan.get("Plans", ()):
+        yield from _recorrer(hijo, profundidad + 1)
+
+
+def _tiempo_total(nodo: Dict[str, Any]) -> float:
+    """Milisegundos de un nodo sumando todas sus ejecuciones."""
+    return nodo.get("Actual Total Time", 0.0) * nodo.get("Actual Loops", 1)
+
+
+def nodos_costosos(plan: Dict[str, Any], analizado: bool,
+                   limite: int = NODOS_MOSTRADOS) -> List[Dict[str, Any]]:
+    """Nodos del plan ordenados por tiempo propio (o costo propio sin ANALYZE).
+
+    El valor propio de un nodo es el suyo menos el de sus hijos directos.
+    """
+    nodos = []
+    for nodo, profundidad in _recorrer(plan):
+        hijos = nodo.get("Plans", ())
+        if analizado:
+            propio = _tiempo_total(nodo) - sum(_tiempo_total(h) for h in hijos)
+        else:
+            propio = nodo.get("Total Cost", 0.0) - sum(h.get("Total Cost", 0.0) for h in hijos)
+        nodos.append({
+            "nodo": nodo["Node Type"],
+            "relacion": nodo.get("Relation Name"),
+            "alias": nodo.get("Alias"),
+            "indice": nodo.get("Index Name"),
+            "profundidad": profundidad,
+            "propio": round(max(propio, 0.0), 3),
+            "filas": nodo.get("Actual Rows", 0) * nodo.get("Actual Loops", 1) if analizado else None,
+            "filas_estimadas": nodo.get("Plan Rows"),
+            "filas_descartadas": nodo.get("Rows Removed by Filter"),
+            "bloques_cache": nodo.get("Shared Hit Blocks"),
+            "bloques_leidos": nodo.get("Shared Read Blocks"),
+            "filtro": nodo.get("Filter") or nodo.get("Index Cond") or nodo.get("Hash Cond"),
+        })
+    nodos.sort(key=lambda n: n["propio"], reverse=True)
+    return nodos[:limite]
+
+
+def advertencias_plan(plan: Dict[str, Any], analizado: bool,
+                      tablas: Dict[str, Dict[str, int]]) -> List[str]:
+    """Recorridos completos que un índice evitaría y estimaciones de filas muy erradas.
+
+    Un Seq Scan que alimenta un Hash Join no se informa por sí solo: con rangos
+    largos suele ser el mejor plan. Sí se informa si descarta con su filtro la mayor
+    parte de una tabla grande o si se repite dentro de un bucle.
+    """
+    advertencias = []
+    for nodo, _ in _recorrer(plan):
+        relacion = nodo.get("Relation Name")
+        if nodo["Node Type"] in ("Seq Scan", "Parallel Seq Scan") and relacion:
+            filas = tablas.get(relacion, {}).get("filas", 0)
+            vueltas = nodo.get("Actual Loops", 1)
+            if analizado:
+                descartadas = nodo.get("Rows Removed by Filter", 0) * vueltas
+                devueltas = nodo.get("Actual Rows", 0) * vueltas
+                filtra = descartadas >= FILAS_SEQ_SCAN and descartadas > devueltas
+            else:
+                descartadas = None
+                filtra = "Filter" in nodo and filas >= FILAS_SEQ_SCAN and nodo.get("Plan Rows", 0) < filas / 2
+            if filtra:
+                detalle = f", descarta {descartadas} filas" if descartadas else ""
+                advertencias.append(
+                    f"{nodo['Node Type']} sobre {relacion} filtrando por {nodo['Filter']} (~{filas} filas{detalle})"
+                )
+            elif vueltas > 1 and filas >= FILAS_SEQ_SCAN:
+                advertencias.append(f"{nodo['Node Type']} sobre {relacion} repetido {vueltas} veces")
+        if analizado and nodo.get("Actual Loops"):
+            reales = nodo.get("Actual Rows", 0)
+            estimadas = nodo.get("Plan Rows", 0)
+            if max(reales, estimadas) >= 1000 and max(reales, 1) / max(estimadas, 1) >= FACTOR_ESTIMACION:
+                destino = f" en {relacion}" if relacion else ""
+                advertencias.append(
+                    f"{nodo['Node Type']}{destino}: {reales} filas reales contra {estimadas} estimadas "
+                    "(¿falta ANALYZE?)"
+                )
+    return advertencias
+
+
+def verificar_indices(cursor) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, int]]]:
+    """Estado de cada columna de INDICES_REQUERIDOS y el tamaño de las tablas."""
+    tablas_requeridas = sorted({tabla for tabla, _, _ in INDICES_REQUERIDOS})
+    cursor.execute(QUERY_INDICES, (tablas_requeridas,))
+    existentes: Dict[Tuple[str, str], str] = {}
+    for tabla, columna, indice in cursor.fetchall():
+        existentes.setdefault((tabla, columna), indice)
+    cursor.execute(QUERY_TABLAS, (tablas_requeridas,))
+    tablas = {nombre: {"filas": filas, "bytes": tamano} for nombre, filas, tamano in cursor.fetchall()}
+
+    indices = []
+    for tabla, columna, consulta in INDICES_REQUERIDOS:
+        indice = existentes.get((tabla, columna))
+        indices.append({
+            "tabla": tabla,
+            "columna": columna,
+            "consulta": consulta,
+            "existe_tabla": tabla in tablas,
+            "indice": indice,
+            "sugerencia": None if indice or tabla not in tablas else f"CREATE INDEX ON {tabla} ({columna});",
+        })
+    return indices, tablas
+
+
+def explicar(cursor, query: str, parametros: tuple, analizar: bool = True) -> Dict[str, Any]:
+    """Plan de la consulta en formato JSON; con analizar se ejecuta y trae tiempos y buffers."""
+    opciones = "ANALYZE, BUFFERS, FORMAT JSON" if analizar else "FORMAT JSON"
+    cursor.execute(f"EXPLAIN ({opciones}) {query}", parametros)
+    resultado = cursor.fetchone()[0]
+    if isinstance(resultado, str):
+        resultado = json.loads(resultado)
+    return resultado[0]
+
+
+def diagnosticar(fecha_inicio: str, fecha_fin: str, modo: str = connection.MODO_SQL,
+                 analizar: bool = True) -> Dict[str, Any]:
+    """Plan, nodos costosos, índices y advertencias de la consulta del reporte para el rango."""
+    resumen: Dict[str, Any] = {
+        "desde": fecha_inicio,
+        "hasta": fecha_fin,
+        "modo": modo,
+        "consulta": "QUERY_REPORTE_PIVOTE" if modo == connection.MODO_SQL else "QUERY_REPORTE",
+        "analizado": analizar,
+        "advertencias": [],
+        "error": None,
+    }
+    query = connection.QUERY_REPORTE_PIVOTE if modo == connection.MODO_SQL else connection.QUERY_REPORTE
+
+    with redirect_stdout(sys.stderr):
+        conn = connection.connect_to_db()
+    if conn is None:
+        resumen["error"] = "No se pudo conectar a la base de datos"
+        return resumen
+    try:
+        with conn.cursor() as cursor:
+            indices, tablas = verificar_indices(cursor)
+            explicado = explicar(cursor, query, (fecha_inicio, fecha_fin), analizar)
+    except Exception as e:
+        resumen["error"] = f"{type(e).__name__}: {e}"
+        return resumen
+    finally:
+        conn.rollback()
+        conn.close()
+
+    plan = explicado["Plan"]
+    resumen["planificacion_ms"] = explicado.get("Planning Time")
+    resumen["ejecucion_ms"] = explicado.get("Execution Time")
+    resumen["filas"] = plan.get("Actual Rows") if analizar else plan.get("Plan Rows")
+    resumen["costo_total"] = plan.get("Total Cost")
+    resumen["bloques_cache"] = plan.get("Shared Hit Blocks")
+    resumen["bloques_leidos"] = plan.get("Shared Read Blocks")
+    resumen["nodos"] = nodos_costosos(plan, analizar)
+    resumen["indices"] = indices
+    resumen["tablas"] = tablas
+
+    for indice in indices:
+        if not indice["existe_tabla"]:
+            resumen["advertencias"].append(f"No se encontró la tabla {indice['tabla']}")
+        elif indice["indice"] is None:
+            resumen["advertencias"].append(
+                f"Sin índice en {indice['tabla']}.{indice['columna']} (consulta {indice['consulta']})"
+            )
+    resumen["advertencias"].extend(advertencias_plan(plan, analizar, tablas))
+    resumen["plan"] = explicado
+    return resumen
+
+
+def formatear(resumen: Dict[str, Any]) -> str:
+    """Texto del diagnóstico para mostrar al DBA."""
+    if resumen["error"]:
+        return f"Error: {resumen['error']}"
+    lineas = [f"{resumen['consulta']} del {resumen['desde']} al {resumen['hasta']} (modo {resumen['modo']})"]
+    if resumen["analizado"]:
+        lineas.append(
+            f"Planificación {resumen['planificacion_ms']:.1f} ms, ejecución {resumen['ejecucion_ms']:.1f} ms, "
+            f"{resumen['filas']} filas; bloques en caché {resumen['bloques_cache']}, "
+            f"leídos {resumen['bloques_leidos']}"
+        )
+        unidad = "ms"
+        total = resumen["ejecucion_ms"] or 1.0
+    else:
+        lineas.append(f"Costo estimado {resumen['costo_total']:.0f}, {resumen['filas']} filas estimadas")
+        unidad = ""
+        total = resumen["costo_total"] or 1.0
+
+    lineas.append("")
+    lineas.append("Nodos con más tiempo propio:" if resumen["analizado"] else "Nodos con más costo propio:")
+    for nodo in resumen["nodos"]:
+        destino = f" sobre {nodo['relacion']} {nodo['alias']}" if nodo["relacion"] else ""
+        indice = f" usando {nodo['indice']}" if nodo["indice"] else ""
+        filas = f"{nodo['filas']} filas (est. {nodo['filas_estimadas']})" if nodo["filas"] is not None \
+            else f"est. {nodo['filas_estimadas']} filas"
+        lineas.append(
+            f"  {nodo['propio']:>10.1f} {unidad:<2} {100 * nodo['propio'] / total:>5.1f}%  "
+            f"{nodo['nodo']}{destino}{indice}, {filas}"
+        )
+
+    lineas.append("")
+    lineas.append("Índices:")
+    for indice in resumen["indices"]:
+        if indice["indice"]:
+            estado = f"ok     {indice['indice']}"
+        elif not indice["existe_tabla"]:
+            estado = "--     tabla no encontrada"
+        else:
+            estado = f"FALTA  {indice['sugerencia']}"
+        lineas.append(f"  {indice['tabla'] + '.' + indice['columna']:<44} {indice['consulta']:<8} {estado}")
+
+    if resumen["advertencias"]:
+        lineas.append("")
+        lineas.append("Advertencias:")
+        lineas.extend(f"  - {advertencia}" for advertencia in resumen["advertencias"])
+    return "\n".join(lineas)
+
+
+def codigo_salida(resumen: Dict[str, Any]) -> int:
+    if resumen["error"]:
+        return SALIDA_ERROR
+    if resumen["advertencias"]:
+        return SALIDA_ADVERTENCIAS
+    return SALIDA_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Muestra el plan de la consulta del reporte y verifica sus índices."
+    )
+    parser.add_argument("--desde", required=True, type=fecha_argumento, help="fecha de recepción inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", required=True, type=fecha_argumento, help="fecha de recepción final (AAAA-MM-DD)")
+    parser.add_argument("--modo", choices=(connection.MODO_SQL, connection.MODO_PYTHON),
+                        default=connection.MODO_SQL,
+                        help="consulta a explicar: pivote (sql) o detallada (python y columnar)")
+    parser.add_argument("--sin-analyze", action="store_true",
+                        help="solo el plan estimado, sin ejecutar la consulta")
+    parser.add_argument("--json", action="store_true", help="imprime el diagnóstico completo como JSON")
+    args = parser.parse_args(argv)
+    if args.desde > args.hasta:
+        parser.error("--desde no puede ser posterior a --hasta")
+
+    resumen = diagnosticar(args.desde, args.hasta, args.modo, analizar=not args.sin_analyze)
+    if args.json:
+        print(json.dumps(resumen, ensure_ascii=False, default=str))
+    else:
+        print(formatear(resumen), file=sys.stderr if resumen["error"] else sys.stdout)
+    return codigo_salida(resumen)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
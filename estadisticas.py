@@ -0,0 +1,326 @@
+"""Estadísticas del reporte calculadas en PostgreSQL: volumen, rechazo y tiempo de respuesta.
+
+Uso:
+    python estadisticas.py --desde 2024-01-01 --hasta 2024-12-31 [--salida estadisticas.csv] [--json]
+
+Se agregan por día de recepción, por servicio (codigo_bloom) y por prueba sobre las
+mismas filas que el reporte (CTE_FILAS_REPORTE), así que el total de boletas coincide
+con el del CSV del mismo rango. Al cliente solo llega una fila por grupo.
+
+El tiempo de respuesta de una boleta son las horas desde su fecha de recepción hasta
+su primer resultado (la FResultado del reporte); el de una prueba, hasta el primer
+resultado de esa prueba. Las fracciones de hemoglobina 889-892 cuentan como una sola
+prueba, Hb.
+
+Códigos de salida (los mismos que exportar.py):
+
+    0  sin advertencias
+    1  error de conexión, de consulta o de escritura
+    2  argumentos inválidos
+    3  rango sin boletas
+"""
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+from typing import Any, Dict, Iterator, List, Optional
+
+import psycopg2
+
+import connection
+import metricas
+from cli_comun import SALIDA_ADVERTENCIAS, SALIDA_ERROR, SALIDA_OK, fecha_argumento
+
+DIMENSION_TOTAL = "total"
+DIMENSION_DIA = "dia"
+DIMENSION_SERVICIO = "servicio"
+DIMENSION_PRUEBA = "prueba"
+
+# Pruebas en el orden de las columnas del CSV; 889 agrupa las cuatro fracciones de Hb
+NOMBRES_PRUEBA = {
+    852: "TSH", 859: "IRT", 854: "PKU", 883: "17OH",
+    886: "JarabeA1", 885: "JarabeA2", 888: "Tyr", 889: "Hb",
+}
+
+_IDS_RESULTADO = ", ".join(str(id_prueba) for id_prueba in connection.RESULTADOS_IDS)
+
+# Un valor que el reporte escribe: de Hb solo cuentan las letras de cada fracción
+_CON_VALOR = "valor IS NOT NULL AND (prueba_id NOT BETWEEN 889 AND 892 OR valor IN ('F', 'A', 'S', 'C'))"
+
+# Las boletas se arman como en el pivote: primera orden recibida y aceptada si su
+# última fila con prueba es del reporte o, como al corregir las anormales, si tiene
+# fecha de resultado. Se agrupan con GROUPING SETS en una sola pasada.
+QUERY_ESTADISTICAS = "WITH" + connection.CTE_FILAS_REPORTE.format(
+    filtro="OTDE.fecha_recepcion BETWEEN %s AND %s"
+) + f""",
+    boletas AS (
+        SELECT num_ingreso,
+               (array_agg(orden_id ORDER BY fecha_recepcion, orden_id))[1] AS primera_orden,
+               MIN(fecha_recepcion) AS recepcion,
+               MIN(actualizado) FILTER (WHERE prueba_id IN ({_IDS_RESULTADO})) AS primer_resultado,
+               COALESCE((array_agg(prueba_id IN ({_IDS_RESULTADO}) ORDER BY {connection.ORDEN_ULTIMA_FILA})
+                            FILTER (WHERE prueba_id IS NOT NULL))[1], FALSE)
+                   OR MIN(actualizado) FILTER (WHERE prueba_id IN ({_IDS_RESULTADO})) IS NOT NULL AS aceptada,
+               COALESCE(bool_or(prueba_id IN ({_IDS_RESULTADO}) AND {_CON_VALOR}), FALSE) AS con_resultado
+        FROM filas
+        GROUP BY num_ingreso
+    ),
+    por_boleta AS (
+        SELECT B.recepcion::date AS dia, SM.codigo_bloom AS servicio, B.aceptada, B.con_resultado,
+               EXTRACT(EPOCH FROM B.primer_resultado - B.recepcion)::float8 / 3600 AS horas
+        FROM boletas B
+        JOIN orden_trabajo OT ON OT.id = B.primera_orden
+        LEFT JOIN servicio_medico SM ON OT.servicio_medico_id = SM.id
+    ),
+    por_prueba AS (
+        SELECT F.num_ingreso,
+               CASE WHEN F.prueba_id BETWEEN 889 AND 892 THEN 889 ELSE F.prueba_id END AS prueba,
+               bool_or({_CON_VALOR}) AS con_resultado,
+               EXTRACT(EPOCH FROM MIN(F.actualizado) - MIN(B.recepcion))::float8 / 3600 AS horas
+        FROM filas F
+        JOIN boletas B ON B.num_ingreso = F.num_ingreso
+        WHERE F.prueba_id IN ({_IDS_RESULTADO})
+        GROUP BY 1, 2
+    )
+    SELECT CASE WHEN GROUPING(dia) = 0 THEN '{DIMENSION_DIA}'
+                WHEN GROUPING(servicio) = 0 THEN '{DIMENSION_SERVICIO}'
+                ELSE '{DIMENSION_TOTAL}' END AS dimension,
+           COALESCE(dia::text, servicio) AS clave,
+           COUNT(*), COUNT(*) FILTER (WHERE aceptada), COUNT(*) FILTER (WHERE con_resultado),
+           COUNT(horas), AVG(horas),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY horas),
+           percentile_cont(0.9) WITHIN GROUP (ORDER BY horas)
+    FROM por_boleta
+    GROUP BY GROUPING SETS ((dia), (servicio), ())
+    UNION ALL
+    SELECT '{DIMENSION_PRUEBA}', prueba::text,
+           COUNT(*), NULL, COUNT(*) FILTER (WHERE con_resultado),
+           COUNT(horas), AVG(horas),
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY horas),
+           percentile_cont(0.9) WITHIN GROUP (ORDER BY horas)
+    FROM por_prueba
+    GROUP BY prueba
+    ORDER BY 1, 2 NULLS LAST
+"""
+
+# Encabezados del CSV de estadísticas, en el orden de FilaEstadistica.valores()
+COLUMNAS_ESTADISTICAS = (
+    "Dimension", "Clave", "Boletas", "Aceptadas", "Rechazadas", "PorcentajeRechazo",
+    "ConResultado", "ConTiempo", "HorasPromedio", "HorasMediana", "HorasP90",
+)
+
+
+class FilaEstadistica:
+    """Agregados de un grupo: un día, un servicio, una prueba o el total del rango.
+
+    En las filas de prueba, boletas son las que tienen la prueba y aceptadas vale
+    None (el rechazo es de la boleta, no de la prueba). Las horas valen None si
+    ninguna boleta del grupo tiene resultado con fecha.
+    """
+    __slots__ = ("dimension", "clave", "boletas", "aceptadas", "con_resultado",
+                 "con_tiempo", "horas_promedio", "horas_mediana", "horas_p90")
+
+    def __init__(self, dimension: str, clave: Optional[str], boletas: int, aceptadas: Optional[int],
+                 con_resultado: int, con_tiempo: int, horas_promedio: Optional[float],
+                 horas_mediana: Optional[float], horas_p90: Optional[float]):
+        self.dimension = dimension
+        self.clave = clave
+        self.boletas = boletas
+        self.aceptadas = aceptadas
+        self.con_resultado = con_resultado
+        self.con_tiempo = con_tiempo
+        self.horas_promedio = horas_promedio
+        self.horas_mediana = horas_mediana
+        self.horas_p90 = horas_p90
+
+    @property
+    def rechazadas(self) -> Optional[int]:
+        return None if self.aceptadas is None else self.boletas - self.aceptadas
+
+    @property
+    def porcentaje_rechazo(self) -> Optional[float]:
+        if self.aceptadas is None or not self.boletas:
+            return None
+        return 100 * self.rechazadas / self.boletas
+
+    @property
+    def etiqueta(self) -> str:
+        """Texto del grupo para mostrar: nombre de la prueba, "(sin servicio)" o la clave."""
+        if self.dimension == DIMENSION_PRUEBA:
+            return NOMBRES_PRUEBA.get(int(self.clave), self.clave)
+        if self.dimension == DIMENSION_TOTAL:
+            return "Total"
+        return self.clave if self.clave is not None else "(sin servicio)"
+
+    def valores(self) -> tuple:
+        """Valores en el orden de COLUMNAS_ESTADISTICAS."""
+        return (self.dimension, self.etiqueta, self.boletas, self.aceptadas, self.rechazadas,
+                self.porcentaje_rechazo, self.con_resultado, self.con_tiempo,
+                self.horas_promedio, self.horas_mediana, self.horas_p90)
+
+    def como_dict(self) -> Dict[str, Any]:
+        return dict(zip(COLUMNAS_ESTADISTICAS, self.valores()))
+
+
+class EstadisticasReporte:
+    """Estadísticas de un rango: el total y una fila por día, por servicio y por prueba."""
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str):
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.total = FilaEstadistica(DIMENSION_TOTAL, None, 0, 0, 0, 0, None, None, None)
+        self.por_dia: List[FilaEstadistica] = []
+        self.por_servicio: List[FilaEstadistica] = []
+        self.por_prueba: List[FilaEstadistica] = []
+
+    def agregar(self, fila: FilaEstadistica) -> None:
+        if fila.dimension == DIMENSION_TOTAL:
+            self.total = fila
+        elif fila.dimension == DIMENSION_DIA:
+            self.por_dia.append(fila)
+        elif fila.dimension == DIMENSION_SERVICIO:
+            self.por_servicio.append(fila)
+        else:
+            self.por_prueba.append(fila)
+
+    def filas(self) -> Iterator[FilaEstadistica]:
+        """Todas las filas: el total, los días, los servicios y las pruebas."""
+        yield self.total
+        yield from self.por_dia
+        yield from self.por_servicio
+        yield from self.por_prueba
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "desde": self.fecha_inicio,
+            "hasta": self.fecha_fin,
+            "total": self.total.como_dict(),
+            "por_dia": [fila.como_dict() for fila in self.por_dia],
+            "por_servicio": [fila.como_dict() for fila in self.por_servicio],
+            "por_prueba": [fila.como_dict() for fila in self.por_prueba],
+        }
+
+
+def generar_estadisticas(conn: psycopg2.extensions.connection, fecha_inicio: str, fecha_fin: str,
+                         medicion: Optional[metricas.MedicionReporte] = None) -> EstadisticasReporte:
+    """Ejecuta QUERY_ESTADISTICAS para el rango; los errores de la consulta se propagan.
+
+    Una cancelación del lado del servidor (conn.cancel()) termina en ReporteCancelado.
+    """
+    estadisticas = EstadisticasReporte(fecha_inicio, fecha_fin)
+    try:
+        with conn.cursor() as cursor:
+            with metricas.medir(medicion, "consulta"):
+                cursor.execute(QUERY_ESTADISTICAS, (fecha_inicio, fecha_fin))
+                filas = cursor.fetchall()
+    except psycopg2.extensions.QueryCanceledError as e:
+        raise connection.ReporteCancelado("Cálculo de estadísticas cancelado") from e
+    for fila in filas:
+        estadisticas.agregar(FilaEstadistica(*fila))
+    orden = {str(id_prueba): posicion for posicion, id_prueba in enumerate(NOMBRES_PRUEBA)}
+    estadisticas.por_prueba.sort(key=lambda fila: orden.get(fila.clave, len(orden)))
+    if medicion is not None:
+        medicion.contar("filas", len(filas))
+        medicion.contar("boletas", estadisticas.total.boletas)
+    return estadisticas
+
+
+def _texto_csv(valor: Any) -> str:
+    """Texto entre comillas, números con un decimal y #NULL# para los vacíos, como el reporte."""
+    if valor is None:
+        return "#NULL#"
+    if isinstance(valor, str):
+        return '"' + valor.replace('"', '""') + '"'
+    if isinstance(valor, float):
+        return f"{valor:.1f}"
+    return str(valor)
+
+
+def _lineas_estadisticas(estadisticas: EstadisticasReporte) -> Iterator[str]:
+    yield ",".join(f'"{columna}"' for columna in COLUMNAS_ESTADISTICAS) + "\n"
+    for fila in estadisticas.filas():
+        yield ",".join(_texto_csv(valor) for valor in fila.valores()) + "\n"
+
+
+def write_estadisticas_csv(estadisticas: EstadisticasReporte, filename: str) -> None:
+    """Escribe todas las filas de las estadísticas en un CSV (ver connection.escribir_atomico)."""
+    connection.escribir_atomico(filename, _lineas_estadisticas(estadisticas))
+
+
+def _horas(valor: Optional[float]) -> str:
+    return "-" if valor is None else f"{valor:.1f}"
+
+
+def formatear(estadisticas: EstadisticasReporte) -> str:
+    """Tablas de texto con el total y cada dimensión."""
+    total = estadisticas.total
+    lineas = [
+        f"Estadísticas del {estadisticas.fecha_inicio} al {estadisticas.fecha_fin}: "
+        f"{total.boletas} boletas, {total.aceptadas} aceptadas, {total.rechazadas} rechazadas "
+        f"({_horas(total.porcentaje_rechazo)}%); respuesta en horas: promedio "
+        f"{_horas(total.horas_promedio)}, mediana {_horas(total.horas_mediana)}, "
+        f"p90 {_horas(total.horas_p90)}"
+    ]
+    for titulo, filas in (("Día", estadisticas.por_dia), ("Servicio", estadisticas.por_servicio),
+                          ("Prueba", estadisticas.por_prueba)):
+        lineas.append("")
+        lineas.append(f"{titulo:<14} {'boletas':>8} {'rechaz.':>8} {'%':>6} {'c/res.':>8} "
+                      f"{'h prom':>8} {'h med':>8} {'h p90':>8}")
+        for fila in filas:
+            rechazadas = "-" if fila.rechazadas is None else str(fila.rechazadas)
+            lineas.append(
+                f"{fila.etiqueta:<14} {fila.boletas:>8} {rechazadas:>8} "
+                f"{_horas(fila.porcentaje_rechazo):>6} {fila.con_resultado:>8} "
+                f"{_horas(fila.horas_promedio):>8} {_horas(fila.horas_mediana):>8} "
+                f"{_horas(fila.horas_p90):>8}"
+            )
+    return "\n".join(lineas)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Calcula en el servidor el volumen, el rechazo y el tiempo de respuesta del reporte."
+    )
+    parser.add_argument("--desde", required=True, type=fecha_argumento, help="fecha de recepción inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", required=True, type=fecha_argumento, help="fecha de recepción final (AAAA-MM-DD)")
+    parser.add_argument("--salida", help="escribe también las estadísticas en este CSV")
+    parser.add_argument("--json", action="store_true", help="imprime las estadísticas como JSON")
+    args = parser.parse_args(argv)
+    if args.desde > args.hasta:
+        parser.error("--desde no puede ser posterior a --hasta")
+
+    medicion = metricas.nueva_medicion("estadisticas", desde=args.desde, hasta=args.hasta)
+    with redirect_stdout(sys.stderr):
+        try:
+            with metricas.medir(medicion, "conexion"):
+                conn = connection.connect_to_db()
+            if conn is None:
+                print("Error: No se pudo conectar a la base de datos")
+                return SALIDA_ERROR
+            try:
+                estadisticas = generar_estadisticas(conn, args.desde, args.hasta, medicion)
+            finally:
+                conn.close()
+            if args.salida:
+                with metricas.medir(medicion, "csv"):
+                    write_estadisticas_csv(estadisticas, args.salida)
+        except Exception as e:
+            if medicion is not None:
+                medicion.datos["error"] = f"{type(e).__name__}: {e}"
+            print(f"Error: {type(e).__name__}: {e}")
+            return SALIDA_ERROR
+        finally:
+            metricas.registrar(medicion)
+
+    if args.json:
+        print(json.dumps(estadisticas.como_dict(), ensure_ascii=False))
+    else:
+        print(formatear(estadisticas))
+    if not estadisticas.total.boletas:
+        print("Advertencia: No hay boletas en el rango de fechas", file=sys.stderr)
+        return SALIDA_ADVERTENCIAS
+    return SALIDA_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""Exportación del reporte sin interfaz gráfica, pensada para ejecuciones programadas (cron).
+
+Uso:
+    python exportar.py --desde 2024-01-01 --hasta 2024-01-31 [--salida archivo.csv] [--json]
+                       [--particion-dias 7 --conexiones 4] [--cache]
+                       [--delta [--estado archivo.sqlite]] [--origenes [NOMBRE ...]]
+                       [--parquet archivo.parquet]
+    python exportar.py --desde 2024-01-01 --hasta 2024-01-31 --invalidar-cache [--json]
+
+Con --delta solo se escriben las boletas cuyos resultados cambiaron desde la exportación
+incremental anterior (según la marca de agua) o cuyo Update se editó en la aplicación.
+Las ediciones de Update se anotan en el diario local del equipo donde se hicieron: las
+hechas en otro equipo o fuera de la aplicación no se detectan. Para recogerlas hay que
+volver a exportar el rango completo sin --delta.
+
+Con --origenes el reporte se consulta a la vez en los servidores de las secciones
+[labsis:<nombre>] de labsis.ini (todos, o solo los nombrados) y se escribe un solo CSV.
+Un servidor que falla o agota su tiempo queda como advertencia.
+
+Con --parquet las mismas boletas se escriben además en un archivo Parquet con tipos,
+para archivo y auditoría (ver archivo_parquet.py; requiere pyarrow).
+
+Con --invalidar-cache no se exporta nada: se descartan de la caché local los días del
+rango, para que la próxima exportación con --cache (o la vista previa) los vuelva a
+consultar, por ejemplo tras una corrección hecha directamente en labsis.
+
+No importa PyQt6. Las advertencias (boletas anormales corregidas, rango sin boletas)
+se devuelven en el resumen y en el código de salida:
+
+    0  exportado sin advertencias
+    1  error de conexión, de consulta o de escritura
+    2  argumentos inválidos
+    3  exportado con advertencias
+"""
+import argparse
+import json
+import sys
+from contextlib import redirect_stdout
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import connection
+import delta
+import metricas
+from cli_comun import SALIDA_ADVERTENCIAS, SALIDA_ERROR, SALIDA_OK, fecha_argumento
+
+
+def _argumentos(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Genera el CSV de resultados de tamizaje para un rango de fechas de recepción."
+    )
+    parser.add_argument("--desde", required=True, type=fecha_argumento, help="fecha de recepción inicial (AAAA-MM-DD)")
+    parser.add_argument("--hasta", required=True, type=fecha_argumento, help="fecha de recepción final (AAAA-MM-DD)")
+    parser.add_argument("--salida", help="archivo CSV (por defecto reporte_labsis_<desde>_a_<hasta>.csv)")
+    parser.add_argument("--modo", choices=(connection.MODO_SQL, connection.MODO_PYTHON, connection.MODO_COLUMNAR),
+                        default=connection.MODO_SQL,
+                        help="forma de agregar las boletas (columnar requiere NumPy)")
+    parser.add_argument("--particion-dias", type=int, metavar="DIAS",
+                        help="consulta el rango en particiones de DIAS días en paralelo (solo modo sql)")
+    parser.add_argument("--conexiones", type=int, default=4,
+                        help="conexiones simultáneas al consultar por particiones (por defecto 4)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reutiliza los días guardados en la caché local (solo modo sql)")
+    parser.add_argument("--delta", action="store_true",
+                        help="exporta solo las boletas que cambiaron desde la exportación incremental anterior; "
+                             "los cambios de Update solo se detectan si se hicieron con la aplicación en este equipo")
+    parser.add_argument("--estado", help="archivo con la marca de agua de --delta (por defecto en el directorio local)")
+    parser.add_argument("--origenes", nargs="*", metavar="NOMBRE",
+                        help="consulta los servidores [labsis:NOMBRE] de labsis.ini (sin nombres, todos)")
+    parser.add_argument("--parquet", metavar="ARCHIVO",
+                        help="escribe además las boletas en un archivo Parquet (requiere pyarrow)")
+    parser.add_argument("--invalidar-cache", action="store_true",
+                        help="descarta de la caché local los días del rango en lugar de exportar")
+    parser.add_argument("--json", action="store_true", help="imprime el resumen como JSON en stdout")
+    args = parser.parse_args(argv)
+    if args.desde > args.hasta:
+        parser.error("--desde no puede ser posterior a --hasta")
+    if args.particion_dias is not None:
+        if args.particion_dias < 1 or args.conexiones < 1:
+            parser.error("--particion-dias y --conexiones deben ser al menos 1")
+        if args.modo != connection.MODO_SQL:
+            parser.error("--particion-dias solo está disponible en modo sql")
+    if args.cache and args.modo != connection.MODO_SQL:
+        parser.error("--cache solo está disponible en modo sql")
+    if args.delta and (args.cache or args.particion_dias is not None or args.modo != connection.MODO_SQL):
+        parser.error("--delta no se combina con --cache, --particion-dias ni --modo python/columnar")
+    if args.estado and not args.delta:
+        parser.error("--estado solo se usa con --delta")
+    if args.parquet and args.delta:
+        parser.error("--parquet no se combina con --delta")
+    if args.invalidar_cache and (args.salida or args.particion_dias is not None or args.cache or args.delta
+                                 or args.origenes is not None or args.parquet):
+        parser.error("--invalidar-cache solo se combina con --desde, --hasta y --json")
+    if args.origenes is not None:
+        if args.delta or args.cache or args.particion_dias is not None:
+            parser.error("--origenes no se combina con --delta, --cache ni --particion-dias")
+        configurados = connection.cargar_origenes()
+        if not configurados:
+            parser.error("labsis.ini no tiene secciones [labsis:<nombre>] para --origenes")
+        desconocidos = [nombre for nombre in args.origenes if nombre not in configurados]
+        if desconocidos:
+            parser.error(f"servidores no configurados en labsis.ini: {', '.join(desconocidos)}")
+        args.origenes = {nombre: config for nombre, config in configurados.items()
+                         if not args.origenes or nombre in args.origenes}
+    return args
+
+
+def exportar(fecha_inicio: str, fecha_fin: str, archivo: str,
+             modo: str = connection.MODO_SQL, particion_dias: Optional[int] = None,
+             conexiones: int = 4, usar_cache: bool = False,
+             origenes: Optional[Dict[str, Dict[str, str]]] = None,
+             archivo_parquet: Optional[str] = None) -> Dict[str, Any]:
+    """Genera y escribe el reporte; devuelve un resumen con las advertencias o el error.
+
+    Con particion_dias el rango se consulta en paralelo con generate_report_particionado;
+    con usar_cache los días se toman de la caché local con generate_report_cacheado;
+    con origenes se consultan varios servidores con generate_report_multiorigen y el
+    resumen trae las boletas, los segundos y el error de cada uno. Con archivo_parquet
+    las boletas se escriben también en ese archivo después del CSV; los resultados
+    numéricos que no son números se advierten (ver archivo_parquet.py).
+    Los tiempos de cada etapa se agregan al registro de métricas local (ver metricas.py).
+    """
+    resumen: Dict[str, Any] = {
+        "desde": fecha_inicio,
+        "hasta": fecha_fin,
+        "archivo": archivo,
+        "parquet": archivo_parquet,
+        "boletas": 0,
+        "aceptadas": 0,
+        "advertencias": [],
+        "error": None,
+    }
+    anormales: List[str] = []
+    con_texto: List[str] = []
+    medicion = metricas.nueva_medicion(
+        "exportar", desde=fecha_inicio, hasta=fecha_fin, modo=modo,
+        particion_dias=particion_dias, cache=usar_cache,
+        origenes=list(origenes) if origenes else None
+    )
+
+    # Los mensajes que connection.py imprime van a stderr para no mezclarse con el resumen
+    with redirect_stdout(sys.stderr):
+        try:
+            # Sin pyarrow falla antes de consultar
+            escribir_parquet = _escritor_parquet() if archivo_parquet else None
+            if origenes:
+                boletas = _generar_multiorigen(fecha_inicio, fecha_fin, modo, origenes,
+                                               anormales, resumen, medicion)
+            elif usar_cache:
+                boletas = _generar_cacheado(fecha_inicio, fecha_fin, conexiones, anormales, medicion)
+            elif particion_dias:
+                boletas = _generar_particionado(fecha_inicio, fecha_fin, particion_dias,
+                                                conexiones, anormales, medicion)
+            else:
+                boletas = _generar(fecha_inicio, fecha_fin, modo, anormales, medicion)
+            if boletas is None:
+                resumen["error"] = resumen.get("error") or "No se pudo conectar a la base de datos"
+                return resumen
+            connection.write_to_csv(boletas, archivo, propagar_errores=True, medicion=medicion)
+            if escribir_parquet is not None:
+                escribir_parquet(boletas, archivo_parquet, medicion=medicion,
+                                 al_guardar_texto=con_texto.extend)
+        except Exception as e:
+            resumen["error"] = f"{type(e).__name__}: {e}"
+            return resumen
+        finally:
+            if medicion is not None:
+                medicion.datos["error"] = resumen["error"]
+            metricas.registrar(medicion)
+
+    resumen["boletas"] = len(boletas)
+    resumen["aceptadas"] = sum(1 for b in boletas.values() if b.StdoBoleta == "A")
+    for nombre, origen in resumen.get("origenes", {}).items():
+        if origen["error"]:
+            resumen["advertencias"].append({
+                "tipo": "origen_fallido",
+                "mensaje": f"No se incluyó el servidor {nombre}: {origen['error']}",
+                "origen": nombre,
+            })
+    if not boletas:
+        resumen["advertencias"].append({
+            "tipo": "sin_boletas",
+            "mensaje": "No hay boletas en el rango de fechas",
+        })
+    if anormales:
+        resumen["advertencias"].append({
+            "tipo": "boletas_anormales",
+            "mensaje": connection.mensaje_boletas_anormales(anormales),
+            "boletas": anormales,
+        })
+    if con_texto:
+        resumen["advertencias"].append({
+            "tipo": "resultados_texto",
+            "mensaje": f"{len(con_texto)} boletas tienen resultados numéricos que no son números; "
+                       "en el archivo Parquet quedan nulos y su texto se guarda en ResultadosTexto",
+            "boletas": con_texto,
+        })
+    return resumen
+
+
+def exportar_delta(fecha_inicio: str, fecha_fin: str, archivo: str,
+                   ruta_estado: Optional[str] = None) -> Dict[str, Any]:
+    """Exporta las boletas cambiadas desde la marca de agua y la avanza si el CSV se escribió."""
+    resumen: Dict[str, Any] = {
+        "desde": fecha_inicio,
+        "hasta": fecha_fin,
+        "archivo": archivo,
+        "boletas": 0,
+        "aceptadas": 0,
+        "marca_agua_anterior": None,
+        "marca_agua": None,
+        "advertencias": [],
+        "error": None,
+    }
+    anormales: List[str] = []
+
+    with redirect_stdout(sys.stderr):
+        try:
+            ruta_estado = ruta_estado or delta.ruta_por_defecto(connection.cargar_configuracion())
+            with delta.EstadoDelta(ruta_estado) as estado:
+                marca = estado.marca_agua()
+                editadas, ultimo_id = estado.updates_pendientes()
+                conn = connection.connect_to_db()
+                if conn is None:
+                    resumen["error"] = "No se pudo conectar a la base de datos"
+                    return resumen
+                cambiadas: List[str] = []
+                try:
+                    boletas, nueva_marca = connection.generate_report_delta(
+                        conn, fecha_inicio, fecha_fin, marca, editadas,
+                        al_detectar_anomalias=anormales.extend, propagar_errores=True,
+                        al_detectar_cambios=cambiadas.extend,
+                    )
+                finally:
+                    conn.close()
+                if cambiadas:
+                    connection.invalidar_cache_boletas(cambiadas)
+                connection.write_to_csv(boletas, archivo, propagar_errores=True)
+                estado.confirmar(nueva_marca, ultimo_id, boletas)
+        except Exception as e:
+            resumen["error"] = f"{type(e).__name__}: {e}"
+            return resumen
+
+    resumen["boletas"] = len(boletas)
+    resumen["aceptadas"] = sum(1 for b in boletas.values() if b.StdoBoleta == "A")
+    resumen["marca_agua_anterior"] = marca.isoformat() if marca else None
+    resumen["marca_agua"] = nueva_marca.isoformat() if nueva_marca else None
+    if anormales:
+        resumen["advertencias"].append({
+            "tipo": "boletas_anormales",
+            "mensaje": connection.mensaje_boletas_anormales(anormales),
+            "boletas": anormales,
+        })
+    return resumen
+
+
+def _escritor_parquet() -> Callable[..., None]:
+    """write_to_parquet; pyarrow se importa solo si se pidió el archivo Parquet."""
+    try:
+        from archivo_parquet import write_to_parquet
+    except ImportError as e:
+        raise ImportError(f"--parquet requiere pyarrow: {e}") from e
+    return write_to_parquet
+
+
+def _generar(fecha_inicio: str, fecha_fin: str, modo: str, anormales: List[str],
+             medicion: Optional[metricas.MedicionReporte] = None
+             ) -> Optional[Dict[str, connection.Boleta]]:
+    """Reporte con una sola consulta; None si no hay conexión."""
+    with metricas.medir(medicion, "conexion"):
+        conn = connection.connect_to_db()
+    if conn is None:
+        return None
+    try:
+        return connection.generate_report(
+            conn, fecha_inicio, fecha_fin, modo=modo,
+            itersize=connection.ITERSIZE_REPORTE,
+            al_detectar_anomalias=anormales.extend,
+            propagar_errores=True,
+            medicion=medicion,
+        )
+    finally:
+        conn.close()
+
+
+def _generar_multiorigen(fecha_inicio: str, fecha_fin: str, modo: str,
+                         origenes: Dict[str, Dict[str, str]], anormales: List[str],
+                         resumen: Dict[str, Any],
+                         medicion: Optional[metricas.MedicionReporte] = None
+                         ) -> Optional[Dict[str, connection.Boleta]]:
+    """Reporte fusionado de varios servidores; None si ninguno respondió."""
+    reporte = connection.generate_report_multiorigen(
+        fecha_inicio, fecha_fin, origenes, modo=modo,
+        al_detectar_anomalias=anormales.extend, medicion=medicion,
+    )
+    repetidas = {}
+    for clave, servidores in reporte.origenes.items():
+        if len(servidores) > 1:
+            for nombre in servidores:
+                repetidas[nombre] = repetidas.get(nombre, 0) + 1
+    resumen["origenes"] = {
+        nombre: {
+            "host": config["host"],
+            "boletas": reporte.conteos.get(nombre, 0),
+            "compartidas": repetidas.get(nombre, 0),
+            "segundos": round(reporte.segundos[nombre], 3) if nombre in reporte.segundos else None,
+            "error": reporte.errores.get(nombre),
+        }
+        for nombre, config in origenes.items()
+    }
+    if len(reporte.errores) == len(origenes):
+        resumen["error"] = "; ".join(f"{nombre}: {error}" for nombre, error in reporte.errores.items())
+        return None
+    return reporte.boletas
+
+
+def _generar_particionado(fecha_inicio: str, fecha_fin: str, particion_dias: int,
+                          conexiones: int, anormales: List[str],
+                          medicion: Optional[metricas.MedicionReporte] = None
+                          ) -> Dict[str, connection.Boleta]:
+    """Reporte consultado por particiones con un pool propio de conexiones."""
+    pool = connection.PoolConexiones(maxconn=conexiones)
+    try:
+        return connection.generate_report_particionado(
+            fecha_inicio, fecha_fin, dias_por_particion=particion_dias, pool=pool,
+            al_detectar_anomalias=anormales.extend, propagar_errores=True,
+            medicion=medicion,
+        )
+    finally:
+        pool.cerrar()
+
+
+def _generar_cacheado(fecha_inicio: str, fecha_fin: str, conexiones: int,
+                      anormales: List[str],
+                      medicion: Optional[metricas.MedicionReporte] = None
+                      ) -> Dict[str, connection.Boleta]:
+    """Reporte por días usando la caché local; sin caché disponible consulta todo el rango."""
+    pool = connection.PoolConexiones(maxconn=conexiones)
+    try:
+        cache = connection.abrir_cache(pool.config)
+        if cache is None:
+            return connection.generate_report_particionado(
+                fecha_inicio, fecha_fin, pool=pool,
+                al_detectar_anomalias=anormales.extend, propagar_errores=True,
+                medicion=medicion,
+            )
+        with cache:
+            return connection.generate_report_cacheado(
+                fecha_inicio, fecha_fin, cache, pool=pool,
+                al_detectar_anomalias=anormales.extend, propagar_errores=True,
+                medicion=medicion,
+            )
+    finally:
+        pool.cerrar()
+
+
+def invalidar_cache(fecha_inicio: str, fecha_fin: str) -> Dict[str, Any]:
+    """Descarta de la caché local los días del rango; el resumen trae cuántos."""
+    resumen: Dict[str, Any] = {
+        "desde": fecha_inicio,
+        "hasta": fecha_fin,
+        "dias_descartados": 0,
+        "advertencias": [],
+        "error": None,
+    }
+    with redirect_stdout(sys.stderr):
+        cache = connection.abrir_cache()
+    if cache is None:
+        resumen["error"] = "La caché local está deshabilitada (LABSIS_CACHE=off) o no se pudo abrir"
+        return resumen
+    try:
+        with cache:
+            resumen["dias_descartados"] = cache.invalidar(
+                date.fromisoformat(fecha_inicio), date.fromisoformat(fecha_fin)
+            )
+    except Exception as e:
+        resumen["error"] = f"{type(e).__name__}: {e}"
+    return resumen
+
+
+def codigo_salida(resumen: Dict[str, Any]) -> int:
+    """Código de salida del proceso según el resumen de exportar()."""
+    if resumen["error"]:
+        return SALIDA_ERROR
+    if resumen["advertencias"]:
+        return SALIDA_ADVERTENCIAS
+    return SALIDA_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _argumentos(argv)
+    if args.invalidar_cache:
+        resumen = invalidar_cache(args.desde, args.hasta)
+    elif args.delta:
+        archivo = args.salida or f"reporte_labsis_cambios_{datetime.now():%Y%m%d_%H%M%S}.csv"
+        resumen = exportar_delta(args.desde, args.hasta, archivo, args.estado)
+    else:
+        archivo = args.salida or f"reporte_labsis_{args.desde}_a_{args.hasta}.csv"
+        resumen = exportar(args.desde, args.hasta, archivo, args.modo,
+                           args.particion_dias, args.conexiones, args.cache, args.origenes,
+                           args.parquet)
+
+    if args.json:
+        print(json.dumps(resumen, ensure_ascii=False))
+    elif resumen["error"]:
+        print(f"Error: {resumen['error']}", file=sys.stderr)
+    elif args.invalidar_cache:
+        print(f"{resumen['dias_descartados']} días descartados de la caché local")
+    else:
+        print(f"{resumen['boletas']} boletas ({resumen['aceptadas']} aceptadas) escritas en {archivo}")
+        for advertencia in resumen["advertencias"]:
+            print(f"Advertencia: {advertencia['mensaje']}", file=sys.stderr)
+    return codigo_salida(resumen)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
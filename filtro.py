@@ -0,0 +1,90 @@
+"""Índices en memoria para buscar y filtrar boletas en la vista previa.
+
+Cada campo buscable se guarda como una lista ordenada de claves normalizadas
+(mayúsculas, sin tildes) con el número de boleta de cada una, así que encontrar
+las boletas cuyo campo empieza por un texto son dos búsquedas binarias. El
+estado se indexa con un conjunto por valor.
+"""
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from connection import Boleta
+
+# Campos en los que se busca cada palabra del filtro; del paciente se indexa cada palabra del nombre
+CAMPOS_BUSCABLES = ("Boleta", "Expediente", "codigoE", "Paciente")
+
+# Mayor carácter posible: una clave que empieza por p queda entre p y p + _FIN
+_FIN = "\U0010ffff"
+
+
+def normalizar(texto: str) -> str:
+    """Mayúsculas y sin tildes, para que "pena" encuentre "Peña"."""
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).upper()
+
+
+class _IndicePrefijo:
+    """Claves ordenadas con el número de boleta de cada una."""
+
+    def __init__(self, pares: List[Tuple[str, str]]):
+        pares.sort()
+        self.claves = [clave for clave, _ in pares]
+        self.numeros = [numero for _, numero in pares]
+
+    def buscar(self, prefijo: str) -> List[str]:
+        desde = bisect_left(self.claves, prefijo)
+        hasta = bisect_left(self.claves, prefijo + _FIN, desde)
+        return self.numeros[desde:hasta]
+
+
+class IndiceBoletas:
+    """Búsqueda por prefijo de Boleta, Expediente, codigoE y palabras del Paciente, y filtro por StdoBoleta."""
+
+    def __init__(self, boletas: Iterable[Boleta] = ()):
+        self.construir(boletas)
+
+    def construir(self, boletas: Iterable[Boleta]) -> None:
+        """Reconstruye los índices con las boletas dadas."""
+        pares: Dict[str, List[Tuple[str, str]]] = {campo: [] for campo in CAMPOS_BUSCABLES}
+        self.estados: Dict[str, Set[str]] = {}
+        self.total = 0
+        for boleta in boletas:
+            numero = boleta.Boleta
+            self.total += 1
+            for campo in ("Boleta", "Expediente", "codigoE"):
+                valor = getattr(boleta, campo)
+                if valor is not None:
+                    pares[campo].append((normalizar(str(valor)), numero))
+            for palabra in normalizar(boleta.Paciente or "").split():
+                pares["Paciente"].append((palabra, numero))
+            self.estados.setdefault(boleta.StdoBoleta, set()).add(numero)
+        self._indices = {campo: _IndicePrefijo(lista) for campo, lista in pares.items()}
+
+    def buscar_palabra(self, palabra: str) -> Set[str]:
+        """Boletas con algún campo buscable que empieza por la palabra."""
+        prefijo = normalizar(palabra)
+        encontradas: Set[str] = set()
+        for indice in self._indices.values():
+            encontradas.update(indice.buscar(prefijo))
+        return encontradas
+
+    def filtrar(self, texto: str = "", estado: Optional[str] = None) -> Optional[Set[str]]:
+        """Números de boleta que cumplen todas las palabras del texto y el estado.
+
+        Devuelve None cuando no hay filtro, para que quien llama muestre todo sin
+        armar un conjunto con todas las boletas.
+        """
+        palabras = texto.split()
+        if not palabras and estado is None:
+            return None
+        resultado: Optional[Set[str]] = None
+        if estado is not None:
+            resultado = set(self.estados.get(estado, ()))
+        # Las palabras más largas suelen dar menos boletas; se empieza por ellas
+        for palabra in sorted(palabras, key=len, reverse=True):
+            encontradas = self.buscar_palabra(palabra)
+            resultado = encontradas if resultado is None else resultado & encontradas
+            if not resultado:
+                break
+        return resultado
@@ -1,13 +1,28 @@
 """
 Interfaz que generará un reporte a partir de una conexión de PostgreSQL 
 para posteriormente formatearlo y generar un CSV en el formato deseado.
+
+Para abrir rápido solo se importa PyQt6 y el formulario de fechas; la vista previa,
+psycopg2 y el reporte se importan al abrir la vista previa o las estadísticas (ver
+vista_previa.py y vista_estadisticas.py).
+Los formularios se compilan de antemano con compilar_ui.py.
 """
+import time
+INICIO = time.perf_counter()  # Inicio de main.py, para --medir-arranque
+
 import os
 import sys
-from typing import Dict, Any, Optional
-from PyQt6 import uic, QtWidgets, QtCore, QtGui
+from typing import TYPE_CHECKING, Dict, Optional
+from PyQt6 import QtWidgets, QtCore, QtGui
 from PyQt6.QtWidgets import QMessageBox
-import connection
+from ui_fechas import Ui_Dialog as Ui_Fechas
+
+if TYPE_CHECKING:
+    import connection
+    import metricas
+    from vista_previa import ExportacionWorker
+
+IMPORTACION = time.perf_counter()
 
 
 def resource_path(relative_path: str) -> str:
@@ -19,20 +34,20 @@ def resource_path(relative_path: str) -> str:
     return os.path.join(base_path, relative_path)
 
 
-class Main(QtWidgets.QDialog):
+class Main(QtWidgets.QDialog, Ui_Fechas):
     """Diálogo principal para selección de rango de fechas."""
     
     def __init__(self):
         super().__init__()
+        # Exportaciones de CSV en curso y su avance: boletas escritas y total
+        self.exportaciones: Dict["ExportacionWorker", tuple] = {}
         self._setup_ui()
         self._connect_signals()
         self.open_preview = None
         
     def _setup_ui(self):
         """Configura la interfaz de usuario."""
-        ui_path = resource_path("fechas.ui")
-        uic.loadUi(ui_path, self)
-        self.setWindowIcon(QtGui.QIcon(resource_path("icon.ico")))
+        self.setupUi(self)
         self.setWindowTitle("Seleccionar Rango de Fechas")
 
         
@@ -44,11 +59,13 @@ class Main(QtWidgets.QDialog):
         # Validaciones de fecha
         self.deFechaIni.setMaximumDate(current_date)
         self.deFechaFin.setMaximumDate(current_date)
+        self.pbExportacion.setVisible(False)
     
     def _connect_signals(self):
         """Conecta las señales con sus respectivos slots."""
         self.accepted.connect(self.on_accept)
         self.rejected.connect(self.on_reject)
+        self.btnEstadisticas.clicked.connect(self.abrir_estadisticas)
         
         # Validación automática de rango de fechas
         self.deFechaIni.dateChanged.connect(self._validate_date_range)
@@ -68,229 +85,125 @@ class Main(QtWidgets.QDialog):
         self.hide()
         
         try:
+            from vista_previa import OpenPreviewResults
             self.open_preview = OpenPreviewResults(fecha_inicio, fecha_fin, self)
             # Conectar el evento de cierre para manejar correctamente la aplicación
             self.open_preview.finished.connect(self._handle_preview_finished)
+            self.open_preview.exportacion_solicitada.connect(self.exportar_csv)
             self.open_preview.exec()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error al abrir vista previa: {str(e)}")
             self.show()
     
+    def abrir_estadisticas(self):
+        """Abre las estadísticas del rango, calculadas en el servidor sin cargar las boletas."""
+        fecha_inicio = self.deFechaIni.date().toString("yyyy-MM-dd")
+        fecha_fin = self.deFechaFin.date().toString("yyyy-MM-dd")
+        try:
+            from vista_estadisticas import VistaEstadisticas
+            VistaEstadisticas(fecha_inicio, fecha_fin, self).exec()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Error al abrir las estadísticas: {str(e)}")
+
     def _handle_preview_finished(self, result):
-        """Maneja el cierre de la ventana de vista previa."""
-        if result == QtWidgets.QDialog.DialogCode.Accepted:
-            # Si se exportó el archivo, cerrar aplicación completamente
-            QtWidgets.QApplication.quit()
+        """Maneja el cierre de la ventana de vista previa.
+
+        Al exportar se vuelve a la ventana principal mientras el CSV se escribe, para
+        poder elegir otro rango; el resultado de la exportación se avisa al terminar.
+        """
+        self.show()
+
+    def exportar_csv(self, boletas: Dict[str, "connection.Boleta"], ruta: str,
+                     medicion: Optional["metricas.MedicionReporte"]):
+        """Escribe el CSV en segundo plano mostrando el avance en esta ventana."""
+        from vista_previa import ExportacionWorker
+        exportacion = ExportacionWorker(boletas, ruta, medicion, self)
+        exportacion.progreso.connect(
+            lambda escritas, total, e=exportacion: self._on_progreso_exportacion(e, escritas, total)
+        )
+        exportacion.terminado.connect(
+            lambda ruta, e=exportacion: self._on_exportacion_terminada(e, ruta, None)
+        )
+        exportacion.fallo.connect(
+            lambda ruta, mensaje, e=exportacion: self._on_exportacion_terminada(e, ruta, mensaje)
+        )
+        self.exportaciones[exportacion] = (0, len(boletas))
+        self._mostrar_exportaciones()
+        exportacion.start()
+
+    def _on_progreso_exportacion(self, exportacion: "ExportacionWorker", escritas: int, total: int):
+        if exportacion in self.exportaciones:
+            self.exportaciones[exportacion] = (escritas, total)
+            self._mostrar_exportaciones()
+
+    def _on_exportacion_terminada(self, exportacion: "ExportacionWorker", ruta: str, error: Optional[str]):
+        """Informa el resultado de una exportación."""
+        exportacion.wait()
+        self.exportaciones.pop(exportacion, None)
+        self._mostrar_exportaciones()
+        padre = QtWidgets.QApplication.activeWindow() or self
+        if error is None:
+            QMessageBox.information(
+                padre, "Exportación exitosa", f"El reporte se ha exportado correctamente a:\n{ruta}"
+            )
         else:
-            # Si se canceló, mostrar ventana principal de nuevo
-            self.show()
+            QMessageBox.critical(
+                padre, "Error de exportación", f"Error al exportar {ruta}: {error}"
+            )
+
+    def _mostrar_exportaciones(self):
+        """Avance conjunto de las exportaciones en curso; la barra se oculta si no hay ninguna."""
+        self.pbExportacion.setVisible(bool(self.exportaciones))
+        if not self.exportaciones:
+            return
+        escritas = sum(e for e, _ in self.exportaciones.values())
+        total = sum(t for _, t in self.exportaciones.values())
+        self.pbExportacion.setMaximum(max(total, 1))
+        self.pbExportacion.setValue(escritas)
+        cantidad = len(self.exportaciones)
+        self.pbExportacion.setFormat(
+            f"Exportando {cantidad} archivo{'s' if cantidad > 1 else ''}: %p%"
+        )
+
+    def esperar_exportaciones(self):
+        """Espera a que terminen de escribirse los CSV antes de cerrar la aplicación."""
+        if not self.exportaciones:
+            return
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.CursorShape.WaitCursor)
+        try:
+            for exportacion in list(self.exportaciones):
+                exportacion.wait()
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
     
     def on_reject(self):
         """Maneja el rechazo del diálogo cerrando la aplicación."""
+        self.esperar_exportaciones()
         QtWidgets.QApplication.quit()
     
     def closeEvent(self, event):
         """Maneja el evento de cierre de ventana."""
+        self.esperar_exportaciones()
         QtWidgets.QApplication.quit()
         event.accept()
 
 
-class OpenPreviewResults(QtWidgets.QDialog):
-    """Diálogo para mostrar vista previa de resultados y exportar CSV."""
-    
-    # Constantes de clase
-    RESULTADOS_ALIAS = {
-        852: "TSH", 859: "IRT", 854: "PKU", 883: "17OH",
-        886: "JarabeA1", 885: "JarabeA2", 888: "Tyr",
-        889: "HbF", 890: "HbA", 891: "HbS", 892: "HbC"
-    }
-    
-    COLUMNAS_NORMALES = [
-        "codigoE", "Boleta", "FechaTomaMx", "Paciente", "Edad", "Sexo", "Expediente",
-        "Recepcion", "Procesamiento", "FResultado", "FechaRechazo", "EstadoPaciente",
-        "StdoBoleta", "Update", "ReferidoPor", "Id"
-    ]
-    
-    def __init__(self, fecha_inicio: str, fecha_fin: str, parent: Optional[QtWidgets.QWidget] = None):
-        super().__init__(parent)
-        self.fecha_inicio = fecha_inicio
-        self.fecha_fin = fecha_fin
-        self.data: Dict[str, Any] = {}
-        
-        self._setup_ui()
-        self._connect_signals()
-        self._load_data()
-    
-    def _setup_ui(self):
-        """Configura la interfaz de usuario."""
-        uic.loadUi(resource_path("preview.ui"), self)
-        self.setWindowIcon(QtGui.QIcon(resource_path("icon.ico")))
+def registrar_arranque(primera_ventana: float) -> None:
+    """Con --medir-arranque: anota cuánto tardó en verse la primera ventana desde el inicio de main.py.
 
-        self.setWindowTitle(f"Vista Previa - {self.fecha_inicio} a {self.fecha_fin}")
-        
-        # Configurar tabla
-        columnas_tabla = self.COLUMNAS_NORMALES + list(self.RESULTADOS_ALIAS.values())
-        self.tblResults.setColumnCount(len(columnas_tabla))
-        self.tblResults.setHorizontalHeaderLabels(columnas_tabla)
-        self.tblResults.setAlternatingRowColors(True)
-        self.tblResults.setSortingEnabled(True)
-        self.tblResults.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
-        
-        # Inicialmente deshabilitar exportación hasta cargar datos
-        self.btnExport.setEnabled(False)
-    
-    def _connect_signals(self):
-        """Conecta las señales con sus respectivos slots."""
-        self.btnback.clicked.connect(self._on_back)
-        self.btnExport.clicked.connect(self._on_export)
-        self.tblResults.itemChanged.connect(self._on_update_changed)
-    
-    def _load_data(self):
-        """Carga los datos del reporte."""
-        try:
-            # Mostrar cursor de espera
-            QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.CursorShape.WaitCursor)
-            
-            self.data = self._generate_report()
-            if self.data:
-                self._populate_table()
-                self.btnExport.setEnabled(True)
-            else:
-                QMessageBox.information(self, "Sin datos", "No se encontraron datos para el rango seleccionado.")
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error al cargar datos: {str(e)}")
-        finally:
-            # Restaurar cursor normal
-            QtWidgets.QApplication.restoreOverrideCursor()
-    
-    def _generate_report(self) -> Dict[str, Any]:
-        """Genera el reporte conectándose a la base de datos."""
-        conn = connection.connect_to_db()
-        if conn is None:
-            raise ConnectionError("No se pudo conectar a la base de datos")
-        
-        return connection.generate_report(conn, self.fecha_inicio, self.fecha_fin)
-    
-    def _populate_table(self):
-        """Llena la tabla con los datos del reporte."""
-        if not self.data:
-            return
-
-        # Desconectar la señal para evitar disparos durante la carga
-        self.tblResults.itemChanged.disconnect(self._on_update_changed)
-
-        self.tblResults.setSortingEnabled(False)
-        self.tblResults.setRowCount(len(self.data))
-
-        for row_idx, boleta in enumerate(self.data.values()):
-            # Llenar columnas normales
-            for col_idx, col_name in enumerate(self.COLUMNAS_NORMALES):
-                value = boleta.get(col_name, "#NULL#")
-                item = QtWidgets.QTableWidgetItem(str(value))
-                if col_name != "Update":
-                    item.setFlags(item.flags() & ~QtCore.Qt.ItemFlag.ItemIsEditable)
-                self.tblResults.setItem(row_idx, col_idx, item)
-
-            # Llenar columnas de resultados usando aliases
-            for col_idx, (id_resultado, _) in enumerate(self.RESULTADOS_ALIAS.items(),
-                                                       start=len(self.COLUMNAS_NORMALES)):
-                value = boleta.get("Resultados", {}).get(id_resultado, "#NULL#")
-                value = connection.format_result_value(value)  # <-- Formatea a una sola decima
-                item = QtWidgets.QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~QtCore.Qt.ItemFlag.ItemIsEditable)
-                self.tblResults.setItem(row_idx, col_idx, item)
-
-        self.tblResults.setSortingEnabled(True)
-        self.tblResults.resizeColumnsToContents()
-
-        # Reconectar la señal después de poblar la tabla
-        self.tblResults.itemChanged.connect(self._on_update_changed)
-
-        self._show_statistics()
-    
-    def _show_statistics(self):
-        """Muestra estadísticas básicas en el título de la ventana."""
-        total = len(self.data)
-        con_resultados = sum(1 for b in self.data.values() if b.get("StdoBoleta") == "A")
-        self.setWindowTitle(
-            f"Vista Previa - {self.fecha_inicio} a {self.fecha_fin} "
-            f"(Total: {total}, Con resultados: {con_resultados})"
-        )
-    
-    def _on_back(self):
-        """Maneja el botón de regreso."""
-        self.reject()  # Esto cerrará el diálogo con código de rechazo
-    
-    def _on_export(self):
-        """Maneja la exportación de datos a CSV."""
-        if not self.data:
-            QMessageBox.warning(self, "Sin datos", "No hay datos para exportar.")
-            return
-        
-        try:
-            # Obtener nombre de archivo sugerido
-            filename = f"reporte_labsis_{self.fecha_inicio}_a_{self.fecha_fin}.csv"
-            
-            # Abrir diálogo para guardar archivo
-            filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
-                self,
-                "Guardar reporte CSV",
-                filename,
-                "Archivos CSV (*.csv);;Todos los archivos (*)"
-            )
-            
-            if filepath:
-                # Exportar usando la función del módulo connection
-                connection.write_to_csv(self.data, filepath)
-                QMessageBox.information(
-                    self, 
-                    "Exportación exitosa", 
-                    f"El reporte se ha exportado correctamente a:\n{filepath}"
-                )
-                # Cerrar con código de aceptación para indicar exportación exitosa
-                self.accept()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "Error de exportación", f"Error al exportar: {str(e)}")
-    
-    def _on_update_changed(self, item):
-        """Valida y actualiza el campo Update en la base de datos usando el número de Boleta."""
-        col_idx = item.column()
-        col_name = self.tblResults.horizontalHeaderItem(col_idx).text()
-        if col_name != "Update":
-            return  # Solo permitir edición en Update
-
-        new_value = item.text().strip().upper()  # Convertir a mayúscula
-        if new_value not in ("X", ""):
-            QMessageBox.warning(self, "Valor inválido", "Solo se permite 'X' o dejar en blanco.")
-            self._load_data()  # Recargar la tabla
-            return
-
-        row_idx = item.row()
-        num_ingreso = self.tblResults.item(row_idx, self.COLUMNAS_NORMALES.index("Boleta")).text()
-
-        try:
-            connection.update_boleta_update(num_ingreso, new_value)
-            # Guardar en el diccionario en mayúscula
-            self.data[num_ingreso]["Update"] = new_value if new_value else "#NULL#"
-            # Actualizar visualmente la celda en la tabla
-            item.setText(new_value)
-            # Si el valor es en blanco, recargar la tabla para mostrar #NULL#
-            if new_value == "":
-                self._load_data()
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"No se pudo actualizar: {str(e)}")
-            self._load_data()
-
-    def closeEvent(self, event):
-        """Maneja el evento de cierre de ventana."""
-        self.reject()
-        event.accept()
+    Se registra aunque las métricas no estén activadas: la opción ya es el pedido.
+    """
+    import metricas
+    medicion = metricas.MedicionReporte("arranque", empaquetado=bool(getattr(sys, "frozen", False)))
+    medicion.sumar("importacion", IMPORTACION - INICIO)
+    medicion.sumar("ventana", primera_ventana - IMPORTACION)
+    metricas.registrar(medicion, metricas.ruta_por_defecto() or metricas.ruta_registro())
+    print(f"Primera ventana en {medicion.resumen()}")
 
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
+    app.setWindowIcon(QtGui.QIcon(resource_path("icon.ico")))
     
     # Configurar estilo de aplicación (opcional)
     app.setStyle("Fusion")
@@ -298,7 +211,14 @@ if __name__ == "__main__":
     try:
         window = Main()
         window.show()
-        sys.exit(app.exec())
+        if "--medir-arranque" in sys.argv[1:]:
+            # El temporizador corre cuando el ciclo de eventos ya mostró la ventana
+            QtCore.QTimer.singleShot(0, lambda: (registrar_arranque(time.perf_counter()), app.quit()))
+        codigo_salida = app.exec()
+        # El pool solo existe si se llegó a abrir la vista previa o las estadísticas
+        if "connection" in sys.modules:
+            sys.modules["connection"].cerrar_pool()
+        sys.exit(codigo_salida)
     except Exception as e:
         QMessageBox.critical(None, "Error Fatal", f"Error al inicializar la aplicación: {str(e)}")
         sys.exit(1)
\ No newline at end of file
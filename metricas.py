@@ -0,0 +1,139 @@
+"""Mediciones por etapa de una ejecución del reporte y su registro local en líneas JSON.
+
+Están desactivadas salvo que se pidan con LABSIS_METRICAS o con la opción metricas
+de la sección [labsis] de labsis.ini (la variable tiene prioridad): "on" las guarda en
+metricas.jsonl junto a la caché local, "off" las desactiva y cualquier otro valor es la
+ruta del registro. Desactivadas, nueva_medicion() devuelve None y medir() no toma
+tiempos, así que el costo para quien llama es una comparación con None por etapa.
+"""
+import configparser
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Any, ContextManager, Dict, Iterator, Optional
+
+from archivos_locales import deshabilitado, directorio_local
+
+# Al superar este tamaño el registro se renombra a metricas.jsonl.1 y se empieza otro
+TAMANO_MAXIMO_REGISTRO = 5 * 1024 * 1024
+
+# Nombres legibles de las etapas, en el orden en que se muestran
+ETAPAS = {
+    "importacion": "importación",
+    "ventana": "ventana",
+    "conexion": "conexión",
+    "firmas": "firmas",
+    "cache": "caché",
+    "consulta": "consulta",
+    "lectura": "lectura",
+    "agregacion": "agregación",
+    "fusion": "fusión",
+    "tabla": "tabla",
+    "csv": "CSV",
+    "parquet": "Parquet",
+}
+
+
+def _opcion_configuracion() -> str:
+    """Valor de metricas en la sección [labsis] de labsis.ini, o "" si no está."""
+    parser = configparser.ConfigParser()
+    try:
+        parser.read(os.environ.get("LABSIS_CONFIG", "labsis.ini"), encoding="utf-8")
+    except configparser.Error:
+        return ""
+    return parser.get("labsis", "metricas", fallback="")
+
+
+def ruta_registro() -> str:
+    """Ubicación habitual del registro, junto a la caché local."""
+    return os.path.join(directorio_local(), "metricas.jsonl")
+
+
+def ruta_por_defecto() -> Optional[str]:
+    """Archivo del registro; None si las métricas no se pidieron o están deshabilitadas."""
+    valor = (os.environ.get("LABSIS_METRICAS", "").strip() or _opcion_configuracion()).strip()
+    if not valor or deshabilitado(valor):
+        return None
+    if valor.lower() in ("1", "on", "si", "sí", "yes"):
+        return ruta_registro()
+    return valor
+
+
+class MedicionReporte:
+    """Segundos por etapa y conteos (filas, boletas, bytes) de una ejecución."""
+
+    def __init__(self, operacion: str, **datos: Any):
+        self.fecha = datetime.now()
+        self.datos: Dict[str, Any] = {"operacion": operacion, **datos}
+        self.etapas: Dict[str, float] = {}
+        self.conteos: Dict[str, int] = {}
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Suma a la etapa el tiempo que tarda el bloque, aunque termine con error."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.perf_counter() - inicio)
+
+    def sumar(self, nombre: str, segundos: float) -> None:
+        self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    def contar(self, nombre: str, cantidad: int) -> None:
+        self.conteos[nombre] = self.conteos.get(nombre, 0) + cantidad
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "fecha": self.fecha.isoformat(timespec="seconds"),
+            **self.datos,
+            "segundos": {nombre: round(s, 4) for nombre, s in self.etapas.items()},
+            "total": round(sum(self.etapas.values()), 4),
+            **self.conteos,
+        }
+
+    def resumen(self) -> str:
+        """Texto corto para la interfaz: total, segundos de cada etapa y filas leídas."""
+        orden = sorted(self.etapas, key=lambda nombre: list(ETAPAS).index(nombre)
+                       if nombre in ETAPAS else len(ETAPAS))
+        partes = ", ".join(f"{ETAPAS.get(nombre, nombre)} {self.etapas[nombre]:.2f}" for nombre in orden)
+        texto = f"{sum(self.etapas.values()):.2f} s ({partes})"
+        if "filas" in self.conteos:
+            texto += f" - {self.conteos['filas']} filas"
+        return texto
+
+
+def nueva_medicion(operacion: str, **datos: Any) -> Optional[MedicionReporte]:
+    """Medición para una ejecución, o None si las métricas están deshabilitadas."""
+    if ruta_por_defecto() is None:
+        return None
+    return MedicionReporte(operacion, **datos)
+
+
+def medir(medicion: Optional[MedicionReporte], etapa: str) -> ContextManager[None]:
+    """Bloque que suma su duración a la etapa; no hace nada si medicion es None."""
+    return nullcontext() if medicion is None else medicion.etapa(etapa)
+
+
+def registrar(medicion: Optional[MedicionReporte], ruta: Optional[str] = None) -> None:
+    """Agrega la medición como una línea JSON al registro local.
+
+    Un error de escritura solo se imprime: las métricas nunca interrumpen el reporte.
+    """
+    if medicion is None:
+        return
+    ruta = ruta or ruta_por_defecto()
+    if ruta is None:
+        return
+    try:
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        if os.path.exists(ruta) and os.path.getsize(ruta) > TAMANO_MAXIMO_REGISTRO:
+            os.replace(ruta, ruta + ".1")
+        with open(ruta, "a", encoding="utf-8") as f:
+            f.write(json.dumps(medicion.como_dict(), ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"No se pudo escribir el registro de métricas {ruta}: {e}")
@@ -0,0 +1,96 @@
+"""Esquema temporal de PostgreSQL con las tablas de labsis para las pruebas.
+
+Las pruebas que lo usan necesitan LABSIS_PRUEBAS_DSN con la cadena de conexión de
+psycopg2 a una base de pruebas (nunca labsis); sin ella se omiten. Cada clase de
+pruebas crea su propio esquema y lo borra al terminar.
+"""
+import os
+import sys
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import datos_sinteticos  # noqa: E402
+
+DSN_PRUEBAS = os.environ.get("LABSIS_PRUEBAS_DSN")
+
+requiere_postgres = unittest.skipUnless(DSN_PRUEBAS, "requiere LABSIS_PRUEBAS_DSN")
+
+
+class BaseDePrueba:
+    """Carga las tablas en un esquema nuevo; config sirve para connect_to_db y PoolConexiones."""
+
+    def __init__(self, tablas: datos_sinteticos.Tablas):
+        self.tablas = tablas
+        self.esquema = f"prueba_{uuid.uuid4().hex[:12]}"
+        self.config: Dict[str, str] = {"dsn": DSN_PRUEBAS, "options": f"-c search_path={self.esquema}"}
+        self.conn: Optional[psycopg2.extensions.connection] = None
+
+    def __enter__(self) -> "BaseDePrueba":
+        with psycopg2.connect(DSN_PRUEBAS) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"CREATE SCHEMA {self.esquema}")
+        conn.close()
+        self.conn = psycopg2.connect(**self.config)
+        datos_sinteticos.cargar(self.conn, self.tablas, recrear=False)
+        return self
+
+    def ejecutar(self, sql: str, parametros: tuple = ()) -> None:
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql, parametros)
+        self.conn.commit()
+
+    def __exit__(self, *exc) -> None:
+        self.conn.close()
+        with psycopg2.connect(DSN_PRUEBAS) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA {self.esquema} CASCADE")
+        conn.close()
+
+
+class Casos:
+    """Agrega a las tablas generadas órdenes escritas a mano con ids nuevos."""
+
+    def __init__(self, tablas: datos_sinteticos.Tablas):
+        self.tablas = tablas
+        self._ids = {tabla: max((fila[0] for fila in filas), default=0) for tabla, filas in tablas.items()}
+
+    def _nuevo_id(self, tabla: str) -> int:
+        self._ids[tabla] += 1
+        return self._ids[tabla]
+
+    def orden(self, num_ingreso: str, recepcion: datetime, update: Optional[str] = None,
+              servicio: int = 1) -> int:
+        """Agrega una orden; servicio es el id de servicio_medico (su codigo_dtic es "D<servicio>")."""
+        orden_id = self._nuevo_id("orden_trabajo")
+        paciente_id = self._nuevo_id("paciente")
+        self.tablas["paciente"].append((paciente_id, "Caso", f"Prueba {num_ingreso}", "F", str(paciente_id)))
+        self.tablas["orden_trabajo"].append((
+            orden_id, num_ingreso, (recepcion - timedelta(hours=5)).replace(tzinfo=datos_sinteticos.ZONA),
+            paciente_id, str(orden_id), servicio,
+        ))
+        self.tablas["orden_trabajo_datos_extra"].append((
+            self._nuevo_id("orden_trabajo_datos_extra"), orden_id, 2, 0, recepcion, update,
+        ))
+        return orden_id
+
+    def prueba(self, orden_id: int, prueba_id: int, numerico: Optional[str] = None,
+               alpha: Optional[str] = None, actualizado: Optional[datetime] = None,
+               validado_por: Optional[int] = 1) -> int:
+        """Agrega una prueba a la orden; sin numerico ni alpha queda pendiente de resultado."""
+        prueba_orden_id = self._nuevo_id("prueba_orden")
+        self.tablas["prueba_orden"].append((prueba_orden_id, orden_id, prueba_id))
+        if numerico is not None:
+            self.tablas["resultado_numer"].append((
+                self._nuevo_id("resultado_numer"), prueba_orden_id, Decimal(numerico), actualizado,
+            ))
+        if alpha is not None:
+            self.tablas["resultado_alpha"].append((
+                self._nuevo_id("resultado_alpha"), prueba_orden_id, alpha, validado_por, actualizado,
+            ))
+        return prueba_orden_id
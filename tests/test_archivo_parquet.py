@@ -0,0 +1,73 @@
+"""Pruebas del archivo Parquet con resultados numéricos que no son números."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+try:
+    import archivo_parquet
+except ImportError:  # pyarrow es opcional
+    archivo_parquet = None
+
+from connection import INDICE_RESULTADO, Boleta, write_to_csv
+
+
+def _boleta(numero: int, resultado: str, irt: str = None) -> Boleta:
+    boleta = Boleta()
+    boleta.Boleta = str(100000 + numero)
+    boleta.Paciente = "Paciente Prueba"
+    boleta.Edad = "3"
+    boleta.Sexo = "F"
+    boleta.FechaTomaMx = date(2024, 1, 2)
+    boleta.Recepcion = date(2024, 1, 3)
+    boleta.FResultado = datetime(2024, 1, 4, 10, 30)
+    boleta.StdoBoleta = "A"
+    boleta.con_pruebas = True
+    boleta.Resultados[INDICE_RESULTADO[852]] = resultado
+    boleta.Resultados[INDICE_RESULTADO[859]] = irt
+    boleta.Resultados[INDICE_RESULTADO[889]] = "F"
+    return boleta
+
+
+@unittest.skipIf(archivo_parquet is None, "requiere pyarrow")
+class ResultadosTextoTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        self.boletas = {
+            b.Boleta: b for b in (
+                _boleta(1, "12.5", "30"),
+                _boleta(2, "<0.1"),
+                _boleta(3, "Indeterminado", "1,5"),
+                _boleta(4, None),
+            )
+        }
+        self.ruta = os.path.join(self.directorio, "boletas.parquet")
+        self.con_texto = []
+        archivo_parquet.write_to_parquet(self.boletas, self.ruta, al_guardar_texto=self.con_texto.extend)
+
+    def test_texto_no_interrumpe_y_queda_nulo(self):
+        tabla = archivo_parquet.leer_archivo(self.ruta, columnas=["Resultado", "ResultadoIRT", "ResultadosTexto"])
+        self.assertEqual(tabla.column("Resultado").to_pylist(), [12.5, None, None, None])
+        self.assertEqual(tabla.column("ResultadoIRT").to_pylist(), [30.0, None, None, None])
+        self.assertEqual(tabla.column("ResultadosTexto").to_pylist(), [
+            None,
+            [("Resultado", "<0.1")],
+            [("Resultado", "Indeterminado"), ("ResultadoIRT", "1,5")],
+            None,
+        ])
+        self.assertEqual(self.con_texto, ["100002", "100003"])
+
+    def test_csv_regenerado_identico(self):
+        original = os.path.join(self.directorio, "original.csv")
+        regenerado = os.path.join(self.directorio, "regenerado.csv")
+        write_to_csv(self.boletas, original, propagar_errores=True)
+        write_to_csv(archivo_parquet.leer_boletas(self.ruta), regenerado, propagar_errores=True)
+        with open(original, "rb") as a, open(regenerado, "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
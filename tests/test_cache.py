@@ -0,0 +1,167 @@
+"""Pruebas de la caché local: invalidación por rango de días y por boletas cambiadas, y rangos
+sin consultar el servidor."""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+import cli_comun
+import connection
+import exportar
+from cache import CacheBoletas
+
+DIAS = [date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4)]
+
+
+def _llenar(cache: CacheBoletas) -> None:
+    for numero, dia in enumerate(DIAS):
+        cache.guardar(dia, True, None, [("registro", numero)], [f"B{numero}"])
+
+
+class InvalidarCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+
+    def _abrir(self) -> CacheBoletas:
+        cache = CacheBoletas(os.path.join(self.directorio, "cache.sqlite"))
+        self.addCleanup(cache.cerrar)
+        return cache
+
+    def test_invalidar_descarta_solo_el_rango(self):
+        cache = self._abrir()
+        _llenar(cache)
+        self.assertEqual(cache.invalidar(DIAS[1], DIAS[2]), 2)
+        self.assertIsNotNone(cache.leer(DIAS[0], True))
+        self.assertIsNone(cache.leer(DIAS[1], True))
+        self.assertIsNone(cache.leer(DIAS[2], True))
+        self.assertIsNotNone(cache.leer(DIAS[3], True))
+        # Los índices de boletas de los días descartados también se van
+        self.assertEqual(cache.invalidar_boletas(["B1", "B2"]), 0)
+
+    def test_invalidar_sin_limites_vacia_la_cache(self):
+        cache = self._abrir()
+        _llenar(cache)
+        self.assertEqual(cache.invalidar(), len(DIAS))
+        self.assertEqual(cache.tamano(), 0)
+
+    def test_exportar_invalidar_cache(self):
+        entorno = {"LABSIS_CACHE": self.directorio, "LABSIS_HOST": "servidor-prueba",
+                   "LABSIS_DB": "labsis_prueba", "LABSIS_CONFIG": os.path.join(self.directorio, "no.ini")}
+        with mock.patch.dict(os.environ, entorno):
+            with connection.abrir_cache() as cache:
+                _llenar(cache)
+            salida = io.StringIO()
+            with contextlib.redirect_stdout(salida):
+                codigo = exportar.main(["--desde", "2024-01-02", "--hasta", "2024-01-03",
+                                        "--invalidar-cache", "--json"])
+            with connection.abrir_cache() as cache:
+                conservados = [dia for dia in DIAS if cache.leer(dia, True) is not None]
+
+        self.assertEqual(codigo, cli_comun.SALIDA_OK)
+        self.assertEqual(json.loads(salida.getvalue())["dias_descartados"], 2)
+        self.assertEqual(conservados, [DIAS[0], DIAS[3]])
+
+    def test_exportar_invalidar_cache_deshabilitada(self):
+        with mock.patch.dict(os.environ, {"LABSIS_CACHE": "off"}):
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                codigo = exportar.main(["--desde", "2024-01-02", "--hasta", "2024-01-03", "--invalidar-cache"])
+        self.assertEqual(codigo, cli_comun.SALIDA_ERROR)
+
+    def test_invalidar_cache_no_se_combina_con_exportar(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit) as salida:
+            exportar.main(["--desde", "2024-01-02", "--hasta", "2024-01-03",
+                           "--invalidar-cache", "--salida", "reporte.csv"])
+        self.assertEqual(salida.exception.code, cli_comun.SALIDA_USO)
+
+
+class CambiosDeltaTest(unittest.TestCase):
+    """Los días cerrados no validan su firma: los cambios vistos por el delta los descartan."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+
+    def test_reporte_delta_avisa_todas_las_cambiadas(self):
+        conn = mock.MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        # "B9" cambió pero se recibió fuera del rango: no está en el reporte
+        cursor.fetchall.side_effect = [
+            [("B2", datetime(2024, 3, 1, 9)), ("B9", datetime(2024, 3, 1, 10)), ("B2", datetime(2024, 3, 1, 11))],
+            [],
+        ]
+        al_detectar_cambios = mock.Mock()
+        boletas, marca = connection.generate_report_delta(
+            conn, "2024-01-01", "2024-01-31", datetime(2024, 2, 1), al_detectar_cambios=al_detectar_cambios
+        )
+        self.assertEqual(boletas, {})
+        self.assertEqual(marca, datetime(2024, 3, 1, 11))
+        al_detectar_cambios.assert_called_once_with(["B2", "B9"])
+
+    def test_exportar_delta_descarta_dias_cambiados(self):
+        def reporte(*args, al_detectar_cambios=None, **kwargs):
+            al_detectar_cambios(["B1", "B9"])
+            return {}, datetime(2024, 3, 1)
+
+        entorno = {"LABSIS_CACHE": self.directorio, "LABSIS_HOST": "servidor-prueba",
+                   "LABSIS_DB": "labsis_prueba", "LABSIS_CONFIG": os.path.join(self.directorio, "no.ini")}
+        with mock.patch.dict(os.environ, entorno):
+            with connection.abrir_cache() as cache:
+                _llenar(cache)
+            with mock.patch.object(connection, "connect_to_db", return_value=mock.Mock()), \
+                    mock.patch.object(connection, "generate_report_delta", side_effect=reporte), \
+                    contextlib.redirect_stderr(io.StringIO()):
+                resumen = exportar.exportar_delta("2024-01-01", "2024-01-31",
+                                                  os.path.join(self.directorio, "delta.csv"),
+                                                  os.path.join(self.directorio, "delta.sqlite"))
+            with connection.abrir_cache() as cache:
+                conservados = [dia for dia in DIAS if cache.leer(dia, True) is not None]
+
+        self.assertIsNone(resumen["error"])
+        self.assertEqual(conservados, [DIAS[0], DIAS[2], DIAS[3]])
+
+
+class CacheSinServidorTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.cache = CacheBoletas(os.path.join(directorio.name, "cache.sqlite"))
+        self.addCleanup(self.cache.cerrar)
+        # El último día de un rango BETWEEN solo llega hasta la medianoche: queda incompleto
+        for dia, completo in ((DIAS[0], True), (DIAS[1], True), (DIAS[2], False)):
+            boleta = connection.create_boleta_base(f"B{dia.day}", dia, "Ana Peña", "F", "123", 3,
+                                                   dia, "B001", "D1")
+            self.cache.guardar(dia, completo, None, [boleta.a_tupla()], [boleta.Boleta])
+        self.pool = mock.Mock(spec=connection.PoolConexiones)
+        self.pool.maxconn = 2
+        self.pool.conexion.side_effect = AssertionError("consultó el servidor")
+        self.al_consultar = mock.Mock()
+
+    def _generar(self, hasta: str):
+        return connection.generate_report_cacheado(
+            "2024-01-01", hasta, self.cache, pool=self.pool, hoy=date(2024, 3, 1),
+            al_consultar=self.al_consultar, propagar_errores=True
+        )
+
+    def test_rango_cerrado_en_cache_no_consulta(self):
+        boletas = self._generar("2024-01-03")
+        self.assertEqual(list(boletas), ["B1", "B2", "B3"])
+        self.pool.conexion.assert_not_called()
+        self.al_consultar.assert_not_called()
+
+    def test_dia_faltante_avisa_antes_de_consultar(self):
+        with self.assertRaisesRegex(AssertionError, "consultó el servidor"):
+            self._generar("2024-01-04")
+        self.al_consultar.assert_called_once_with(self.pool)
+
+
+if __name__ == "__main__":
+    unittest.main()
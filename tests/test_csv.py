@@ -0,0 +1,98 @@
+"""Pruebas del CSV del reporte: formato de cada columna y escritura atómica."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+import connection
+from connection import INDICE_RESULTADO, Boleta, write_to_csv
+
+
+def _nulos(cantidad: int) -> str:
+    return ",".join(["#NULL#"] * cantidad)
+
+
+def _aceptada() -> Boleta:
+    boleta = Boleta()
+    boleta.codigoE = "B001"
+    boleta.Boleta = "100001"
+    boleta.FechaTomaMx = date(2024, 1, 2)
+    boleta.Paciente = "Ōscar Peña"
+    boleta.Edad = 3
+    boleta.Sexo = "F"
+    boleta.Expediente = "123"
+    boleta.Recepcion = date(2024, 1, 3)
+    boleta.Procesamiento = boleta.FResultado = datetime(2024, 1, 4, 10, 30, 0, 250000)
+    boleta.StdoBoleta = "A"
+    boleta.Update = "x"
+    boleta.Id = "D1"
+    boleta.con_pruebas = True
+    boleta.Resultados[INDICE_RESULTADO[852]] = Decimal("12.34")
+    boleta.Resultados[INDICE_RESULTADO[889]] = "F"
+    return boleta
+
+
+def _rechazada(numero: str, con_pruebas: bool) -> Boleta:
+    boleta = Boleta()
+    boleta.Boleta = numero
+    boleta.Paciente = "Ana"
+    boleta.Sexo = "M"
+    boleta.Expediente = "9"
+    boleta.Recepcion = boleta.FechaRechazo = date(2024, 1, 5)
+    boleta.Update = "#hoy#"
+    boleta.con_pruebas = con_pruebas
+    return boleta
+
+
+class _ResultadoRoto:
+    """Resultado que no se puede escribir, para cortar la escritura a la mitad."""
+
+    def __float__(self):
+        raise TypeError("sin número")
+
+    def __str__(self):
+        raise RuntimeError("resultado roto")
+
+
+class EscribirCsvTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        self.ruta = os.path.join(self.directorio, "reporte.csv")
+
+    def _leer(self) -> list:
+        with open(self.ruta, encoding=connection.CODIFICACION_CSV, newline="") as f:
+            return f.read().splitlines()
+
+    def test_formato_de_columnas(self):
+        boletas = [_aceptada(), _rechazada("100002", False), _rechazada("100003", True)]
+        write_to_csv({b.Boleta: b for b in boletas}, self.ruta, propagar_errores=True)
+        lineas = self._leer()
+        self.assertEqual(lineas[0], ",".join(f'"{campo}"' for campo, _ in connection.COLUMNAS_CSV))
+        self.assertEqual(lineas[1:], [
+            '"B001","100001",#2024-01-02#,"Oscar Peña","3","F","123",#2024-01-03#,'
+            '#2024-01-04 10:30:00#,#2024-01-04 10:30:00#,"12.3",#NULL#,#NULL#,"A","X",#NULL#,"D1",'
+            f'{_nulos(6)},"F",{_nulos(3)}',
+            '"#NULL#","100002",#NULL#,"Ana","None","M","9",#2024-01-05#,#NULL#,#NULL#,#NULL#,'
+            f'2024-01-05,#NULL#,"R",#HOY#,#NULL#,"#NULL#",{_nulos(10)}',
+            '"#NULL#","100003",#NULL#,"Ana","None","M","9",#2024-01-05#,#NULL#,#NULL#,#NULL#,'
+            f'#2024-01-05#,#NULL#,"R",#HOY#,#NULL#,"#NULL#",{_nulos(10)}',
+        ])
+
+    def test_error_conserva_el_archivo_anterior(self):
+        with open(self.ruta, "w") as f:
+            f.write("anterior\n")
+        boletas = {str(n): _rechazada(str(n), False) for n in range(3 * connection.LINEAS_POR_BLOQUE)}
+        boletas["roto"] = _aceptada()
+        boletas["roto"].Resultados[INDICE_RESULTADO[859]] = _ResultadoRoto()
+        with self.assertRaisesRegex(RuntimeError, "resultado roto"):
+            write_to_csv(boletas, self.ruta, propagar_errores=True)
+        self.assertEqual(self._leer(), ["anterior"])
+        self.assertEqual(os.listdir(self.directorio), ["reporte.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
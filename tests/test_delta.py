@@ -0,0 +1,67 @@
+"""Pruebas del diario de ediciones de Update de la exportación incremental."""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+import connection
+import exportar
+from delta import EstadoDelta
+
+MARCA = datetime(2024, 1, 31, 12, 0)
+
+
+def _boleta(num_ingreso: str) -> connection.Boleta:
+    return connection.create_boleta_base(num_ingreso, date(2024, 1, 2), "Ana Peña", "F", "123",
+                                         3, date(2024, 1, 3), "B001", "D1")
+
+
+class DiarioUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, "delta.sqlite")
+
+    def test_confirmar_quita_solo_las_exportadas(self):
+        with EstadoDelta(self.ruta) as estado:
+            estado.registrar_updates(["100", "200"])
+            editadas, ultimo_id = estado.updates_pendientes()
+            estado.confirmar(MARCA, ultimo_id, ["100"])
+            self.assertEqual(editadas, ["100", "200"])
+            self.assertEqual(estado.updates_pendientes()[0], ["200"])
+            self.assertEqual(estado.marca_agua(), MARCA)
+
+    def test_confirmar_conserva_ediciones_posteriores(self):
+        with EstadoDelta(self.ruta) as estado:
+            estado.registrar_updates(["100"])
+            _, ultimo_id = estado.updates_pendientes()
+            # Editada otra vez mientras se escribía el CSV
+            estado.registrar_updates(["100"])
+            estado.confirmar(MARCA, ultimo_id, ["100"])
+            self.assertEqual(estado.updates_pendientes()[0], ["100"])
+
+    def test_exportar_delta_edicion_fuera_del_rango(self):
+        with EstadoDelta(self.ruta) as estado:
+            estado.registrar_updates(["100", "900"])
+        archivo = os.path.join(os.path.dirname(self.ruta), "delta.csv")
+        # "900" se recibió fuera del rango: el reporte no la trae
+        reporte = mock.Mock(return_value=({"100": _boleta("100")}, MARCA))
+        with mock.patch.object(connection, "connect_to_db", return_value=mock.Mock()), \
+                mock.patch.object(connection, "generate_report_delta", reporte), \
+                contextlib.redirect_stderr(io.StringIO()):
+            resumen = exportar.exportar_delta("2024-01-01", "2024-01-31", archivo, self.ruta)
+
+        self.assertIsNone(resumen["error"])
+        self.assertEqual(resumen["boletas"], 1)
+        self.assertEqual(reporte.call_args.args[4], ["100", "900"])
+        with EstadoDelta(self.ruta) as estado:
+            self.assertEqual(estado.updates_pendientes()[0], ["900"])
+            self.assertEqual(estado.marca_agua(), MARCA)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Pruebas del índice de búsqueda y del filtro de la tabla de la vista previa."""
+import unittest
+from datetime import date
+
+import connection
+from filtro import IndiceBoletas
+
+try:
+    from PyQt6 import QtCore
+    from vista_previa import BoletasTableModel, OpenPreviewResults
+except ImportError:  # PyQt6 solo hace falta para la interfaz
+    BoletasTableModel = None
+
+
+def _boleta(numero: str, paciente: str, estado: str = "A", expediente: str = "") -> connection.Boleta:
+    boleta = connection.create_boleta_base(numero, date(2024, 1, 2), paciente, "F", expediente or numero,
+                                           3, date(2024, 1, 3), "B001", "D1")
+    boleta.StdoBoleta = estado
+    return boleta
+
+
+BOLETAS = [
+    _boleta("100001", "Ana Peña"),
+    _boleta("100002", "José Peñaloza", "R"),
+    _boleta("200003", "Ana López"),
+    _boleta("200004", "Luis Gómez", "R", expediente="PEN-9"),
+]
+
+
+class IndiceBoletasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.indice = IndiceBoletas(BOLETAS)
+
+    def test_sin_filtro(self):
+        self.assertIsNone(self.indice.filtrar("  ", None))
+        self.assertEqual(self.indice.total, 4)
+
+    def test_prefijo_sin_tildes_en_todos_los_campos(self):
+        self.assertEqual(self.indice.filtrar("pen"), {"100001", "100002", "200004"})
+        self.assertEqual(self.indice.filtrar("2000"), {"200003", "200004"})
+
+    def test_palabras_y_estado(self):
+        self.assertEqual(self.indice.filtrar("ana pe"), {"100001"})
+        self.assertEqual(self.indice.filtrar("pen", "R"), {"100002", "200004"})
+        self.assertEqual(self.indice.filtrar("", "A"), {"100001", "200003"})
+        self.assertEqual(self.indice.filtrar("zzz", "A"), set())
+
+
+@unittest.skipIf(BoletasTableModel is None, "requiere PyQt6")
+class FiltroTablaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.modelo = BoletasTableModel(OpenPreviewResults.COLUMNAS_NORMALES,
+                                        OpenPreviewResults.RESULTADOS_ALIAS)
+        self.modelo.set_boletas(BOLETAS)
+        self.reinicios = []
+        self.modelo.modelReset.connect(lambda: self.reinicios.append(True))
+
+    def _visibles(self):
+        columna = OpenPreviewResults.COLUMNAS_NORMALES.index("Boleta")
+        return [self.modelo.index(fila, columna).data() for fila in range(self.modelo.rowCount())]
+
+    def test_filtrar_cambia_solo_las_filas_visibles(self):
+        self.modelo.filtrar({"200004", "100001", "999999"})
+        self.assertEqual(self._visibles(), ["100001", "200004"])
+        self.modelo.filtrar(None)
+        self.assertEqual(self._visibles(), ["100001", "100002", "200003", "200004"])
+        self.assertEqual(self.reinicios, [])
+
+    def test_filtro_respeta_el_orden(self):
+        columna = OpenPreviewResults.COLUMNAS_NORMALES.index("Paciente")
+        self.modelo.sort(columna)
+        self.modelo.filtrar({"100001", "200003", "200004"})
+        self.assertEqual(self._visibles(), ["200003", "100001", "200004"])
+
+    def test_boletas_nuevas_y_reemplazadas_con_filtro(self):
+        self.modelo.filtrar({"100002", "300005"})
+        self.modelo.agregar_boletas([_boleta("300005", "Sofía Ruiz"), _boleta("300006", "Julián Ruiz")])
+        self.assertEqual(self._visibles(), ["100002", "300005"])
+        cambiada = _boleta("300005", "Sofía Ruiz Díaz")
+        self.modelo.reemplazar_boleta(cambiada)
+        self.assertIs(self.modelo.todas()[4], cambiada)
+        self.modelo.filtrar(None)
+        self.assertEqual(self._visibles(), ["100001", "100002", "200003", "200004", "300005", "300006"])
+
+    def test_seleccion_sigue_a_la_boleta(self):
+        persistente = QtCore.QPersistentModelIndex(self.modelo.index(2, 0))
+        self.modelo.filtrar({"200003", "200004"})
+        self.assertEqual(persistente.row(), 0)
+        self.modelo.filtrar({"100001"})
+        self.assertFalse(persistente.isValid())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""Pruebas de la activación de las métricas: desactivadas salvo que se pidan."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import metricas
+
+
+class ActivacionMetricasTest(unittest.TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        self.ini = os.path.join(self.directorio, "labsis.ini")
+
+    def _ruta(self, ini: str = "", **entorno: str):
+        with open(self.ini, "w", encoding="utf-8") as f:
+            f.write(ini)
+        variables = {"LABSIS_CONFIG": self.ini, "LABSIS_CACHE": self.directorio, **entorno}
+        with mock.patch.dict(os.environ, variables):
+            if "LABSIS_METRICAS" not in entorno:
+                os.environ.pop("LABSIS_METRICAS", None)
+            return metricas.ruta_por_defecto(), metricas.nueva_medicion("prueba")
+
+    def test_desactivadas_por_defecto(self):
+        ruta, medicion = self._ruta("[labsis]\nhost = servidor\n")
+        self.assertIsNone(ruta)
+        self.assertIsNone(medicion)
+
+    def test_activadas_en_labsis_ini(self):
+        ruta, medicion = self._ruta("[labsis]\nmetricas = on\n")
+        self.assertEqual(ruta, os.path.join(self.directorio, "metricas.jsonl"))
+        self.assertIsNotNone(medicion)
+
+    def test_variable_con_prioridad_sobre_labsis_ini(self):
+        self.assertEqual(self._ruta("[labsis]\nmetricas = on\n", LABSIS_METRICAS="off"), (None, None))
+        ruta, _ = self._ruta("", LABSIS_METRICAS="registro.jsonl")
+        self.assertEqual(ruta, "registro.jsonl")
+
+
+if __name__ == "__main__":
+    unittest.main()
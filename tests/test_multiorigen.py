@@ -0,0 +1,98 @@
+"""Fusión de las boletas de varios servidores en el modo multiorigen."""
+import unittest
+from datetime import date, datetime
+
+from base_datos import BaseDePrueba, Casos, requiere_postgres
+import connection
+import datos_sinteticos
+
+DESDE, HASTA = "2024-01-01", "2024-01-10"
+
+
+def _boleta(num_ingreso: str, codigo_dtic: str, estado: str = "R") -> connection.Boleta:
+    boleta = connection.create_boleta_base(num_ingreso, date(2024, 1, 2), "Ana Peña", "F", "123",
+                                           3, date(2024, 1, 3), "B001", codigo_dtic)
+    boleta.con_pruebas = True
+    boleta.StdoBoleta = estado
+    if estado == "A":
+        boleta.FechaRechazo = None
+    return boleta
+
+
+class FusionarOrigenesTest(unittest.TestCase):
+
+    def test_misma_muestra_se_fusiona_y_otra_queda_aparte(self):
+        reporte = connection.ReporteMultiorigen()
+        reporte.fusionar("central", {"100": _boleta("100", "D1", "A"), "200": _boleta("200", "D1")})
+        reporte.fusionar("occidente", {"100": _boleta("100", "D1"), "200": _boleta("200", "D2")})
+
+        self.assertEqual(list(reporte.boletas), ["100", "200", "200@occidente"])
+        self.assertEqual(reporte.origenes["100"], ["central", "occidente"])
+        self.assertEqual(reporte.origenes["200@occidente"], ["occidente"])
+        # Aceptada en un servidor: queda aceptada aunque el otro la tenga rechazada
+        self.assertEqual(reporte.boletas["100"].StdoBoleta, "A")
+        self.assertIsNone(reporte.boletas["100"].FechaRechazo)
+
+
+def _tablas_central() -> datos_sinteticos.Tablas:
+    tablas = datos_sinteticos.generar(0)
+    casos = Casos(tablas)
+    orden = casos.orden("700001", datetime(2024, 1, 2, 9))
+    casos.prueba(orden, 883, numerico="5.5", actualizado=datetime(2024, 1, 2, 10))
+    orden = casos.orden("700002", datetime(2024, 1, 3, 9))
+    casos.prueba(orden, 852, numerico="4.1", actualizado=datetime(2024, 1, 3, 10))
+    orden = casos.orden("700003", datetime(2024, 1, 4, 9))
+    casos.prueba(orden, 854, numerico="1.2", actualizado=datetime(2024, 1, 4, 10))
+    return tablas
+
+
+def _tablas_occidente() -> datos_sinteticos.Tablas:
+    tablas = datos_sinteticos.generar(0)
+    casos = Casos(tablas)
+    # La misma muestra con otra prueba: sus resultados se suman
+    orden = casos.orden("700001", datetime(2024, 1, 2, 9))
+    casos.prueba(orden, 852, numerico="3.3", actualizado=datetime(2024, 1, 2, 11))
+    # Repetida aquí solo con una prueba ajena: sigue aceptada por el otro servidor
+    orden = casos.orden("700002", datetime(2024, 1, 5, 9))
+    casos.prueba(orden, datos_sinteticos.PRUEBA_AJENA)
+    # Mismo num_ingreso pero otro servicio (codigo_dtic): es otra boleta
+    orden = casos.orden("700003", datetime(2024, 1, 6, 9), servicio=2)
+    casos.prueba(orden, 883, numerico="7.0", actualizado=datetime(2024, 1, 6, 10))
+    return tablas
+
+
+@requiere_postgres
+class ReporteMultiorigenTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.central = BaseDePrueba(_tablas_central()).__enter__()
+        cls.occidente = BaseDePrueba(_tablas_occidente()).__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.central.__exit__(None, None, None)
+        cls.occidente.__exit__(None, None, None)
+
+    def test_boletas_repetidas_se_escriben_una_vez(self):
+        origenes = {
+            "central": self.central.config,
+            "occidente": self.occidente.config,
+            "caido": {"host": "/no/existe", "dbname": "labsis", "timeout": "2"},
+        }
+        reporte = connection.generate_report_multiorigen(DESDE, HASTA, origenes,
+                                                         al_detectar_anomalias=lambda anormales: None)
+
+        self.assertEqual(list(reporte.boletas), ["700001", "700002", "700003", "700003@occidente"])
+        self.assertEqual(reporte.conteos, {"central": 3, "occidente": 3})
+        self.assertEqual(list(reporte.errores), ["caido"])
+        self.assertEqual(reporte.origenes["700001"], ["central", "occidente"])
+        fusionada = reporte.boletas["700001"]
+        self.assertEqual((float(fusionada.resultado(883)), float(fusionada.resultado(852))), (5.5, 3.3))
+        self.assertEqual(reporte.boletas["700002"].StdoBoleta, "A")
+        self.assertEqual(reporte.boletas["700003"].Id, "D1")
+        self.assertEqual(reporte.boletas["700003@occidente"].Id, "D2")
+
+
+if __name__ == "__main__":
+    unittest.main()
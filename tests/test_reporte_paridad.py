@@ -0,0 +1,113 @@
+"""Paridad del pivote en SQL con la agregación fila a fila (modo "python")."""
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from base_datos import BaseDePrueba, Casos, requiere_postgres
+import connection
+import datos_sinteticos
+from cache import CacheBoletas
+
+DESDE, HASTA = "2024-01-01", "2024-01-20"
+
+
+def _ignorar(anormales):
+    pass
+
+
+def _tablas() -> datos_sinteticos.Tablas:
+    tablas = datos_sinteticos.generar(3000, semilla=7, dias=20)
+    casos = Casos(tablas)
+    # Muestra repetida: vale el resultado de la última orden recibida, no el mayor
+    orden = casos.orden("900001", datetime(2024, 1, 3, 10))
+    casos.prueba(orden, 883, numerico="198.7", actualizado=datetime(2024, 1, 3, 12))
+    orden = casos.orden("900001", datetime(2024, 1, 10, 10))
+    casos.prueba(orden, 883, numerico="8.9", actualizado=datetime(2024, 1, 10, 12))
+    # La fracción F se corrige a A en otra orden de otro día (cada letra va en la
+    # columna de su prueba: F 889, A 890, S 891, C 892)
+    orden = casos.orden("900002", datetime(2024, 1, 4, 9))
+    casos.prueba(orden, 889, alpha="F", actualizado=datetime(2024, 1, 4, 11))
+    casos.prueba(orden, 890, alpha="S", actualizado=datetime(2024, 1, 4, 11))
+    orden = casos.orden("900002", datetime(2024, 1, 12, 9))
+    casos.prueba(orden, 889, alpha="A", actualizado=datetime(2024, 1, 12, 11))
+    # Aceptada y luego repetida solo con una prueba ajena: queda rechazada y la
+    # corrección de anomalías la devuelve a aceptada
+    orden = casos.orden("900003", datetime(2024, 1, 5, 8))
+    casos.prueba(orden, 852, numerico="4.1", actualizado=datetime(2024, 1, 5, 9))
+    orden = casos.orden("900003", datetime(2024, 1, 6, 8))
+    casos.prueba(orden, datos_sinteticos.PRUEBA_AJENA)
+    # Pendiente y luego rechazada: FechaRechazo es la recepción de la última orden
+    orden = casos.orden("900004", datetime(2024, 1, 7, 8))
+    casos.prueba(orden, 854)
+    orden = casos.orden("900004", datetime(2024, 1, 8, 8))
+    casos.prueba(orden, datos_sinteticos.PRUEBA_AJENA)
+    # Dos órdenes de la misma boleta recibidas en el mismo instante
+    for valor in ("10.5", "11.5"):
+        orden = casos.orden("900005", datetime(2024, 1, 9, 7, 30), update="x")
+        casos.prueba(orden, 886, numerico=valor, actualizado=datetime(2024, 1, 9, 8))
+        casos.prueba(orden, 891, alpha="C", actualizado=datetime(2024, 1, 9, 8))
+    return tablas
+
+
+@requiere_postgres
+class ParidadReporteTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.base = BaseDePrueba(_tablas()).__enter__()
+        cls.referencia = connection.generate_report(cls.base.conn, DESDE, HASTA, modo="python",
+                                                    al_detectar_anomalias=_ignorar,
+                                                    propagar_errores=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.base.__exit__(None, None, None)
+
+    def _comparar(self, candidato):
+        self.assertEqual(connection.comparar_reportes(self.referencia, candidato), [])
+        self.assertEqual(list(candidato), list(self.referencia))
+
+    def _pool(self) -> connection.PoolConexiones:
+        pool = connection.PoolConexiones(self.base.config)
+        self.addCleanup(pool.cerrar)
+        return pool
+
+    def test_casos_escritos_a_mano(self):
+        self.assertEqual(float(self.referencia["900001"].resultado(883)), 8.9)
+        hemoglobinas = [self.referencia["900002"].resultado(p) for p in datos_sinteticos.PRUEBAS_HB]
+        self.assertEqual(hemoglobinas, [None, "A", "S", None])
+        self.assertEqual(self.referencia["900003"].StdoBoleta, "A")
+        self.assertEqual(self.referencia["900004"].StdoBoleta, "R")
+        self.assertEqual(self.referencia["900004"].FechaRechazo, date(2024, 1, 8))
+
+    def test_python_por_bloques(self):
+        self._comparar(connection.generate_report(self.base.conn, DESDE, HASTA, modo="python",
+                                                  itersize=500, al_detectar_anomalias=_ignorar,
+                                                  propagar_errores=True))
+
+    def test_sql(self):
+        self._comparar(connection.generate_report(self.base.conn, DESDE, HASTA, modo="sql",
+                                                  al_detectar_anomalias=_ignorar,
+                                                  propagar_errores=True))
+
+    def test_particionado(self):
+        pool = self._pool()
+        for dias in (1, 7):
+            with self.subTest(dias=dias):
+                self._comparar(connection.generate_report_particionado(
+                    DESDE, HASTA, dias, pool=pool, al_detectar_anomalias=_ignorar,
+                    propagar_errores=True))
+
+    def test_cacheado(self):
+        pool = self._pool()
+        with tempfile.TemporaryDirectory() as directorio:
+            for vez in ("fria", "tibia"):
+                with self.subTest(cache=vez), CacheBoletas(os.path.join(directorio, "cache.sqlite")) as cache:
+                    self._comparar(connection.generate_report_cacheado(
+                        DESDE, HASTA, cache, pool=pool, hoy=date(2024, 1, 15),
+                        al_detectar_anomalias=_ignorar, propagar_errores=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
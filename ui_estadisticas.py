@@ -0,0 +1,81 @@
+# Form implementation generated from reading ui file 'estadisticas.ui'
+#
+# Created by: PyQt6 UI code generator 6.11.0
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic6 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(900, 600)
+        Dialog.setMinimumSize(QtCore.QSize(900, 600))
+        Dialog.setMaximumSize(QtCore.QSize(900, 600))
+        self.label = QtWidgets.QLabel(parent=Dialog)
+        self.label.setGeometry(QtCore.QRect(320, 8, 261, 20))
+        font = QtGui.QFont()
+        font.setPointSize(14)
+        font.setBold(True)
+        self.label.setFont(font)
+        self.label.setObjectName("label")
+        self.lblResumen = QtWidgets.QLabel(parent=Dialog)
+        self.lblResumen.setGeometry(QtCore.QRect(20, 40, 860, 20))
+        self.lblResumen.setText("")
+        self.lblResumen.setObjectName("lblResumen")
+        self.tabDimensiones = QtWidgets.QTabWidget(parent=Dialog)
+        self.tabDimensiones.setGeometry(QtCore.QRect(20, 70, 860, 480))
+        self.tabDimensiones.setObjectName("tabDimensiones")
+        self.tabDia = QtWidgets.QWidget()
+        self.tabDia.setObjectName("tabDia")
+        self.tblDia = QtWidgets.QTableWidget(parent=self.tabDia)
+        self.tblDia.setGeometry(QtCore.QRect(5, 5, 846, 440))
+        self.tblDia.setObjectName("tblDia")
+        self.tblDia.setColumnCount(0)
+        self.tblDia.setRowCount(0)
+        self.tabDimensiones.addTab(self.tabDia, "")
+        self.tabServicio = QtWidgets.QWidget()
+        self.tabServicio.setObjectName("tabServicio")
+        self.tblServicio = QtWidgets.QTableWidget(parent=self.tabServicio)
+        self.tblServicio.setGeometry(QtCore.QRect(5, 5, 846, 440))
+        self.tblServicio.setObjectName("tblServicio")
+        self.tblServicio.setColumnCount(0)
+        self.tblServicio.setRowCount(0)
+        self.tabDimensiones.addTab(self.tabServicio, "")
+        self.tabPrueba = QtWidgets.QWidget()
+        self.tabPrueba.setObjectName("tabPrueba")
+        self.tblPrueba = QtWidgets.QTableWidget(parent=self.tabPrueba)
+        self.tblPrueba.setGeometry(QtCore.QRect(5, 5, 846, 440))
+        self.tblPrueba.setObjectName("tblPrueba")
+        self.tblPrueba.setColumnCount(0)
+        self.tblPrueba.setRowCount(0)
+        self.tabDimensiones.addTab(self.tabPrueba, "")
+        self.lblProgreso = QtWidgets.QLabel(parent=Dialog)
+        self.lblProgreso.setGeometry(QtCore.QRect(20, 562, 560, 24))
+        self.lblProgreso.setText("")
+        self.lblProgreso.setObjectName("lblProgreso")
+        self.splitter = QtWidgets.QSplitter(parent=Dialog)
+        self.splitter.setGeometry(QtCore.QRect(640, 562, 240, 24))
+        self.splitter.setOrientation(QtCore.Qt.Orientation.Horizontal)
+        self.splitter.setObjectName("splitter")
+        self.btnCerrar = QtWidgets.QPushButton(parent=self.splitter)
+        self.btnCerrar.setObjectName("btnCerrar")
+        self.btnExportar = QtWidgets.QPushButton(parent=self.splitter)
+        self.btnExportar.setObjectName("btnExportar")
+
+        self.retranslateUi(Dialog)
+        self.tabDimensiones.setCurrentIndex(0)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Dialog"))
+        self.label.setText(_translate("Dialog", "Estadisticas del Reporte"))
+        self.tabDimensiones.setTabText(self.tabDimensiones.indexOf(self.tabDia), _translate("Dialog", "Por dia"))
+        self.tabDimensiones.setTabText(self.tabDimensiones.indexOf(self.tabServicio), _translate("Dialog", "Por servicio"))
+        self.tabDimensiones.setTabText(self.tabDimensiones.indexOf(self.tabPrueba), _translate("Dialog", "Por prueba"))
+        self.btnCerrar.setText(_translate("Dialog", "Cerrar"))
+        self.btnExportar.setText(_translate("Dialog", "Exportar"))
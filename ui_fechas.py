@@ -0,0 +1,70 @@
+# Form implementation generated from reading ui file 'fechas.ui'
+#
+# Created by: PyQt6 UI code generator 6.11.0
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic6 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(400, 200)
+        self.buttonBox = QtWidgets.QDialogButtonBox(parent=Dialog)
+        self.buttonBox.setGeometry(QtCore.QRect(140, 160, 231, 32))
+        self.buttonBox.setOrientation(QtCore.Qt.Orientation.Horizontal)
+        self.buttonBox.setStandardButtons(QtWidgets.QDialogButtonBox.StandardButton.Cancel|QtWidgets.QDialogButtonBox.StandardButton.Ok)
+        self.buttonBox.setObjectName("buttonBox")
+        self.btnEstadisticas = QtWidgets.QPushButton(parent=Dialog)
+        self.btnEstadisticas.setGeometry(QtCore.QRect(30, 164, 100, 24))
+        self.btnEstadisticas.setObjectName("btnEstadisticas")
+        self.pbExportacion = QtWidgets.QProgressBar(parent=Dialog)
+        self.pbExportacion.setGeometry(QtCore.QRect(30, 136, 341, 20))
+        self.pbExportacion.setProperty("value", 0)
+        self.pbExportacion.setObjectName("pbExportacion")
+        self.formLayoutWidget = QtWidgets.QWidget(parent=Dialog)
+        self.formLayoutWidget.setGeometry(QtCore.QRect(30, 60, 343, 71))
+        self.formLayoutWidget.setObjectName("formLayoutWidget")
+        self.formLayout = QtWidgets.QFormLayout(self.formLayoutWidget)
+        self.formLayout.setContentsMargins(0, 0, 0, 0)
+        self.formLayout.setObjectName("formLayout")
+        self.label_2 = QtWidgets.QLabel(parent=self.formLayoutWidget)
+        self.label_2.setObjectName("label_2")
+        self.formLayout.setWidget(1, QtWidgets.QFormLayout.ItemRole.LabelRole, self.label_2)
+        self.deFechaFin = QtWidgets.QDateEdit(parent=self.formLayoutWidget)
+        self.deFechaFin.setCalendarPopup(True)
+        self.deFechaFin.setObjectName("deFechaFin")
+        self.formLayout.setWidget(1, QtWidgets.QFormLayout.ItemRole.FieldRole, self.deFechaFin)
+        self.label = QtWidgets.QLabel(parent=self.formLayoutWidget)
+        self.label.setObjectName("label")
+        self.formLayout.setWidget(0, QtWidgets.QFormLayout.ItemRole.LabelRole, self.label)
+        self.deFechaIni = QtWidgets.QDateEdit(parent=self.formLayoutWidget)
+        self.deFechaIni.setCalendarPopup(True)
+        self.deFechaIni.setObjectName("deFechaIni")
+        self.formLayout.setWidget(0, QtWidgets.QFormLayout.ItemRole.FieldRole, self.deFechaIni)
+        self.label_3 = QtWidgets.QLabel(parent=Dialog)
+        self.label_3.setGeometry(QtCore.QRect(60, 20, 291, 20))
+        font = QtGui.QFont()
+        font.setPointSize(14)
+        font.setBold(True)
+        self.label_3.setFont(font)
+        self.label_3.setObjectName("label_3")
+
+        self.retranslateUi(Dialog)
+        self.buttonBox.accepted.connect(Dialog.accept) # type: ignore
+        self.buttonBox.rejected.connect(Dialog.reject) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Dialog"))
+        self.btnEstadisticas.setToolTip(_translate("Dialog", "Volumen, rechazo y tiempo de respuesta del rango, calculados en el servidor"))
+        self.btnEstadisticas.setText(_translate("Dialog", "Estadisticas"))
+        self.label_2.setText(_translate("Dialog", "Fecha FIn"))
+        self.deFechaFin.setDisplayFormat(_translate("Dialog", "yyyy-MM-dd"))
+        self.label.setText(_translate("Dialog", "Fecha de Inicio"))
+        self.deFechaIni.setDisplayFormat(_translate("Dialog", "yyyy-MM-dd"))
+        self.label_3.setText(_translate("Dialog", "Seleccion de Fecha de Recepcion"))
@@ -0,0 +1,82 @@
+# Form implementation generated from reading ui file 'preview.ui'
+#
+# Created by: PyQt6 UI code generator 6.11.0
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic6 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Dialog(object):
+    def setupUi(self, Dialog):
+        Dialog.setObjectName("Dialog")
+        Dialog.resize(1200, 700)
+        Dialog.setMinimumSize(QtCore.QSize(1200, 700))
+        Dialog.setMaximumSize(QtCore.QSize(1200, 700))
+        self.label = QtWidgets.QLabel(parent=Dialog)
+        self.label.setGeometry(QtCore.QRect(470, 8, 281, 20))
+        font = QtGui.QFont()
+        font.setPointSize(14)
+        font.setBold(True)
+        self.label.setFont(font)
+        self.label.setObjectName("label")
+        self.txtFiltro = QtWidgets.QLineEdit(parent=Dialog)
+        self.txtFiltro.setGeometry(QtCore.QRect(100, 40, 420, 24))
+        self.txtFiltro.setClearButtonEnabled(True)
+        self.txtFiltro.setObjectName("txtFiltro")
+        self.cmbEstado = QtWidgets.QComboBox(parent=Dialog)
+        self.cmbEstado.setGeometry(QtCore.QRect(530, 40, 160, 24))
+        self.cmbEstado.setObjectName("cmbEstado")
+        self.lblFiltro = QtWidgets.QLabel(parent=Dialog)
+        self.lblFiltro.setGeometry(QtCore.QRect(700, 40, 210, 24))
+        self.lblFiltro.setText("")
+        self.lblFiltro.setObjectName("lblFiltro")
+        self.chkAutoActualizar = QtWidgets.QCheckBox(parent=Dialog)
+        self.chkAutoActualizar.setGeometry(QtCore.QRect(920, 40, 180, 24))
+        self.chkAutoActualizar.setObjectName("chkAutoActualizar")
+        self.tblResults = QtWidgets.QTableView(parent=Dialog)
+        self.tblResults.setGeometry(QtCore.QRect(100, 70, 1000, 550))
+        self.tblResults.setObjectName("tblResults")
+        self.pbCarga = QtWidgets.QProgressBar(parent=Dialog)
+        self.pbCarga.setGeometry(QtCore.QRect(100, 640, 200, 24))
+        self.pbCarga.setMaximum(0)
+        self.pbCarga.setTextVisible(False)
+        self.pbCarga.setObjectName("pbCarga")
+        self.lblProgreso = QtWidgets.QLabel(parent=Dialog)
+        self.lblProgreso.setGeometry(QtCore.QRect(310, 640, 290, 24))
+        self.lblProgreso.setText("")
+        self.lblProgreso.setObjectName("lblProgreso")
+        self.lblMetricas = QtWidgets.QLabel(parent=Dialog)
+        self.lblMetricas.setGeometry(QtCore.QRect(100, 668, 920, 24))
+        self.lblMetricas.setText("")
+        self.lblMetricas.setObjectName("lblMetricas")
+        self.btnCancelar = QtWidgets.QPushButton(parent=Dialog)
+        self.btnCancelar.setGeometry(QtCore.QRect(610, 640, 100, 24))
+        self.btnCancelar.setObjectName("btnCancelar")
+        self.splitter = QtWidgets.QSplitter(parent=Dialog)
+        self.splitter.setGeometry(QtCore.QRect(780, 640, 240, 24))
+        self.splitter.setOrientation(QtCore.Qt.Orientation.Horizontal)
+        self.splitter.setObjectName("splitter")
+        self.btnGuardar = QtWidgets.QPushButton(parent=self.splitter)
+        self.btnGuardar.setObjectName("btnGuardar")
+        self.btnback = QtWidgets.QPushButton(parent=self.splitter)
+        self.btnback.setObjectName("btnback")
+        self.btnExport = QtWidgets.QPushButton(parent=self.splitter)
+        self.btnExport.setObjectName("btnExport")
+
+        self.retranslateUi(Dialog)
+        QtCore.QMetaObject.connectSlotsByName(Dialog)
+
+    def retranslateUi(self, Dialog):
+        _translate = QtCore.QCoreApplication.translate
+        Dialog.setWindowTitle(_translate("Dialog", "Dialog"))
+        self.label.setText(_translate("Dialog", "Previsualizacion de Resultados"))
+        self.txtFiltro.setPlaceholderText(_translate("Dialog", "Buscar por boleta, expediente, paciente o codigo"))
+        self.chkAutoActualizar.setToolTip(_translate("Dialog", "Busca cada minuto los resultados validados desde la carga y actualiza solo esas boletas"))
+        self.chkAutoActualizar.setText(_translate("Dialog", "Actualizar automaticamente"))
+        self.btnCancelar.setText(_translate("Dialog", "Cancelar"))
+        self.btnGuardar.setText(_translate("Dialog", "Guardar cambios"))
+        self.btnback.setText(_translate("Dialog", "Atras"))
+        self.btnExport.setText(_translate("Dialog", "Exportar"))
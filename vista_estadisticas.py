@@ -0,0 +1,187 @@
+"""
+Ventana de estadísticas del rango: volumen, rechazo y tiempo de respuesta por día,
+por servicio y por prueba. Las calcula el servidor (ver estadisticas.py); main.py
+importa este módulo al abrir la ventana.
+"""
+import threading
+import time
+from typing import List, Optional
+from PyQt6 import QtWidgets, QtCore
+from PyQt6.QtWidgets import QMessageBox
+import connection
+import estadisticas
+import metricas
+from ui_estadisticas import Ui_Dialog as Ui_Estadisticas
+
+
+class EstadisticasWorker(QtCore.QThread):
+    """Calcula las estadísticas en segundo plano con una conexión prestada del pool."""
+
+    terminado = QtCore.pyqtSignal(object)  # EstadisticasReporte
+    fallo = QtCore.pyqtSignal(str)
+    cancelado = QtCore.pyqtSignal()
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str, parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self.medicion: Optional[metricas.MedicionReporte] = None
+
+    def run(self):
+        pool = connection.obtener_pool()
+        self.medicion = metricas.nueva_medicion(
+            "estadisticas", desde=self.fecha_inicio, hasta=self.fecha_fin,
+            servidor=pool.config.get("host")
+        )
+        try:
+            inicio = time.perf_counter()
+            with pool.conexion() as conn:
+                if self.medicion is not None:
+                    self.medicion.sumar("conexion", time.perf_counter() - inicio)
+                with self._conn_lock:
+                    self._conn = conn
+                try:
+                    resultado = estadisticas.generar_estadisticas(
+                        conn, self.fecha_inicio, self.fecha_fin, self.medicion
+                    )
+                finally:
+                    with self._conn_lock:
+                        self._conn = None
+        except connection.ReporteCancelado:
+            self.cancelado.emit()
+            return
+        except Exception as e:
+            if self.medicion is not None:
+                self.medicion.datos["error"] = f"{type(e).__name__}: {e}"
+            self.fallo.emit(str(e))
+            return
+        finally:
+            metricas.registrar(self.medicion)
+        self.terminado.emit(resultado)
+
+    def cancelar(self):
+        """Cancela la consulta en curso en el servidor."""
+        with self._conn_lock:
+            if self._conn is not None and not self._conn.closed:
+                try:
+                    self._conn.cancel()
+                except Exception as e:
+                    print(f"No se pudo cancelar la consulta: {e}")
+
+
+class VistaEstadisticas(QtWidgets.QDialog, Ui_Estadisticas):
+    """Diálogo con las estadísticas del rango en una pestaña por dimensión."""
+
+    # Encabezados de cada tabla después de la columna del grupo
+    COLUMNAS = ["Boletas", "Aceptadas", "Rechazadas", "% rechazo", "Con resultado",
+                "Horas promedio", "Horas mediana", "Horas p90"]
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str, parent=None):
+        super().__init__(parent)
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.estadisticas: Optional[estadisticas.EstadisticasReporte] = None
+        self._worker: Optional[EstadisticasWorker] = None
+        self.setupUi(self)
+        self.setWindowTitle(f"Estadísticas - {fecha_inicio} a {fecha_fin}")
+        for tabla, grupo in ((self.tblDia, "Día"), (self.tblServicio, "Servicio"), (self.tblPrueba, "Prueba")):
+            tabla.setColumnCount(len(self.COLUMNAS) + 1)
+            tabla.setHorizontalHeaderLabels([grupo] + self.COLUMNAS)
+            tabla.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+            tabla.setAlternatingRowColors(True)
+            tabla.verticalHeader().setVisible(False)
+        self.btnCerrar.clicked.connect(self.reject)
+        self.btnExportar.clicked.connect(self._on_exportar)
+        self.btnExportar.setEnabled(False)
+        self._cargar()
+
+    def _cargar(self):
+        """Pide las estadísticas al servidor en segundo plano."""
+        self.lblProgreso.setText("Calculando en el servidor...")
+        self._worker = EstadisticasWorker(self.fecha_inicio, self.fecha_fin, self)
+        self._worker.terminado.connect(self._on_terminado)
+        self._worker.fallo.connect(self._on_fallo)
+        self._worker.cancelado.connect(lambda: self.lblProgreso.setText("Cálculo cancelado"))
+        self._worker.start()
+
+    def _on_terminado(self, resultado: estadisticas.EstadisticasReporte):
+        self.estadisticas = resultado
+        total = resultado.total
+        if not total.boletas:
+            self.lblProgreso.setText("No se encontraron boletas para el rango seleccionado.")
+            return
+        self.lblResumen.setText(
+            f"{total.boletas} boletas, {total.aceptadas} aceptadas, {total.rechazadas} rechazadas "
+            f"({total.porcentaje_rechazo:.1f}%). Horas desde la recepción al primer resultado: "
+            f"promedio {self._horas(total.horas_promedio)}, mediana {self._horas(total.horas_mediana)}, "
+            f"p90 {self._horas(total.horas_p90)}"
+        )
+        self._llenar(self.tblDia, resultado.por_dia)
+        self._llenar(self.tblServicio, resultado.por_servicio)
+        self._llenar(self.tblPrueba, resultado.por_prueba)
+        medicion = self._worker.medicion if self._worker is not None else None
+        self.lblProgreso.setText(f"Tiempos: {medicion.resumen()}" if medicion is not None else "")
+        self.btnExportar.setEnabled(True)
+
+    def _on_fallo(self, mensaje: str):
+        self.lblProgreso.setText("")
+        QMessageBox.critical(self, "Error", f"Error al calcular las estadísticas: {mensaje}")
+
+    @staticmethod
+    def _horas(valor: Optional[float]) -> str:
+        return "-" if valor is None else f"{valor:.1f}"
+
+    def _llenar(self, tabla: QtWidgets.QTableWidget, filas: List[estadisticas.FilaEstadistica]):
+        """Llena una tabla; los números se guardan como tales para ordenar bien."""
+        tabla.setSortingEnabled(False)
+        tabla.setRowCount(len(filas))
+        for fila, datos in enumerate(filas):
+            valores = (datos.etiqueta, datos.boletas, datos.aceptadas, datos.rechazadas,
+                       datos.porcentaje_rechazo, datos.con_resultado,
+                       datos.horas_promedio, datos.horas_mediana, datos.horas_p90)
+            for columna, valor in enumerate(valores):
+                item = QtWidgets.QTableWidgetItem()
+                if isinstance(valor, float):
+                    valor = round(valor, 1)
+                if valor is not None:
+                    item.setData(QtCore.Qt.ItemDataRole.DisplayRole, valor)
+                tabla.setItem(fila, columna, item)
+        tabla.setSortingEnabled(True)
+        tabla.resizeColumnsToContents()
+
+    def _on_exportar(self):
+        """Guarda todas las estadísticas en un CSV."""
+        if self.estadisticas is None:
+            return
+        filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self,
+            "Guardar estadísticas CSV",
+            f"estadisticas_labsis_{self.fecha_inicio}_a_{self.fecha_fin}.csv",
+            "Archivos CSV (*.csv);;Todos los archivos (*)"
+        )
+        if not filepath:
+            return
+        try:
+            estadisticas.write_estadisticas_csv(self.estadisticas, filepath)
+        except Exception as e:
+            QMessageBox.critical(self, "Error de exportación", f"Error al exportar: {str(e)}")
+            return
+        QMessageBox.information(
+            self, "Exportación exitosa", f"Las estadísticas se han exportado correctamente a:\n{filepath}"
+        )
+
+    def _detener(self):
+        """Cancela el cálculo en curso y espera a que termine el hilo."""
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.cancelar()
+            self._worker.wait()
+
+    def reject(self):
+        self._detener()
+        super().reject()
+
+    def closeEvent(self, event):
+        self._detener()
+        super().closeEvent(event)
@@ -0,0 +1,821 @@
+"""
+Vista previa del reporte: tabla de boletas, carga y actualización en segundo plano
+y exportación del CSV. main.py importa este módulo al abrir la vista previa, así que
+psycopg2 y el resto del reporte no se cargan antes de mostrar la ventana de fechas.
+"""
+import itertools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from PyQt6 import QtWidgets, QtCore, QtGui
+from PyQt6.QtWidgets import QMessageBox
+import connection
+import filtro
+import metricas
+from ui_preview import Ui_Dialog as Ui_Preview
+
+
+class BoletasTableModel(QtCore.QAbstractTableModel):
+    """Modelo de tabla sobre las boletas del reporte; las celdas se formatean al pintarse.
+
+    Guarda todas las boletas en el orden actual y muestra las que deja pasar el
+    filtro (todas si no hay filtro). Las posiciones de cada boleta se calculan al
+    cargar y al ordenar; filtrar solo cambia la lista de posiciones visibles.
+    """
+
+    # Emitida al editar la columna Update: num_ingreso, texto ingresado
+    update_editado = QtCore.pyqtSignal(str, str)
+
+    def __init__(self, columnas: List[str], resultados: Dict[int, str],
+                 parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self._columnas = columnas
+        self._posiciones_resultado = [connection.INDICE_RESULTADO[i] for i in resultados]
+        self._encabezados = columnas + list(resultados.values())
+        self._col_update = columnas.index("Update")
+        self._todas: List[connection.Boleta] = []
+        self._posiciones: Dict[str, int] = {}  # num_ingreso -> posición en _todas
+        self._permitidas: Optional[Set[str]] = None
+        # Posiciones en _todas de las filas visibles, en orden; None si no hay filtro
+        self._visibles: Optional[List[int]] = None
+        self._pendientes: set = set()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._todas) if self._visibles is None else len(self._visibles)
+
+    def _boleta(self, fila: int) -> connection.Boleta:
+        """Boleta que se muestra en una fila."""
+        return self._todas[fila if self._visibles is None else self._visibles[fila]]
+
+    def _fila(self, num_ingreso: str) -> Optional[int]:
+        """Fila visible de una boleta, o None si no está o el filtro la oculta."""
+        posicion = self._posiciones.get(num_ingreso)
+        if posicion is None or self._visibles is None:
+            return posicion
+        fila = bisect_left(self._visibles, posicion)
+        return fila if fila < len(self._visibles) and self._visibles[fila] == posicion else None
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._encabezados)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if role != QtCore.Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Orientation.Horizontal:
+            return self._encabezados[section]
+        return str(section + 1)
+
+    def _texto(self, boleta: connection.Boleta, columna: int) -> str:
+        """Texto a mostrar de una celda."""
+        if columna < len(self._columnas):
+            return connection.texto_campo(boleta, self._columnas[columna])
+        value = boleta.Resultados[self._posiciones_resultado[columna - len(self._columnas)]]
+        return str(connection.format_result_value(value))  # Formatea a una sola decima
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (QtCore.Qt.ItemDataRole.DisplayRole, QtCore.Qt.ItemDataRole.EditRole):
+            return self._texto(self._boleta(index.row()), index.column())
+        if role == QtCore.Qt.ItemDataRole.BackgroundRole and index.column() == self._col_update \
+                and self._boleta(index.row()).Boleta in self._pendientes:
+            return QtGui.QColor("#fff2a8")  # Cambio aún no guardado en la base
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self._col_update:
+            flags |= QtCore.Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.ItemDataRole.EditRole):
+        """La edición de Update se delega al diálogo, que valida y guarda en la base."""
+        if not index.isValid() or index.column() != self._col_update \
+                or role != QtCore.Qt.ItemDataRole.EditRole:
+            return False
+        self.update_editado.emit(str(self._boleta(index.row()).Boleta), str(value))
+        return True
+
+    def sort(self, column, order=QtCore.Qt.SortOrder.AscendingOrder):
+        """Ordena las boletas en el modelo, numéricamente cuando el valor lo permite."""
+        def clave(boleta):
+            texto = self._texto(boleta, column)
+            try:
+                return (0, float(texto), texto)
+            except ValueError:
+                return (1, 0.0, texto)
+
+        with self._cambio_de_filas():
+            self._todas.sort(key=clave, reverse=order == QtCore.Qt.SortOrder.DescendingOrder)
+            self._reindexar()
+
+    @contextmanager
+    def _cambio_de_filas(self):
+        """Cambia las filas visibles conservando la selección de las boletas que siguen visibles."""
+        self.layoutAboutToBeChanged.emit()
+        persistentes = self.persistentIndexList()
+        anteriores = [(self._boleta(i.row()).Boleta, i.column()) for i in persistentes]
+        yield
+        nuevos = []
+        for num_ingreso, columna in anteriores:
+            fila = self._fila(num_ingreso)
+            nuevos.append(QtCore.QModelIndex() if fila is None else self.index(fila, columna))
+        self.changePersistentIndexList(persistentes, nuevos)
+        self.layoutChanged.emit()
+
+    def _reindexar(self):
+        """Recalcula las posiciones de todas las boletas y las filas visibles tras cargar u ordenar."""
+        self._posiciones = {boleta.Boleta: posicion for posicion, boleta in enumerate(self._todas)}
+        self._filtrar_visibles()
+
+    def _filtrar_visibles(self):
+        """Posiciones visibles según el filtro; solo se recorren las boletas permitidas."""
+        if self._permitidas is None:
+            self._visibles = None
+        else:
+            self._visibles = sorted(
+                posicion for posicion in map(self._posiciones.get, self._permitidas) if posicion is not None
+            )
+
+    def set_boletas(self, boletas: List[connection.Boleta]):
+        """Reemplaza todas las boletas del modelo; el filtro actual se mantiene."""
+        self.beginResetModel()
+        self._todas = list(boletas)
+        self._reindexar()
+        self.endResetModel()
+
+    def filtrar(self, permitidas: Optional[Set[str]]):
+        """Muestra solo las boletas con esos números de ingreso; None las muestra todas."""
+        with self._cambio_de_filas():
+            self._permitidas = permitidas
+            self._filtrar_visibles()
+
+    def todas(self) -> List[connection.Boleta]:
+        """Todas las boletas del modelo, visibles o no."""
+        return self._todas
+
+    def agregar_boletas(self, boletas: List[connection.Boleta]):
+        """Agrega boletas al final del modelo."""
+        inicio = len(self._todas)
+        visibles = [posicion for posicion, boleta in enumerate(boletas, start=inicio)
+                    if self._permitidas is None or boleta.Boleta in self._permitidas]
+        for posicion, boleta in enumerate(boletas, start=inicio):
+            self._posiciones[boleta.Boleta] = posicion
+        if not visibles:
+            self._todas.extend(boletas)  # Ocultas por el filtro: no cambian las filas
+            return
+        primera = self.rowCount()
+        self.beginInsertRows(QtCore.QModelIndex(), primera, primera + len(visibles) - 1)
+        self._todas.extend(boletas)
+        if self._visibles is not None:
+            self._visibles.extend(visibles)
+        self.endInsertRows()
+
+    def reemplazar_boleta(self, boleta: connection.Boleta):
+        """Sustituye la boleta con el mismo número de ingreso y repinta su fila."""
+        posicion = self._posiciones.get(boleta.Boleta)
+        if posicion is not None:
+            self._todas[posicion] = boleta
+            self.actualizar_boleta(boleta.Boleta)
+
+    def marcar_pendiente(self, num_ingreso: str, pendiente: bool):
+        """Resalta o no la celda Update de una boleta con cambios sin guardar."""
+        if pendiente:
+            self._pendientes.add(num_ingreso)
+        else:
+            self._pendientes.discard(num_ingreso)
+        self.actualizar_boleta(num_ingreso)
+
+    def actualizar_boleta(self, num_ingreso: str):
+        """Notifica a la vista que cambió la fila de una boleta."""
+        fila = self._fila(num_ingreso)
+        if fila is not None:
+            self.dataChanged.emit(self.index(fila, 0), self.index(fila, self.columnCount() - 1))
+
+
+class ReporteWorker(QtCore.QThread):
+    """Genera el reporte en segundo plano notificando el progreso y las boletas nuevas."""
+
+    progreso = QtCore.pyqtSignal(int, int)  # filas leídas, boletas construidas
+    boletas_nuevas = QtCore.pyqtSignal(list)
+    terminado = QtCore.pyqtSignal(dict, list)  # boletas, boletas anormales
+    fallo = QtCore.pyqtSignal(str)
+    cancelado = QtCore.pyqtSignal()
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str, parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self._conn = None
+        self._conn_lock = threading.Lock()
+        self._cancelar = False
+        # Conexiones que consultan los días que faltan en la caché
+        self._en_curso = connection.ConsultasEnCurso()
+        self._emitidas = 0
+        self.medicion: Optional[metricas.MedicionReporte] = None
+        # Último actualizado_timestamp antes del reporte, para la actualización automática
+        self.marca_agua: Optional[datetime] = None
+
+    def run(self):
+        """Ejecuta generate_report con una conexión prestada del pool, o desde la caché local."""
+        anomalias: List[str] = []
+        pool = connection.obtener_pool()
+        self.medicion = metricas.nueva_medicion(
+            "vista_previa", desde=self.fecha_inicio, hasta=self.fecha_fin,
+            servidor=pool.config.get("host")
+        )
+        cache = connection.abrir_cache(pool.config)
+        if cache is not None:
+            # Los días ya guardados no se consultan; los demás llegan y se muestran día a día
+            try:
+                with cache:
+                    data = connection.generate_report_cacheado(
+                        self.fecha_inicio, self.fecha_fin, cache, pool=pool,
+                        progreso=self._on_progreso,
+                        al_detectar_anomalias=anomalias.extend,
+                        medicion=self.medicion,
+                        en_curso=self._en_curso,
+                        al_consultar=self._leer_marca_agua
+                    )
+            except connection.ReporteCancelado:
+                self.cancelado.emit()
+                return
+            except Exception as e:
+                self.fallo.emit(str(e))
+                return
+            if self._cancelar:
+                self.cancelado.emit()
+            else:
+                self.terminado.emit(data, anomalias)
+            return
+
+        self._leer_marca_agua(pool)
+        try:
+            inicio = time.perf_counter()
+            with pool.conexion() as conn:
+                if self.medicion is not None:
+                    self.medicion.sumar("conexion", time.perf_counter() - inicio)
+                with self._conn_lock:
+                    self._conn = conn
+                try:
+                    data = connection.generate_report(
+                        conn, self.fecha_inicio, self.fecha_fin,
+                        itersize=connection.ITERSIZE_REPORTE,
+                        progreso=self._on_progreso,
+                        al_detectar_anomalias=anomalias.extend,
+                        medicion=self.medicion
+                    )
+                finally:
+                    with self._conn_lock:
+                        self._conn = None
+        except connection.ReporteCancelado:
+            self.cancelado.emit()
+            return
+        except Exception as e:
+            self.fallo.emit(str(e))
+            return
+
+        if self._cancelar:
+            self.cancelado.emit()
+        else:
+            self.terminado.emit(data, anomalias)
+
+    def _leer_marca_agua(self, pool: connection.PoolConexiones):
+        """Lee la marca de agua antes de consultar el servidor; si falla, la primera actualización la obtiene.
+
+        Con la caché solo se lee si algún día necesita el servidor (ver al_consultar).
+        """
+        try:
+            with pool.conexion() as conn:
+                self.marca_agua = connection.obtener_marca_agua(conn)
+        except Exception as e:
+            print(f"No se pudo leer la marca de agua: {e}")
+
+    def _on_progreso(self, filas: int, boletas: Dict[str, connection.Boleta]):
+        """Emite las boletas creadas desde la última notificación."""
+        if self._cancelar:
+            raise connection.ReporteCancelado()
+        nuevas = len(boletas) - self._emitidas
+        if nuevas > 0:
+            lote = list(itertools.islice(reversed(boletas.values()), nuevas))
+            lote.reverse()
+            self._emitidas = len(boletas)
+            self.boletas_nuevas.emit(lote)
+        self.progreso.emit(filas, len(boletas))
+
+    def cancelar(self):
+        """Pide la cancelación; las consultas en curso también se cancelan en el servidor."""
+        self._cancelar = True
+        self._en_curso.cancelar()
+        with self._conn_lock:
+            if self._conn is not None and not self._conn.closed:
+                try:
+                    self._conn.cancel()
+                except Exception as e:
+                    print(f"No se pudo cancelar la consulta: {e}")
+
+
+class ExportacionWorker(QtCore.QThread):
+    """Escribe el CSV en segundo plano; el archivo aparece completo o no aparece (ver write_to_csv)."""
+
+    progreso = QtCore.pyqtSignal(int, int)  # boletas escritas, total
+    terminado = QtCore.pyqtSignal(str)  # ruta
+    fallo = QtCore.pyqtSignal(str, str)  # ruta, mensaje
+
+    def __init__(self, boletas: Dict[str, connection.Boleta], ruta: str,
+                 medicion: Optional[metricas.MedicionReporte] = None,
+                 parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self.boletas = boletas
+        self.ruta = ruta
+        self.medicion = medicion
+
+    def run(self):
+        try:
+            connection.write_to_csv(
+                self.boletas, self.ruta, propagar_errores=True,
+                medicion=self.medicion, progreso=self.progreso.emit
+            )
+        except Exception as e:
+            if self.medicion is not None:
+                self.medicion.datos["error"] = f"{type(e).__name__}: {e}"
+            self.fallo.emit(self.ruta, str(e))
+            return
+        finally:
+            metricas.registrar(self.medicion)
+        self.terminado.emit(self.ruta)
+
+
+class ActualizacionWorker(QtCore.QThread):
+    """Trae en segundo plano las boletas del rango con resultados nuevos desde la marca de agua."""
+
+    terminado = QtCore.pyqtSignal(dict, object, list)  # boletas cambiadas, nueva marca, anormales
+    fallo = QtCore.pyqtSignal(str)
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str, marca_agua: Optional[datetime],
+                 parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.marca_agua = marca_agua
+
+    def run(self):
+        """Consulta solo las boletas cambiadas; sin marca de agua solo la lee."""
+        anomalias: List[str] = []
+        cambiadas: List[str] = []
+        pool = connection.obtener_pool()
+        try:
+            with pool.conexion() as conn:
+                if self.marca_agua is None:
+                    boletas, marca = {}, connection.obtener_marca_agua(conn)
+                else:
+                    boletas, marca = connection.generate_report_delta(
+                        conn, self.fecha_inicio, self.fecha_fin, self.marca_agua,
+                        al_detectar_anomalias=anomalias.extend, propagar_errores=True,
+                        al_detectar_cambios=cambiadas.extend
+                    )
+        except Exception as e:
+            self.fallo.emit(str(e))
+            return
+        if cambiadas:
+            # Incluye días cerrados y boletas fuera del rango mostrado
+            connection.invalidar_cache_boletas(cambiadas, pool.config)
+        self.terminado.emit(boletas, marca, anomalias)
+
+
+class OpenPreviewResults(QtWidgets.QDialog, Ui_Preview):
+    """Diálogo para mostrar vista previa de resultados y exportar CSV."""
+
+    # Pide escribir el CSV en segundo plano: boletas, ruta, medición
+    exportacion_solicitada = QtCore.pyqtSignal(dict, str, object)
+    
+    # Constantes de clase
+    RESULTADOS_ALIAS = {
+        852: "TSH", 859: "IRT", 854: "PKU", 883: "17OH",
+        886: "JarabeA1", 885: "JarabeA2", 888: "Tyr",
+        889: "HbF", 890: "HbA", 891: "HbS", 892: "HbC"
+    }
+    
+    COLUMNAS_NORMALES = [
+        "codigoE", "Boleta", "FechaTomaMx", "Paciente", "Edad", "Sexo", "Expediente",
+        "Recepcion", "Procesamiento", "FResultado", "FechaRechazo", "EstadoPaciente",
+        "StdoBoleta", "Update", "ReferidoPor", "Id"
+    ]
+    
+    ESTADOS_FILTRO = (("Todos los estados", None), ("A - Con resultados", "A"), ("R - Rechazadas", "R"))
+
+    # Cada cuánto se buscan resultados nuevos con la actualización automática
+    INTERVALO_ACTUALIZACION_MS = 60_000
+
+    def __init__(self, fecha_inicio: str, fecha_fin: str, parent: Optional[QtWidgets.QWidget] = None):
+        super().__init__(parent)
+        self.fecha_inicio = fecha_inicio
+        self.fecha_fin = fecha_fin
+        self.data: Dict[str, connection.Boleta] = {}
+        self._worker: Optional[ReporteWorker] = None
+        # Índices del filtro; se reconstruyen al terminar la carga o si cambia una boleta
+        self.indice = filtro.IndiceBoletas()
+        self._indice_vigente = False
+        # Actualización automática: marca de agua de lo ya mostrado y consulta en curso
+        self._marca_agua: Optional[datetime] = None
+        self._actualizador: Optional[ActualizacionWorker] = None
+        self._anomalias_avisadas: Set[str] = set()
+        # Cambios de Update editados en la tabla y aún no guardados: num_ingreso -> valor
+        self._pendientes: Dict[str, str] = {}
+        
+        self._setup_ui()
+        self._connect_signals()
+        self._load_data()
+    
+    def _setup_ui(self):
+        """Configura la interfaz de usuario."""
+        self.setupUi(self)
+
+        self.setWindowTitle(f"Vista Previa - {self.fecha_inicio} a {self.fecha_fin}")
+        
+        # Configurar tabla
+        self.modelo = BoletasTableModel(self.COLUMNAS_NORMALES, self.RESULTADOS_ALIAS, self)
+        self.tblResults.setModel(self.modelo)
+        self.tblResults.setAlternatingRowColors(True)
+        self.tblResults.setSortingEnabled(True)
+        self.tblResults.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
+
+        # Barra de filtro
+        for texto, estado in self.ESTADOS_FILTRO:
+            self.cmbEstado.addItem(texto, estado)
+        self._habilitar_filtro(False)
+
+        self._timer_actualizacion = QtCore.QTimer(self)
+        self._timer_actualizacion.setInterval(self.INTERVALO_ACTUALIZACION_MS)
+        self.chkAutoActualizar.setEnabled(False)
+        
+        # Inicialmente deshabilitar exportación hasta cargar datos
+        self.btnExport.setEnabled(False)
+        self.btnGuardar.setEnabled(False)
+        self._mostrar_progreso(False)
+    
+    def _connect_signals(self):
+        """Conecta las señales con sus respectivos slots."""
+        self.btnback.clicked.connect(self._on_back)
+        self.btnExport.clicked.connect(self._on_export)
+        self.btnCancelar.clicked.connect(self._on_cancelar)
+        self.btnGuardar.clicked.connect(self._on_guardar_cambios)
+        self.txtFiltro.textChanged.connect(self._aplicar_filtro)
+        self.cmbEstado.currentIndexChanged.connect(self._aplicar_filtro)
+        self.chkAutoActualizar.toggled.connect(self._on_auto_actualizar)
+        self._timer_actualizacion.timeout.connect(self._actualizar_cambios)
+        self.modelo.update_editado.connect(
+            self._on_update_changed, QtCore.Qt.ConnectionType.QueuedConnection
+        )
+    
+    def _load_data(self):
+        """Inicia la carga del reporte en segundo plano."""
+        if self._worker is not None and self._worker.isRunning():
+            return
+
+        self.data = {}
+        self._habilitar_filtro(False)
+        self.chkAutoActualizar.setEnabled(False)
+        self.modelo.filtrar(None)
+        self.modelo.set_boletas([])
+        self.lblMetricas.clear()
+        self.btnExport.setEnabled(False)
+        self.tblResults.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tblResults.setSortingEnabled(False)
+        self._mostrar_progreso(True)
+        self.lblProgreso.setText("Consultando la base de datos...")
+
+        self._worker = ReporteWorker(self.fecha_inicio, self.fecha_fin, self)
+        self._worker.progreso.connect(self._on_progreso)
+        self._worker.boletas_nuevas.connect(self.modelo.agregar_boletas)
+        self._worker.terminado.connect(self._on_reporte_terminado)
+        self._worker.fallo.connect(self._on_reporte_fallido)
+        self._worker.cancelado.connect(self._on_reporte_cancelado)
+        self._worker.start()
+
+    def _mostrar_progreso(self, visible: bool):
+        """Muestra u oculta los controles de progreso de la carga."""
+        self.pbCarga.setVisible(visible)
+        self.btnCancelar.setVisible(visible)
+        self.btnCancelar.setEnabled(visible)
+        self.lblProgreso.setVisible(visible)
+
+    def _on_progreso(self, filas: int, boletas: int):
+        """Actualiza el texto de progreso de la carga."""
+        self.lblProgreso.setText(f"Filas leídas: {filas} - Boletas: {boletas}")
+
+    def _on_cancelar(self):
+        """Cancela la carga en curso."""
+        if self._worker is not None and self._worker.isRunning():
+            self.btnCancelar.setEnabled(False)
+            self.lblProgreso.setText("Cancelando...")
+            self._worker.cancelar()
+
+    def _on_reporte_terminado(self, data: Dict[str, connection.Boleta], anomalias: List[str]):
+        """Muestra el reporte completo al terminar la carga."""
+        self._mostrar_progreso(False)
+        self.tblResults.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.DoubleClicked)
+        if anomalias:
+            QMessageBox.critical(self, "Datos anormales detectados",
+                                 connection.mensaje_boletas_anormales(anomalias))
+
+        self.data = data
+        if self.data:
+            self._populate_table(self._worker.medicion if self._worker is not None else None)
+            self.btnExport.setEnabled(True)
+            self._marca_agua = self._worker.marca_agua if self._worker is not None else None
+            self._anomalias_avisadas = set(anomalias)
+            self.chkAutoActualizar.setEnabled(True)
+        else:
+            self.tblResults.setSortingEnabled(True)
+            QMessageBox.information(self, "Sin datos", "No se encontraron datos para el rango seleccionado.")
+
+    def _on_reporte_fallido(self, mensaje: str):
+        """Informa el error ocurrido durante la carga."""
+        self._mostrar_progreso(False)
+        self.tblResults.setSortingEnabled(True)
+        QMessageBox.critical(self, "Error", f"Error al cargar datos: {mensaje}")
+
+    def _on_reporte_cancelado(self):
+        """Deja visibles las boletas parciales sin permitir exportar ni editar."""
+        self._mostrar_progreso(False)
+        self.tblResults.setSortingEnabled(True)
+        self.lblProgreso.setVisible(True)
+        self.lblProgreso.setText(
+            f"Carga cancelada: {self.modelo.rowCount()} boletas parciales"
+        )
+        self._indice_vigente = False
+        self._habilitar_filtro(True)
+
+    def _detener_carga(self):
+        """Cancela la carga en curso y espera a que termine el hilo."""
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.cancelar()
+            self._worker.wait()
+
+    def _populate_table(self, medicion: Optional[metricas.MedicionReporte] = None):
+        """Llena la tabla con los datos del reporte y registra las métricas de la carga."""
+        if not self.data:
+            return
+
+        with metricas.medir(medicion, "tabla"):
+            self.tblResults.setSortingEnabled(False)
+            self.modelo.set_boletas(self.data.values())
+            self.tblResults.setSortingEnabled(True)
+            self.tblResults.resizeColumnsToContents()
+            self.indice.construir(self.modelo.todas())
+            self._indice_vigente = True
+        metricas.registrar(medicion)
+
+        self._habilitar_filtro(True)
+
+        self._show_statistics(medicion)
+    
+    def _show_statistics(self, medicion: Optional[metricas.MedicionReporte] = None):
+        """Muestra estadísticas básicas en el título y los tiempos de la carga debajo de la tabla."""
+        total = len(self.data)
+        con_resultados = sum(1 for b in self.data.values() if b.StdoBoleta == "A")
+        self.setWindowTitle(
+            f"Vista Previa - {self.fecha_inicio} a {self.fecha_fin} "
+            f"(Total: {total}, Con resultados: {con_resultados})"
+        )
+        if medicion is not None:
+            self.lblMetricas.setText(f"Tiempos de carga: {medicion.resumen()}")
+            self.lblMetricas.setToolTip(
+                "\n".join(f"{clave}: {valor}" for clave, valor in medicion.como_dict().items())
+            )
+    
+    def _habilitar_filtro(self, habilitado: bool):
+        """Activa la barra de filtro; mientras se carga el reporte queda deshabilitada."""
+        self.txtFiltro.setEnabled(habilitado)
+        self.cmbEstado.setEnabled(habilitado)
+        if habilitado:
+            self._aplicar_filtro()
+        else:
+            self.lblFiltro.clear()
+
+    def _aplicar_filtro(self):
+        """Filtra la tabla con el texto y el estado de la barra de filtro."""
+        if not self.txtFiltro.isEnabled():
+            return
+        if not self._indice_vigente:
+            self.indice.construir(self.modelo.todas())
+            self._indice_vigente = True
+        permitidas = self.indice.filtrar(self.txtFiltro.text(), self.cmbEstado.currentData())
+        self.modelo.filtrar(permitidas)
+        if permitidas is None:
+            self.lblFiltro.clear()
+        else:
+            self.lblFiltro.setText(f"Mostrando {self.modelo.rowCount()} de {self.indice.total} boletas")
+
+    def _on_auto_actualizar(self, activo: bool):
+        """Inicia o detiene la búsqueda periódica de resultados nuevos."""
+        if activo:
+            self._timer_actualizacion.start()
+            self._actualizar_cambios()
+        else:
+            self._timer_actualizacion.stop()
+
+    def _actualizar_cambios(self):
+        """Pide en segundo plano las boletas cambiadas, salvo que haya una carga o consulta en curso."""
+        if not self.chkAutoActualizar.isEnabled() or not self.chkAutoActualizar.isChecked():
+            return
+        if self._worker is not None and self._worker.isRunning():
+            return
+        if self._actualizador is not None and self._actualizador.isRunning():
+            return
+        self._actualizador = ActualizacionWorker(self.fecha_inicio, self.fecha_fin, self._marca_agua, self)
+        self._actualizador.terminado.connect(self._on_actualizacion_terminada)
+        self._actualizador.fallo.connect(self._on_actualizacion_fallida)
+        self._actualizador.start()
+
+    def _on_actualizacion_terminada(self, boletas: Dict[str, connection.Boleta],
+                                    marca_agua: Optional[datetime], anomalias: List[str]):
+        """Incorpora las boletas cambiadas repintando solo sus filas."""
+        self._marca_agua = marca_agua
+        nuevas = []
+        for num_ingreso, boleta in boletas.items():
+            if num_ingreso in self._pendientes:
+                # El cambio de Update sin guardar se conserva sobre el valor de la base
+                boleta.Update = self._pendientes[num_ingreso] or None
+            if num_ingreso in self.data:
+                self.modelo.reemplazar_boleta(boleta)
+            else:
+                nuevas.append(boleta)
+            self.data[num_ingreso] = boleta
+        self.modelo.agregar_boletas(nuevas)
+
+        if boletas:
+            self._indice_vigente = False
+            if self.txtFiltro.text().strip() or self.cmbEstado.currentData() is not None:
+                self._aplicar_filtro()
+            self._show_statistics()
+        self.lblProgreso.setVisible(True)
+        self.lblProgreso.setText(
+            f"Actualizado a las {datetime.now():%H:%M:%S}: {len(boletas)} boletas con cambios"
+        )
+
+        nuevas_anomalias = [a for a in anomalias if a not in self._anomalias_avisadas]
+        if nuevas_anomalias:
+            self._anomalias_avisadas.update(nuevas_anomalias)
+            QMessageBox.critical(self, "Datos anormales detectados",
+                                 connection.mensaje_boletas_anormales(nuevas_anomalias))
+
+    def _on_actualizacion_fallida(self, mensaje: str):
+        """Informa el error sin detener la actualización automática."""
+        self.lblProgreso.setVisible(True)
+        self.lblProgreso.setText(f"No se pudo actualizar: {mensaje}")
+
+    def _on_back(self):
+        """Maneja el botón de regreso."""
+        self.reject()  # Esto cerrará el diálogo con código de rechazo
+    
+    def _on_export(self):
+        """Maneja la exportación de datos a CSV."""
+        if not self.data:
+            QMessageBox.warning(self, "Sin datos", "No hay datos para exportar.")
+            return
+        if not self._confirmar_pendientes():
+            return
+        
+        try:
+            # Obtener nombre de archivo sugerido
+            filename = f"reporte_labsis_{self.fecha_inicio}_a_{self.fecha_fin}.csv"
+            
+            # Abrir diálogo para guardar archivo
+            filepath, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self,
+                "Guardar reporte CSV",
+                filename,
+                "Archivos CSV (*.csv);;Todos los archivos (*)"
+            )
+            
+            if filepath:
+                # La ventana principal escribe el CSV en segundo plano y avisa al terminar;
+                # se pasa una copia porque la actualización automática modifica self.data
+                medicion = metricas.nueva_medicion(
+                    "exportacion_csv", desde=self.fecha_inicio, hasta=self.fecha_fin,
+                    boletas=len(self.data)
+                )
+                self.exportacion_solicitada.emit(dict(self.data), filepath, medicion)
+                # Cerrar con código de aceptación para indicar que se inició la exportación
+                self.accept()
+            
+        except Exception as e:
+            QMessageBox.critical(self, "Error de exportación", f"Error al exportar: {str(e)}")
+    
+    def _on_update_changed(self, num_ingreso: str, texto: str):
+        """Valida el nuevo valor de Update y lo deja pendiente de guardar."""
+        new_value = texto.strip().upper()  # Convertir a mayúscula
+        if new_value not in ("X", ""):
+            # El modelo conserva el valor anterior, no hace falta recargar
+            QMessageBox.warning(self, "Valor inválido", "Solo se permite 'X' o dejar en blanco.")
+            return
+
+        # Guardar en el diccionario en mayúscula y repintar solo esa fila
+        self.data[num_ingreso].Update = new_value if new_value else None
+        self._pendientes[num_ingreso] = new_value
+        self.modelo.marcar_pendiente(num_ingreso, True)
+        self._actualizar_boton_guardar()
+
+    def _actualizar_boton_guardar(self):
+        """Muestra en el botón cuántos cambios de Update faltan por guardar."""
+        pendientes = len(self._pendientes)
+        self.btnGuardar.setEnabled(pendientes > 0)
+        self.btnGuardar.setText(f"Guardar cambios ({pendientes})" if pendientes else "Guardar cambios")
+
+    def _on_guardar_cambios(self) -> bool:
+        """Guarda en una sola transacción los cambios de Update pendientes."""
+        if not self._pendientes:
+            return True
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.CursorShape.WaitCursor)
+        try:
+            fallidas = connection.update_boletas_update(self._pendientes)
+        except Exception as e:
+            QtWidgets.QApplication.restoreOverrideCursor()
+            QMessageBox.critical(self, "Error", f"No se pudieron guardar los cambios: {str(e)}")
+            return False
+        QtWidgets.QApplication.restoreOverrideCursor()
+
+        num_ingresos = list(self._pendientes)
+        self._pendientes.clear()
+        guardadas = [n for n in num_ingresos if n not in fallidas]
+        connection.invalidar_cache_boletas(num_ingresos, connection.obtener_pool().config)
+        connection.registrar_updates_delta(guardadas, connection.obtener_pool().config)
+        for num_ingreso in num_ingresos:
+            self.modelo.marcar_pendiente(num_ingreso, False)
+        # Las boletas que no se actualizaron vuelven a mostrar el valor de la base
+        for num_ingreso in fallidas:
+            self._refrescar_boleta(num_ingreso)
+        self._actualizar_boton_guardar()
+
+        if fallidas:
+            detalle = "\n".join(fallidas.values())
+            QMessageBox.warning(
+                self, "Cambios no guardados",
+                f"Se guardaron {len(num_ingresos) - len(fallidas)} de {len(num_ingresos)} cambios.\n{detalle}"
+            )
+        return True
+
+    def _confirmar_pendientes(self) -> bool:
+        """Pregunta qué hacer con los cambios sin guardar; False si se cancela la acción."""
+        if not self._pendientes:
+            return True
+        respuesta = QMessageBox.question(
+            self, "Cambios sin guardar",
+            f"Hay {len(self._pendientes)} cambios de Update sin guardar. ¿Desea guardarlos?",
+            QMessageBox.StandardButton.Save | QMessageBox.StandardButton.Discard
+            | QMessageBox.StandardButton.Cancel
+        )
+        if respuesta == QMessageBox.StandardButton.Save:
+            return self._on_guardar_cambios()
+        if respuesta == QMessageBox.StandardButton.Discard:
+            num_ingresos = list(self._pendientes)
+            self._pendientes.clear()
+            for num_ingreso in num_ingresos:
+                self.modelo.marcar_pendiente(num_ingreso, False)
+                self._refrescar_boleta(num_ingreso)
+            self._actualizar_boton_guardar()
+            return True
+        return False
+
+    def _refrescar_boleta(self, num_ingreso: str):
+        """Vuelve a consultar una boleta y actualiza solo su fila."""
+        try:
+            with connection.obtener_pool().conexion() as conn:
+                boleta = connection.generate_report_boleta(
+                    conn, num_ingreso, self.fecha_inicio, self.fecha_fin
+                )
+        except Exception as e:
+            print(f"No se pudo refrescar la boleta {num_ingreso}: {e}")
+            return
+        if boleta is not None and num_ingreso in self.data:
+            self.data[num_ingreso] = boleta
+            self.modelo.reemplazar_boleta(boleta)
+            self._indice_vigente = False
+
+    def reject(self):
+        """Pregunta por los cambios de Update pendientes antes de cerrar."""
+        if self._confirmar_pendientes():
+            super().reject()
+
+    def done(self, result):
+        """Detiene la carga y la actualización en curso antes de cerrar el diálogo."""
+        self._timer_actualizacion.stop()
+        self._detener_carga()
+        if self._actualizador is not None:
+            self._actualizador.wait()
+        super().done(result)
+
+    def closeEvent(self, event):
+        """Maneja el evento de cierre de ventana."""
+        if not self._confirmar_pendientes():
+            event.ignore()
+            return
+        self.reject()
+        event.accept()